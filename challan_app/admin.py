@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Vehicle, ViolationType, Challan, ViolationEvidence, Payment, PoliceOfficer
+from .models import Vehicle, ViolationType, Challan, ViolationEvidence, ViolationEvent, Payment, PoliceOfficer
 
 @admin.register(Vehicle)
 class VehicleAdmin(admin.ModelAdmin):
@@ -34,6 +34,14 @@ class ViolationEvidenceAdmin(admin.ModelAdmin):
     readonly_fields = ['id', 'uploaded_at']
     ordering = ['-uploaded_at']
 
+@admin.register(ViolationEvent)
+class ViolationEventAdmin(admin.ModelAdmin):
+    list_display = ['plate_number', 'violation_type', 'vehicle', 'status', 'challan', 'location', 'occurred_at']
+    list_filter = ['status', 'violation_type', 'occurred_at']
+    search_fields = ['plate_number', 'vehicle__registration_number', 'challan__challan_number']
+    readonly_fields = ['id', 'created_at']
+    ordering = ['-occurred_at']
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['transaction_id', 'challan', 'amount', 'payment_method', 'status', 'payment_date']
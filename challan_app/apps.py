@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ChallanAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "challan_app"
+
+    def ready(self):
+        from . import signals  # noqa: F401
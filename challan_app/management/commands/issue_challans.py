@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from challan_app.utils.challan_ingestion import ChallanIngestor
+
+
+class Command(BaseCommand):
+    help = 'Issue challans in bulk for pending violation events from detection sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issued-by', default=getattr(settings, 'CHALLAN_AUTO_ISSUER', 'admin'),
+                            help='Username the challans are issued by')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'CHALLAN_INGEST_BATCH_SIZE', 500))
+        parser.add_argument('--dedupe-minutes', type=float,
+                            default=getattr(settings, 'CHALLAN_DEDUPE_WINDOW_MINUTES', 30),
+                            help='Skip repeats of a vehicle/violation pair within this many minutes')
+        parser.add_argument('--max-batches', type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            issued_by = User.objects.get(username=options['issued_by'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['issued_by']} does not exist")
+
+        ingestor = ChallanIngestor(
+            issued_by,
+            batch_size=options['batch_size'],
+            dedupe_window=timedelta(minutes=options['dedupe_minutes']),
+        )
+        ingestor.run(max_batches=options['max_batches'])
+
+        stats = ingestor.get_statistics()
+        self.stdout.write(
+            f"Events processed: {stats['events_processed']} in {stats['batches']} batches "
+            f"({stats['events_per_second']:.0f}/s)"
+        )
+        self.stdout.write(
+            f"Duplicates skipped: {stats['duplicates']}, no matching vehicle: {stats['unmatched']}, "
+            f"close matches left for review: {stats['needs_review']}, evidence linked: {stats['evidence_linked']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Challans issued: {stats['challans_issued']} ({stats['challans_per_second']:.0f}/s)"
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:21
+
+import re
+
+from django.db import migrations, models
+
+
+def normalize_existing(apps, schema_editor):
+    Vehicle = apps.get_model('challan_app', 'Vehicle')
+    for vehicle in Vehicle.objects.only('id', 'registration_number').iterator():
+        vehicle.normalized_registration = re.sub(r'[^A-Z0-9]', '', vehicle.registration_number.upper())
+        vehicle.save(update_fields=['normalized_registration'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challan_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='normalized_registration',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(normalize_existing, migrations.RunPython.noop),
+    ]
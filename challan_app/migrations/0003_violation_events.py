@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:25
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challan_app', '0002_vehicle_normalized_registration'),
+        ('object_detection', '0009_plate_reads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViolationEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('plate_number', models.CharField(max_length=20)),
+                ('occurred_at', models.DateTimeField()),
+                ('location', models.CharField(max_length=200)),
+                ('evidence_path', models.CharField(blank=True, max_length=500, null=True)),
+                ('evidence_size', models.IntegerField(blank=True, null=True)),
+                ('evidence_mime_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('ISSUED', 'Challan Issued'), ('DUPLICATE', 'Duplicate'), ('UNMATCHED', 'No Matching Vehicle')], default='PENDING', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='object_detection.detectionsession')),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='challan_app.vehicle')),
+                ('video_source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='object_detection.videosource')),
+                ('violation_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='challan_app.violationtype')),
+            ],
+            options={
+                'db_table': 'violation_events',
+            },
+        ),
+        migrations.AddField(
+            model_name='challan',
+            name='violation_event',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='challan', to='challan_app.violationevent'),
+        ),
+        migrations.AddIndex(
+            model_name='violationevent',
+            index=models.Index(fields=['status', 'occurred_at'], name='violation_e_status_acfef6_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challan_app', '0003_violation_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChallanCounter',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'challan_counters',
+            },
+        ),
+    ]
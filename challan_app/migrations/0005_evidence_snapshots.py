@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challan_app', '0004_challan_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='violationevidence',
+            name='thumbnail_path',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='violationevidence',
+            name='violation_event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='evidence', to='challan_app.violationevent'),
+        ),
+        migrations.AlterField(
+            model_name='violationevidence',
+            name='challan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='evidence', to='challan_app.challan'),
+        ),
+    ]
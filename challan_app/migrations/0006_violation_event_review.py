@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challan_app', '0005_evidence_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='violationevent',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('ISSUED', 'Challan Issued'), ('DUPLICATE', 'Duplicate'), ('UNMATCHED', 'No Matching Vehicle'), ('NEEDS_REVIEW', 'Needs Manual Review')], default='PENDING', max_length=20),
+        ),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Length
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
 
+from .utils.vehicle_lookup import normalize_registration
+
 class Vehicle(models.Model):
     """Model for storing vehicle information"""
     VEHICLE_TYPES = [
@@ -14,6 +18,8 @@ class Vehicle(models.Model):
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     registration_number = models.CharField(max_length=20, unique=True)
+    # Uppercase, without spaces or punctuation, for exact lookups of OCR'd plates
+    normalized_registration = models.CharField(max_length=20, db_index=True, editable=False, default='')
     vehicle_type = models.CharField(max_length=2, choices=VEHICLE_TYPES)
     owner_name = models.CharField(max_length=100)
     owner_phone = models.CharField(max_length=15)
@@ -25,6 +31,10 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.registration_number} - {self.owner_name}"
     
+    def save(self, *args, **kwargs):
+        self.normalized_registration = normalize_registration(self.registration_number)
+        super().save(*args, **kwargs)
+    
     class Meta:
         db_table = 'vehicles'
         app_label = 'challan_app'
@@ -46,6 +56,49 @@ class ViolationType(models.Model):
         db_table = 'violation_types'
         app_label = 'challan_app'
 
+class ChallanCounter(models.Model):
+    """Model for storing the last challan number allocated in each year"""
+    year = models.PositiveIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+    
+    @classmethod
+    def _highest_issued(cls, year):
+        """Highest number already issued in a year, to start its counter after"""
+        prefix = f"CH{year}"
+        # Numbers are zero-padded, so the longest, then greatest, is the highest
+        challan_number = (Challan.objects
+                          .filter(challan_number__startswith=prefix)
+                          .order_by(Length('challan_number').desc(), '-challan_number')
+                          .values_list('challan_number', flat=True)
+                          .first())
+        return int(challan_number[len(prefix):]) if challan_number else 0
+    
+    @classmethod
+    def reserve(cls, count=1, year=None):
+        """Atomically reserve the next ``count`` challan numbers of a year
+        
+        The counter row is incremented in place, so its row lock serializes
+        concurrent issuers and a block of any size costs the same queries.
+        """
+        year = year or timezone.now().year
+        with transaction.atomic():
+            if not cls.objects.filter(year=year).update(last_number=F('last_number') + count):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(year=year, last_number=cls._highest_issued(year) + count)
+                except IntegrityError:
+                    # Another issuer created the year's counter first
+                    cls.objects.filter(year=year).update(last_number=F('last_number') + count)
+            last_number = cls.objects.filter(year=year).values_list('last_number', flat=True).get()
+        return [f"CH{year}{number:06d}" for number in range(last_number - count + 1, last_number + 1)]
+    
+    class Meta:
+        db_table = 'challan_counters'
+        app_label = 'challan_app'
+
 class Challan(models.Model):
     """Model for storing challan information"""
     STATUS_CHOICES = [
@@ -70,16 +123,16 @@ class Challan(models.Model):
     payment_method = models.CharField(max_length=50, blank=True, null=True)
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    # Detected violation this challan was issued for automatically, if any
+    violation_event = models.OneToOneField('ViolationEvent', on_delete=models.SET_NULL, blank=True, null=True,
+                                           related_name='challan')
     
     def __str__(self):
         return f"Challan {self.challan_number} - {self.vehicle.registration_number}"
     
     def save(self, *args, **kwargs):
         if not self.challan_number:
-            # Generate challan number
-            year = timezone.now().year
-            count = Challan.objects.filter(issued_at__year=year).count() + 1
-            self.challan_number = f"CH{year}{count:06d}"
+            self.challan_number = ChallanCounter.reserve()[0]
         
         if not self.fine_amount:
             self.fine_amount = self.violation_type.fine_amount
@@ -96,13 +149,17 @@ class Challan(models.Model):
 class ViolationEvidence(models.Model):
     """Model for storing evidence of violations (images, videos)"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    challan = models.ForeignKey(Challan, on_delete=models.CASCADE, related_name='evidence')
+    # Evidence captured at detection time has an event, and a challan once one is issued
+    challan = models.ForeignKey(Challan, on_delete=models.CASCADE, related_name='evidence', blank=True, null=True)
+    violation_event = models.ForeignKey('ViolationEvent', on_delete=models.SET_NULL, blank=True, null=True,
+                                        related_name='evidence')
     evidence_type = models.CharField(max_length=20, choices=[
         ('IMAGE', 'Image'),
         ('VIDEO', 'Video'),
         ('DOCUMENT', 'Document'),
     ])
     file_path = models.CharField(max_length=500)
+    thumbnail_path = models.CharField(max_length=500, blank=True, null=True)
     file_size = models.IntegerField()  # in bytes
     mime_type = models.CharField(max_length=100)
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -110,12 +167,48 @@ class ViolationEvidence(models.Model):
     processing_notes = models.TextField(blank=True, null=True)
     
     def __str__(self):
-        return f"Evidence for {self.challan.challan_number}"
+        if self.challan_id:
+            return f"Evidence for {self.challan.challan_number}"
+        return f"Evidence for event {self.violation_event_id}"
     
     class Meta:
         db_table = 'violation_evidence'
         app_label = 'challan_app'
 
+class ViolationEvent(models.Model):
+    """Model for storing violations detected automatically, awaiting a challan"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('ISSUED', 'Challan Issued'),
+        ('DUPLICATE', 'Duplicate'),
+        ('UNMATCHED', 'No Matching Vehicle'),
+        # Plate only close to a registration: an officer confirms the vehicle
+        # (back to PENDING to issue) or rejects it (UNMATCHED)
+        ('NEEDS_REVIEW', 'Needs Manual Review'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey('object_detection.DetectionSession', on_delete=models.SET_NULL, blank=True, null=True)
+    video_source = models.ForeignKey('object_detection.VideoSource', on_delete=models.SET_NULL, blank=True, null=True)
+    violation_type = models.ForeignKey(ViolationType, on_delete=models.CASCADE)
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.SET_NULL, blank=True, null=True)
+    plate_number = models.CharField(max_length=20)
+    occurred_at = models.DateTimeField()
+    location = models.CharField(max_length=200)
+    evidence_path = models.CharField(max_length=500, blank=True, null=True)
+    evidence_size = models.IntegerField(blank=True, null=True)  # in bytes
+    evidence_mime_type = models.CharField(max_length=100, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.violation_type.name} - {self.plate_number} ({self.status})"
+    
+    class Meta:
+        db_table = 'violation_events'
+        app_label = 'challan_app'
+        indexes = [models.Index(fields=['status', 'occurred_at'])]
+
 class Payment(models.Model):
     """Model for storing payment information"""
     PAYMENT_METHODS = [
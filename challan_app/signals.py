@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Vehicle
+from .utils.registration_index import registration_index
+from .utils.vehicle_lookup import vehicle_lookup_cache
+
+
+@receiver(pre_save, sender=Vehicle)
+def remember_registration(sender, instance, **kwargs):
+    """Keep the stored registration number so its cached plate can be dropped after an edit"""
+    instance._previous_registration = None
+    if not instance._state.adding:
+        instance._previous_registration = (Vehicle.objects.filter(pk=instance.pk)
+                                           .values_list('registration_number', flat=True).first())
+
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved(sender, instance, **kwargs):
+    registrations = [instance.registration_number]
+    if getattr(instance, '_previous_registration', None):
+        registrations.append(instance._previous_registration)
+    vehicle_lookup_cache.invalidate_vehicle(instance.id, *registrations)
+    registration_index.update(instance)
+
+
+@receiver(post_delete, sender=Vehicle)
+def vehicle_deleted(sender, instance, **kwargs):
+    vehicle_lookup_cache.invalidate_vehicle(instance.id, instance.registration_number)
+    registration_index.remove(instance.id)
@@ -1,3 +1,337 @@
-from django.test import TestCase
+import multiprocessing
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .models import Challan, ChallanCounter, Vehicle, ViolationEvent, ViolationEvidence, ViolationType
+from .utils.challan_ingestion import ChallanIngestor
+from .utils.registration_index import registration_index
+from .utils.vehicle_lookup import VehicleLookupCache, vehicle_lookup_cache
+
+
+def _reserve_in_process(reservations, block_size, results):
+    """Child process body: reserve numbers on its own connection"""
+    try:
+        numbers = []
+        for _ in range(reservations):
+            numbers.extend(ChallanCounter.reserve(block_size))
+        results.put(numbers)
+    finally:
+        connections.close_all()
+
+
+class ChallanCounterTests(TestCase):
+    """Allocation order and seeding of the per-year counter"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('officer', password='secret')
+        self.vehicle = Vehicle.objects.create(registration_number='MH12AB1234', vehicle_type='4W',
+                                              owner_name='Owner', owner_phone='9999999999', owner_address='Pune')
+        self.violation_type = ViolationType.objects.create(name='Signal Jumping', description='Red light',
+                                                           fine_amount=500, penalty_points=2)
+
+    def _challan(self, **kwargs):
+        return Challan(vehicle=self.vehicle, violation_type=self.violation_type, violation_date=timezone.now(),
+                       violation_location='Junction', issued_by=self.user, **kwargs)
+
+    def test_blocks_are_consecutive(self):
+        year = timezone.now().year
+        self.assertEqual(ChallanCounter.reserve(3), [f"CH{year}000001", f"CH{year}000002", f"CH{year}000003"])
+        self.assertEqual(ChallanCounter.reserve(), [f"CH{year}000004"])
+
+    def test_years_are_counted_separately(self):
+        self.assertEqual(ChallanCounter.reserve(2, year=2030), ['CH2030000001', 'CH2030000002'])
+        self.assertEqual(ChallanCounter.reserve(year=2031), ['CH2031000001'])
+
+    def test_counter_starts_after_existing_numbers(self):
+        year = timezone.now().year
+        self._challan(challan_number=f"CH{year}000041").save()
+        self._challan(challan_number=f"CH{year}000009").save()
+        self.assertEqual(ChallanCounter.reserve(), [f"CH{year}000042"])
+
+    def test_save_numbers_new_challans(self):
+        first = self._challan()
+        first.save()
+        second = self._challan()
+        second.save()
+        year = timezone.now().year
+        self.assertEqual([first.challan_number, second.challan_number], [f"CH{year}000001", f"CH{year}000002"])
+        self.assertEqual(first.fine_amount, self.violation_type.fine_amount)
+
+
+class ChallanCounterConcurrencyTests(TransactionTestCase):
+    """Concurrent issuers never receive the same challan number
+
+    Needs a database other connections can wait on, which is why the
+    SQLite test database is a file: in-memory SQLite is private to each
+    process, and its shared cache between threads fails with "table is
+    locked" instead of waiting.
+    """
+
+    THREADS = 8
+    PROCESSES = 4
+    RESERVATIONS = 25
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('in-memory SQLite cannot serve concurrent connections')
+
+    def _assert_unique_and_gapless(self, numbers):
+        self.assertEqual(len(numbers), len(set(numbers)))
+        year = timezone.now().year
+        self.assertEqual(sorted(numbers), [f"CH{year}{n:06d}" for n in range(1, len(numbers) + 1)])
+
+    def test_threads(self):
+        numbers = []
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.THREADS)
+
+        def issue(block_size):
+            try:
+                barrier.wait()
+                reserved = []
+                for _ in range(self.RESERVATIONS):
+                    reserved.extend(ChallanCounter.reserve(block_size))
+                with lock:
+                    numbers.extend(reserved)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        # Mix single numbers with blocks, as Challan.save() and bulk issuers do
+        threads = [threading.Thread(target=issue, args=(1 if i % 2 else 10,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(numbers), self.THREADS // 2 * self.RESERVATIONS * 11)
+        self._assert_unique_and_gapless(numbers)
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+    def test_processes(self):
+        # Children must open their own connections, not inherit ours
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [context.Process(target=_reserve_in_process, args=(self.RESERVATIONS, 1 if i % 2 else 5, results))
+                     for i in range(self.PROCESSES)]
+        for process in processes:
+            process.start()
+        numbers = []
+        for _ in processes:
+            numbers.extend(results.get(timeout=60))
+        for process in processes:
+            process.join(timeout=60)
+            self.assertEqual(process.exitcode, 0)
+
+        self.assertEqual(len(numbers), self.PROCESSES // 2 * self.RESERVATIONS * 6)
+        self._assert_unique_and_gapless(numbers)
+
+
+class VehicleLookupCacheTests(TestCase):
+    """Resolving plate text to vehicles through the in-memory LRU cache"""
+
+    def setUp(self):
+        self.vehicles = [
+            Vehicle.objects.create(registration_number=registration, vehicle_type='4W', owner_name='Owner',
+                                   owner_phone='9999999999', owner_address='Pune')
+            for registration in ('MH-12-AB-1234', 'KA 01 CD 5678', 'DL3CEF9012')
+        ]
+        registration_index.load()
+
+    def test_repeated_reads_skip_the_database(self):
+        cache = VehicleLookupCache()
+        with self.assertNumQueries(1):
+            self.assertEqual(cache.get_vehicle_id('mh12ab1234'), self.vehicles[0].id)
+            self.assertEqual(cache.get_vehicle_id('MH 12 AB 1234'), self.vehicles[0].id)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_misses_are_cached(self):
+        cache = VehicleLookupCache()
+        with self.assertNumQueries(1):
+            self.assertIsNone(cache.get_vehicle_id('TN09XY0000'))
+            self.assertIsNone(cache.get_vehicle_id('TN09XY0000'))
+
+    def test_least_recently_used_plate_is_evicted(self):
+        cache = VehicleLookupCache(max_size=2)
+        cache.get_vehicle_id('MH12AB1234')
+        cache.get_vehicle_id('KA01CD5678')
+        cache.get_vehicle_id('MH12AB1234')
+        cache.get_vehicle_id('DL3CEF9012')
+        self.assertEqual(cache.get_statistics()['entries'], 2)
+        with self.assertNumQueries(0):
+            cache.get_vehicle_id('MH12AB1234')
+        with self.assertNumQueries(1):
+            cache.get_vehicle_id('KA01CD5678')
+
+    def test_expired_and_invalidated_entries_are_queried_again(self):
+        cache = VehicleLookupCache(ttl=0)
+        cache.get_vehicle_id('MH12AB1234')
+        with self.assertNumQueries(1):
+            cache.get_vehicle_id('MH12AB1234')
+
+        cache = VehicleLookupCache()
+        cache.get_vehicle_id('MH12AB1234')
+        cache.invalidate('MH-12-AB-1234')
+        with self.assertNumQueries(1):
+            cache.get_vehicle_id('MH12AB1234')
+
+    def test_empty_plate_is_not_looked_up(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(VehicleLookupCache().get_vehicle_id(' - '))
+
+    def test_misread_plate_is_only_a_candidate(self):
+        cache = VehicleLookupCache()
+        self.assertIsNone(cache.get_vehicle_id('MH12A81234'))
+        self.assertEqual(cache.find_candidate('MH12A81234'), self.vehicles[0].id)
+        self.assertEqual(cache.find_candidate('KA01CD678'), self.vehicles[1].id)
+        self.assertEqual(cache.get_statistics()['fuzzy_matches'], 2)
+        self.assertIsNone(VehicleLookupCache(fuzzy_distance=None).find_candidate('MH12A81234'))
+
+    def test_equally_close_registrations_are_no_candidate(self):
+        Vehicle.objects.create(registration_number='MH12AB1235', vehicle_type='4W', owner_name='Owner',
+                               owner_phone='9999999999', owner_address='Pune')
+        self.assertIsNone(VehicleLookupCache().find_candidate('MH12AB123'))
+
+    def test_warm_builds_the_index_in_the_background(self):
+        registration_index.loaded = False
+        registration_index.warm().join(timeout=10)
+        self.assertTrue(registration_index.loaded)
+        with self.assertNumQueries(0):
+            registration_index.search('DL3CEF9012')
+
+    def test_vehicle_changes_reach_the_shared_cache_and_index(self):
+        vehicle = self.vehicles[0]
+        self.assertEqual(vehicle_lookup_cache.get_vehicle_id('MH12AB1234'), vehicle.id)
+        self.assertIsNone(vehicle_lookup_cache.get_vehicle_id('GJ05EF4321'))
+
+        vehicle.registration_number = 'GJ-05-EF-4321'
+        vehicle.save()
+        self.assertIsNone(vehicle_lookup_cache.get_vehicle_id('MH12AB1234'))
+        self.assertEqual(vehicle_lookup_cache.get_vehicle_id('GJ05EF4321'), vehicle.id)
+        self.assertEqual(registration_index.search('GJ05EF432')[0][0], vehicle.id)
+
+        vehicle.delete()
+        self.assertIsNone(vehicle_lookup_cache.get_vehicle_id('GJ05EF4321'))
+        self.assertEqual(registration_index.search('GJ05EF4321'), [])
+
+
+class ChallanIngestorTests(TestCase):
+    """Issuing challans from pending violation events"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('officer', password='secret')
+        self.violation_type = ViolationType.objects.create(name='Red light', description='Jumped a red light',
+                                                           fine_amount=1000, penalty_points=2)
+        self.vehicle = Vehicle.objects.create(registration_number='MH-12-AB-1234', vehicle_type='4W',
+                                              owner_name='Owner', owner_phone='9999999999', owner_address='Pune')
+        registration_index.load()
+        vehicle_lookup_cache.invalidate()
+        self.now = timezone.now()
+
+    def _event(self, plate='MH12AB1234', minutes=0, **kwargs):
+        return ViolationEvent.objects.create(violation_type=self.violation_type, plate_number=plate,
+                                             occurred_at=self.now + timedelta(minutes=minutes),
+                                             location='Junction 4', **kwargs)
+
+    def test_close_plate_is_left_for_review(self):
+        event = self._event(plate='MH12A81234')
+        ingestor = ChallanIngestor(self.user)
+        self.assertEqual(ingestor.run(), 0)
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.vehicle_id), ('NEEDS_REVIEW', self.vehicle.id))
+        self.assertFalse(Challan.objects.exists())
+        self.assertEqual(ingestor.get_statistics()['needs_review'], 1)
+
+        # An officer confirms the candidate; the next run issues it
+        ViolationEvent.objects.filter(pk=event.pk).update(status='PENDING')
+        self.assertEqual(ChallanIngestor(self.user).run(), 1)
+        self.assertEqual(Challan.objects.get().vehicle_id, self.vehicle.id)
+
+    def test_one_challan_per_vehicle_and_violation_within_the_dedupe_window(self):
+        first = self._event()
+        repeat = self._event(minutes=10)
+        later = self._event(minutes=45)
+        self.assertEqual(ChallanIngestor(self.user, dedupe_window=timedelta(minutes=30)).run(), 2)
+        statuses = dict(ViolationEvent.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[event.id] for event in (first, repeat, later)], ['ISSUED', 'DUPLICATE', 'ISSUED'])
+
+        # A challan from an earlier run counts too
+        self._event(minutes=50)
+        ingestor = ChallanIngestor(self.user, dedupe_window=timedelta(minutes=30))
+        self.assertEqual(ingestor.run(), 0)
+        self.assertEqual(ingestor.get_statistics()['duplicates'], 1)
+
+    def test_unknown_plate_is_unmatched(self):
+        event = self._event(plate='TN09XY0000')
+        ingestor = ChallanIngestor(self.user)
+        self.assertEqual(ingestor.run(), 0)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.vehicle_id), ('UNMATCHED', None))
+        self.assertEqual(ingestor.get_statistics()['unmatched'], 1)
+
+    def test_numbers_are_reserved_once_per_batch(self):
+        for minutes in range(0, 250, 50):
+            self._event(minutes=minutes)
+        with mock.patch.object(ChallanCounter, 'reserve', wraps=ChallanCounter.reserve) as reserve:
+            self.assertEqual(ChallanIngestor(self.user, batch_size=3).run(), 5)
+        self.assertEqual([call.args for call in reserve.call_args_list], [(3,), (2,)])
+        self.assertEqual(Challan.objects.count(), 5)
+
+    def test_event_evidence_is_linked_to_the_challan(self):
+        clip = self._event(evidence_path='/media/clip.mp4', evidence_size=2048, evidence_mime_type='video/mp4')
+        snapshot_event = self._event(plate='KA01CD5678')
+        Vehicle.objects.create(registration_number='KA01CD5678', vehicle_type='2W', owner_name='Owner',
+                               owner_phone='9999999999', owner_address='Pune')
+        # Written at detection time, before any challan exists
+        snapshot = ViolationEvidence.objects.create(violation_event=snapshot_event, evidence_type='IMAGE',
+                                                    file_path='/media/snapshot.jpg', file_size=512,
+                                                    mime_type='image/jpeg')
+        ingestor = ChallanIngestor(self.user)
+        self.assertEqual(ingestor.run(), 2)
+
+        clip_evidence = ViolationEvidence.objects.get(file_path='/media/clip.mp4')
+        self.assertEqual(clip_evidence.challan.violation_event_id, clip.id)
+        self.assertEqual(clip_evidence.evidence_type, 'VIDEO')
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.challan.violation_event_id, snapshot_event.id)
+        self.assertEqual(ingestor.get_statistics()['evidence_linked'], 2)
+
+    def test_evidence_written_after_the_challan_is_linked(self):
+        from object_detection.utils.evidence_writer import EvidenceWriter, SnapshotJob
+        from object_detection.utils.object_detector import ObjectDetector
+
+        event = self._event()
+        ChallanIngestor(self.user).run()
+        challan = Challan.objects.get(violation_event=event)
+
+        # A clip export and a snapshot finishing only now
+        ObjectDetector._attach_clip(event.id, '/media/late.mp4', 4096, 'video/mp4')
+        writer = EvidenceWriter(max_workers=0, flush_interval=60)
+        writer._rows.append((SnapshotJob(None, None, '/media/late', violation_event_id=event.id),
+                             '/media/late.jpg', None, 512))
+        writer.flush()
+        writer.close()
+
+        self.assertEqual(sorted(challan.evidence.values_list('file_path', flat=True)),
+                         ['/media/late.jpg', '/media/late.mp4'])
+
+    def test_clip_recorded_before_ingestion_is_not_duplicated(self):
+        from object_detection.utils.object_detector import ObjectDetector
+
+        event = self._event()
+        ObjectDetector._attach_clip(event.id, '/media/early.mp4', 4096, 'video/mp4')
+        ChallanIngestor(self.user).run()
+        evidence = ViolationEvidence.objects.get(violation_event=event)
+        self.assertEqual((evidence.file_path, evidence.challan.violation_event_id), ('/media/early.mp4', event.id))
@@ -0,0 +1,201 @@
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from .vehicle_lookup import vehicle_lookup_cache
+
+
+def link_evidence(event_ids):
+    """Attach the events' evidence that has no challan yet to their challans, in one UPDATE
+
+    Evidence is written in the background, so it may land just before or
+    after its event is challaned; whichever side inserts last calls this.
+    Returns the number of rows linked.
+    """
+    from challan_app.models import Challan, ViolationEvidence
+
+    event_ids = [event_id for event_id in event_ids if event_id]
+    if not event_ids:
+        return 0
+    return (ViolationEvidence.objects
+            .filter(violation_event_id__in=event_ids, challan__isnull=True,
+                    violation_event__challan__isnull=False)
+            .update(challan=Subquery(Challan.objects
+                                     .filter(violation_event_id=OuterRef('violation_event_id'))
+                                     .values('id')[:1])))
+
+
+class ChallanIngestor:
+    """Issues challans for pending ViolationEvents in batches
+
+    Each batch loads its violation types and the last matching challans in
+    a couple of queries, then writes its challans and evidence rows with one
+    bulk insert each and its event statuses with one update per status,
+    instead of a ``Challan.save()`` (and its queries) per violation. A vehicle already challaned, or already
+    issued one in the same batch, for the same violation within
+    ``dedupe_window`` gets no second challan; its event is marked DUPLICATE.
+
+    Only plates that exactly match a registration are challaned. An event
+    whose plate is merely close to one gets that vehicle as a candidate and
+    is marked NEEDS_REVIEW, so an officer confirms it before it is issued.
+    """
+
+    def __init__(self, issued_by, batch_size=500, dedupe_window=timedelta(minutes=30)):
+        self.issued_by = issued_by
+        self.batch_size = batch_size
+        self.dedupe_window = dedupe_window
+
+        self._violation_types = {}
+        self.batches = 0
+        self.events_processed = 0
+        self.challans_issued = 0
+        self.evidence_linked = 0
+        self.duplicates = 0
+        self.unmatched = 0
+        self.needs_review = 0
+        self.processing_time = 0.0
+
+    def _load_violation_types(self, events):
+        from challan_app.models import ViolationType
+
+        missing = {event.violation_type_id for event in events} - set(self._violation_types)
+        if missing:
+            self._violation_types.update(ViolationType.objects.in_bulk(missing))
+
+    def _last_issued(self, events):
+        """Latest challan date per (vehicle, violation) pair the batch could repeat"""
+        from challan_app.models import Challan
+
+        vehicle_ids = {event.vehicle_id for event in events if event.vehicle_id and event.status == 'PENDING'}
+        if not vehicle_ids:
+            return {}
+        since = min(event.occurred_at for event in events) - self.dedupe_window
+        rows = (Challan.objects
+                .filter(vehicle_id__in=vehicle_ids,
+                        violation_type_id__in={event.violation_type_id for event in events},
+                        violation_date__gte=since)
+                .exclude(status='CANCELLED')
+                .values('vehicle_id', 'violation_type_id')
+                .annotate(last_date=Max('violation_date')))
+        return {(row['vehicle_id'], row['violation_type_id']): row['last_date'] for row in rows}
+
+    def _issue_batch(self, events):
+        from challan_app.models import Challan, ChallanCounter, ViolationEvent, ViolationEvidence
+
+        self._load_violation_types(events)
+        resolved = []
+        for event in events:
+            if event.vehicle_id is None:
+                event.vehicle_id = vehicle_lookup_cache.get_vehicle_id(event.plate_number)
+                if event.vehicle_id is None:
+                    event.vehicle_id = vehicle_lookup_cache.find_candidate(event.plate_number)
+                    if event.vehicle_id is not None:
+                        event.status = 'NEEDS_REVIEW'
+                if event.vehicle_id is not None:
+                    resolved.append(event)
+
+        last_issued = self._last_issued(events)
+        to_issue = []
+        for event in events:
+            if event.status == 'NEEDS_REVIEW':
+                continue
+            if event.vehicle_id is None:
+                event.status = 'UNMATCHED'
+                continue
+            key = (event.vehicle_id, event.violation_type_id)
+            last_date = last_issued.get(key)
+            if last_date is not None and abs(event.occurred_at - last_date) < self.dedupe_window:
+                event.status = 'DUPLICATE'
+                continue
+            last_issued[key] = event.occurred_at
+            to_issue.append(event)
+
+        # Clips already recorded as evidence rows are linked below, not copied
+        recorded = set(ViolationEvidence.objects
+                       .filter(violation_event_id__in=[event.id for event in to_issue if event.evidence_path])
+                       .values_list('violation_event_id', 'file_path'))
+        challans = []
+        evidence = []
+        # One reservation for the whole batch
+        challan_numbers = ChallanCounter.reserve(len(to_issue)) if to_issue else []
+        for event, challan_number in zip(to_issue, challan_numbers):
+            violation_type = self._violation_types[event.violation_type_id]
+            challan = Challan(
+                challan_number=challan_number,
+                vehicle_id=event.vehicle_id,
+                violation_type=violation_type,
+                violation_date=event.occurred_at,
+                violation_location=event.location,
+                fine_amount=violation_type.fine_amount,
+                penalty_points=violation_type.penalty_points,
+                issued_by=self.issued_by,
+                notes=f"Issued automatically from detected plate {event.plate_number}",
+                violation_event=event,
+            )
+            challans.append(challan)
+            event.status = 'ISSUED'
+            if event.evidence_path and (event.id, event.evidence_path) not in recorded:
+                mime_type = event.evidence_mime_type or 'image/jpeg'
+                evidence.append(ViolationEvidence(
+                    challan=challan,
+                    violation_event=event,
+                    evidence_type='VIDEO' if mime_type.startswith('video/') else 'IMAGE',
+                    file_path=event.evidence_path,
+                    file_size=event.evidence_size or 0,
+                    mime_type=mime_type,
+                ))
+
+        Challan.objects.bulk_create(challans)
+        ViolationEvidence.objects.bulk_create(evidence)
+        # Snapshots and clips written at detection time move to the new challans
+        linked = link_evidence([event.id for event in to_issue]) if challans else 0
+        if resolved:
+            ViolationEvent.objects.bulk_update(resolved, ['vehicle'])
+        # bulk_update builds a CASE per row, so set each status with one plain UPDATE
+        for status in ('ISSUED', 'DUPLICATE', 'UNMATCHED', 'NEEDS_REVIEW'):
+            event_ids = [event.id for event in events if event.status == status]
+            if event_ids:
+                ViolationEvent.objects.filter(id__in=event_ids).update(status=status)
+
+        self.batches += 1
+        self.events_processed += len(events)
+        self.challans_issued += len(challans)
+        self.evidence_linked += len(evidence) + linked
+        self.duplicates += sum(1 for event in events if event.status == 'DUPLICATE')
+        self.unmatched += sum(1 for event in events if event.status == 'UNMATCHED')
+        self.needs_review += sum(1 for event in events if event.status == 'NEEDS_REVIEW')
+
+    def run(self, max_batches=None):
+        """Issue challans for pending events until none are left; returns the count issued"""
+        from challan_app.models import ViolationEvent
+
+        issued_before = self.challans_issued
+        while max_batches is None or self.batches < max_batches:
+            start_time = time.time()
+            with transaction.atomic():
+                # Oldest first, so the first of a run of repeats is the one challaned
+                events = list(ViolationEvent.objects
+                              .select_for_update()
+                              .filter(status='PENDING')
+                              .order_by('occurred_at')[:self.batch_size])
+                if not events:
+                    break
+                self._issue_batch(events)
+            self.processing_time += time.time() - start_time
+        return self.challans_issued - issued_before
+
+    def get_statistics(self):
+        return {
+            'batches': self.batches,
+            'events_processed': self.events_processed,
+            'challans_issued': self.challans_issued,
+            'evidence_linked': self.evidence_linked,
+            'duplicates': self.duplicates,
+            'unmatched': self.unmatched,
+            'needs_review': self.needs_review,
+            'processing_time': self.processing_time,
+            'challans_per_second': self.challans_issued / self.processing_time if self.processing_time else 0.0,
+            'events_per_second': self.events_processed / self.processing_time if self.processing_time else 0.0,
+        }
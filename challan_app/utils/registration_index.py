@@ -0,0 +1,203 @@
+import threading
+
+from django.db import connection
+
+from .vehicle_lookup import normalize_registration
+
+# Characters OCR engines commonly misread as one another, folded to one symbol
+_CONFUSABLES = str.maketrans({
+    'O': '0', 'Q': '0', 'D': '0',
+    'I': '1', 'L': '1',
+    'Z': '2',
+    'S': '5',
+    'G': '6',
+    'B': '8',
+})
+
+
+def fold_confusables(key):
+    """Normalized registration number with look-alike characters folded together"""
+    return key.translate(_CONFUSABLES)
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two short strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def _deletes(key):
+    """Every string one character deletion away from ``key``"""
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+# Almost every key maps to a single value, so the index holds a bare value
+# and only switches to a set on a collision; millions of one-element sets
+# would take several times the memory.
+
+def _members(entry):
+    if entry is None:
+        return ()
+    return entry if isinstance(entry, set) else (entry,)
+
+
+def _insert(mapping, key, value):
+    entry = mapping.get(key)
+    if entry is None:
+        mapping[key] = value
+    elif isinstance(entry, set):
+        entry.add(value)
+    elif entry != value:
+        mapping[key] = {entry, value}
+
+
+def _discard(mapping, key, value):
+    entry = mapping.get(key)
+    if isinstance(entry, set):
+        entry.discard(value)
+        if len(entry) == 1:
+            mapping[key] = entry.pop()
+    elif entry == value:
+        del mapping[key]
+
+
+class RegistrationIndex:
+    """In-memory approximate index over every Vehicle's registration number
+
+    Keys are folded so look-alike characters (0/O, 1/I, 8/B, ...) compare
+    equal, and every folded key is also indexed under its single-character
+    deletions. A plate missing, gaining or misreading one more character
+    then shares a deletion with its key, so a search is a dozen dictionary
+    lookups however many vehicles are indexed, instead of the tree walk a
+    BK-tree would need. Candidates are verified and ranked by edit distance.
+    """
+
+    def __init__(self):
+        self._registrations = {}  # vehicle id -> normalized registration number
+        self._folded = {}  # folded key -> vehicle id(s)
+        self._deleted = {}  # deletion of a folded key -> folded key(s)
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.searches = 0
+
+    def _add(self, vehicle_id, registration_number):
+        key = normalize_registration(registration_number)
+        if not key:
+            return
+        folded = fold_confusables(key)
+        self._registrations[vehicle_id] = key
+        _insert(self._folded, folded, vehicle_id)
+        for deletion in _deletes(folded):
+            _insert(self._deleted, deletion, folded)
+
+    def _remove(self, vehicle_id):
+        key = self._registrations.pop(vehicle_id, None)
+        if key is None:
+            return
+        folded = fold_confusables(key)
+        _discard(self._folded, folded, vehicle_id)
+        if folded in self._folded:
+            return
+        # Last vehicle under this folded key: drop its deletions too
+        for deletion in _deletes(folded):
+            _discard(self._deleted, deletion, folded)
+
+    def load(self):
+        """(Re)build the index from the vehicles table"""
+        from challan_app.models import Vehicle
+
+        with self._lock:
+            self._registrations, self._folded, self._deleted = {}, {}, {}
+            for vehicle_id, registration_number in (Vehicle.objects
+                                                    .values_list('id', 'registration_number')
+                                                    .iterator(chunk_size=10000)):
+                self._add(vehicle_id, registration_number)
+            self.loaded = True
+
+    def warm(self):
+        """Build the index on a background thread, so the first plate search doesn't wait for it"""
+        def load():
+            try:
+                with self._lock:
+                    if not self.loaded:
+                        self.load()
+            except Exception as e:
+                print(f"Error loading registration index: {str(e)}")
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=load, name='registration-index', daemon=True)
+        thread.start()
+        return thread
+
+    def update(self, vehicle):
+        """Index a created or edited vehicle under its current registration number"""
+        with self._lock:
+            if not self.loaded:
+                return
+            self._remove(vehicle.id)
+            self._add(vehicle.id, vehicle.registration_number)
+
+    def remove(self, vehicle_id):
+        """Drop a deleted vehicle from the index"""
+        with self._lock:
+            self._remove(vehicle_id)
+
+    def search(self, plate, limit=10):
+        """Vehicles whose registration could have been read as ``plate``
+
+        Returns up to ``limit`` (vehicle id, registration number, distance)
+        tuples, best first. ``distance`` counts edits after folding
+        look-alike characters, so 0 means an exact or confusable-only match;
+        ties are broken by the edits needed without folding.
+        """
+        key = normalize_registration(plate)
+        if not key:
+            return []
+
+        with self._lock:
+            if not self.loaded:
+                self.load()
+            self.searches += 1
+
+            folded = fold_confusables(key)
+            variants = {folded} | _deletes(folded)
+            candidates = set()
+            for variant in variants:
+                if variant in self._folded:
+                    candidates.add(variant)
+                candidates.update(_members(self._deleted.get(variant)))
+
+            matches = []
+            for candidate in candidates:
+                distance = edit_distance(folded, candidate)
+                # Shared deletions can also pair keys two edits apart
+                if distance > 1:
+                    continue
+                for vehicle_id in _members(self._folded[candidate]):
+                    registration = self._registrations[vehicle_id]
+                    matches.append((distance, edit_distance(key, registration), registration, vehicle_id))
+
+        matches.sort(key=lambda match: match[:3])
+        return [(vehicle_id, registration, distance)
+                for distance, _, registration, vehicle_id in matches[:limit]]
+
+    def get_statistics(self):
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'vehicles': len(self._registrations),
+                'folded_keys': len(self._folded),
+                'deletion_keys': len(self._deleted),
+                'searches': self.searches,
+            }
+
+
+registration_index = RegistrationIndex()
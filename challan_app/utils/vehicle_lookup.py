@@ -0,0 +1,118 @@
+import collections
+import re
+import threading
+import time
+
+_NON_ALPHANUMERIC = re.compile(r'[^A-Z0-9]')
+
+
+def normalize_registration(registration_number):
+    """Uppercase registration number with spaces, dashes and dots removed"""
+    return _NON_ALPHANUMERIC.sub('', (registration_number or '').upper())
+
+
+class VehicleLookupCache:
+    """LRU cache from plate text to Vehicle id, so repeated reads skip the database
+
+    Misses are cached too, for a shorter time, so a plate that matches no
+    vehicle doesn't query the ``vehicles`` table on every read either.
+
+    Only exact matches resolve: a misread plate may be another owner's
+    registration, so ``find_candidate`` offers its closest registration
+    separately, for an officer to confirm before anyone is challaned. That
+    is the registration at most ``fuzzy_distance`` edits away in the
+    OCR-tolerant registration index when no other is as close;
+    ``fuzzy_distance=None`` disables it.
+    """
+
+    def __init__(self, max_size=100000, ttl=300, negative_ttl=30, fuzzy_distance=1):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.fuzzy_distance = fuzzy_distance
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fuzzy_matches = 0
+
+    def _query(self, key):
+        from challan_app.models import Vehicle
+
+        vehicle = Vehicle.objects.filter(normalized_registration=key).only('id').first()
+        return vehicle.id if vehicle is not None else None
+
+    def find_candidate(self, registration_number):
+        """Id of the one Vehicle a misread of this plate most likely belongs to, or None"""
+        from .registration_index import registration_index
+
+        key = normalize_registration(registration_number)
+        if not key or self.fuzzy_distance is None:
+            return None
+
+        matches = registration_index.search(key, limit=2)
+        if not matches or matches[0][2] > self.fuzzy_distance:
+            return None
+        if len(matches) > 1 and matches[1][2] == matches[0][2]:
+            return None  # Ambiguous: two registrations are equally close
+        with self._lock:
+            self.fuzzy_matches += 1
+        return matches[0][0]
+
+    def get_vehicle_id(self, registration_number):
+        """Id of the Vehicle registered under exactly this plate, or None"""
+        key = normalize_registration(registration_number)
+        if not key:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        vehicle_id = self._query(key)
+        expires_at = now + (self.ttl if vehicle_id else self.negative_ttl)
+        with self._lock:
+            self._entries[key] = (vehicle_id, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vehicle_id
+
+    def invalidate(self, registration_number=None):
+        """Forget one plate, or every plate if none is given"""
+        with self._lock:
+            if registration_number is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(normalize_registration(registration_number), None)
+
+    def invalidate_vehicle(self, vehicle_id, *registration_numbers):
+        """Forget a created, edited or deleted vehicle
+
+        Drops its registration numbers, every plate resolved to it, and the
+        cached misses, which may now resolve to it.
+        """
+        keys = {normalize_registration(registration_number) for registration_number in registration_numbers}
+        with self._lock:
+            for key in [key for key, (cached_id, _) in self._entries.items()
+                        if key in keys or cached_id is None or cached_id == vehicle_id]:
+                del self._entries[key]
+
+    def get_statistics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'fuzzy_matches': self.fuzzy_matches,
+            }
+
+
+vehicle_lookup_cache = VehicleLookupCache()
@@ -10,6 +10,7 @@ import json
 
 from .models import Vehicle, ViolationType, Challan, ViolationEvidence, Payment, PoliceOfficer
 from .forms import VehicleForm, ChallanForm, ViolationEvidenceForm
+from .utils.registration_index import registration_index
 
 @login_required
 def dashboard(request):
@@ -172,7 +173,11 @@ def challan_list(request):
 def challan_detail(request, challan_id):
     """Show challan details"""
     challan = get_object_or_404(Challan, id=challan_id)
-    evidence = ViolationEvidence.objects.filter(challan=challan)
+    # Evidence of the challan's event may still be waiting to be linked to it
+    evidence_filter = Q(challan=challan)
+    if challan.violation_event_id:
+        evidence_filter |= Q(violation_event_id=challan.violation_event_id)
+    evidence = ViolationEvidence.objects.filter(evidence_filter)
     
     try:
         payment = Payment.objects.get(challan=challan)
@@ -301,6 +306,18 @@ def api_vehicle_search(request):
     if len(query) < 3:
         return JsonResponse({'vehicles': []})
     
+    # Plate reads: rank registrations an OCR misread or dropped character away
+    if request.GET.get('fuzzy'):
+        matches = registration_index.search(query)
+        vehicles = Vehicle.objects.in_bulk([vehicle_id for vehicle_id, _, _ in matches])
+        return JsonResponse({'vehicles': [{
+            'id': str(vehicle_id),
+            'registration_number': vehicles[vehicle_id].registration_number,
+            'owner_name': vehicles[vehicle_id].owner_name,
+            'vehicle_type': vehicles[vehicle_id].get_vehicle_type_display(),
+            'distance': distance,
+        } for vehicle_id, _, distance in matches if vehicle_id in vehicles]})
+    
     vehicles = Vehicle.objects.filter(
         Q(registration_number__icontains=query) |
         Q(owner_name__icontains=query)
@@ -1,18 +1,19 @@
 from django.contrib import admin
-from .models import DetectionSession, VideoSource, DetectionResult, ROI, ModelConfiguration
+from .models import DetectionSession, VideoSource, DetectionResult, ROI, ModelConfiguration, CountingLine, VehicleFlowCount, PlateRead
+from .utils.roi_masks import roi_mask_cache
 
 @admin.register(DetectionSession)
 class DetectionSessionAdmin(admin.ModelAdmin):
-    list_display = ['session_name', 'user', 'status', 'started_at', 'total_frames_processed', 'total_detections']
+    list_display = ['session_name', 'user', 'status', 'started_at', 'total_frames_processed', 'total_detections', 'frames_skipped_static']
     list_filter = ['status', 'started_at']
     search_fields = ['session_name', 'user__username']
-    readonly_fields = ['id', 'started_at', 'total_frames_processed', 'total_detections']
+    readonly_fields = ['id', 'started_at', 'total_frames_processed', 'total_detections', 'frames_skipped_static', 'inference_time_saved', 'frames_dropped', 'vehicles_tracked']
     ordering = ['-started_at']
     date_hierarchy = 'started_at'
 
 @admin.register(VideoSource)
 class VideoSourceAdmin(admin.ModelAdmin):
-    list_display = ['name', 'source_type', 'is_active', 'created_at']
+    list_display = ['name', 'source_type', 'priority', 'max_fps', 'is_active', 'created_at']
     list_filter = ['source_type', 'is_active', 'created_at']
     search_fields = ['name', 'source_url', 'file_path']
     readonly_fields = ['id', 'created_at', 'updated_at']
@@ -34,11 +35,48 @@ class ROIAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     readonly_fields = ['id', 'created_at', 'updated_at']
     ordering = ['name']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        roi_mask_cache.invalidate(obj.video_source_id)
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        roi_mask_cache.invalidate(obj.video_source_id)
+    
+    def delete_queryset(self, request, queryset):
+        source_ids = set(queryset.values_list('video_source_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for source_id in source_ids:
+            roi_mask_cache.invalidate(source_id)
+
+@admin.register(CountingLine)
+class CountingLineAdmin(admin.ModelAdmin):
+    list_display = ['name', 'video_source', 'roi', 'start_x', 'start_y', 'end_x', 'end_y', 'is_active']
+    list_filter = ['video_source', 'is_active', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['id', 'created_at', 'updated_at']
+    ordering = ['name']
+
+@admin.register(VehicleFlowCount)
+class VehicleFlowCountAdmin(admin.ModelAdmin):
+    list_display = ['counting_line', 'bucket_start', 'object_class', 'direction', 'count']
+    list_filter = ['counting_line', 'direction', 'object_class']
+    ordering = ['-bucket_start']
+    date_hierarchy = 'bucket_start'
+
+@admin.register(PlateRead)
+class PlateReadAdmin(admin.ModelAdmin):
+    list_display = ['plate_number', 'vehicle', 'confidence', 'session', 'video_source', 'track_id', 'read_at']
+    list_filter = ['video_source', 'read_at']
+    search_fields = ['plate_number', 'vehicle__registration_number']
+    readonly_fields = ['id', 'read_at']
+    ordering = ['-read_at']
 
 @admin.register(ModelConfiguration)
 class ModelConfigurationAdmin(admin.ModelAdmin):
-    list_display = ['model_name', 'confidence_threshold', 'nms_threshold', 'max_detections', 'is_active']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['model_name', 'backend', 'quantization', 'confidence_threshold', 'nms_threshold', 'max_detections', 'is_active']
+    list_filter = ['backend', 'quantization', 'is_active', 'created_at']
     search_fields = ['model_name', 'model_path']
     readonly_fields = ['id', 'created_at', 'updated_at']
     ordering = ['model_name']
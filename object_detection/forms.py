@@ -11,6 +11,8 @@ class VideoSourceForm(forms.ModelForm):
             'source_type',
             'source_url',
             'file_path',
+            'priority',
+            'max_fps',
             'is_active',
         ]
         widgets = {
@@ -29,6 +31,17 @@ class VideoSourceForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Enter file path (for file sources)'
             }),
+            'priority': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': '1',
+                'placeholder': '1'
+            }),
+            'max_fps': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'step': '0.5',
+                'min': '0.1',
+                'placeholder': 'Leave empty for no limit'
+            }),
             'is_active': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             }),
@@ -46,6 +59,10 @@ class VideoSourceForm(forms.ModelForm):
         if source_type == 'FILE' and not file_path:
             raise forms.ValidationError("File path is required for file sources")
         
+        max_fps = cleaned_data.get('max_fps')
+        if max_fps is not None and max_fps <= 0:
+            raise forms.ValidationError("Max FPS must be positive")
+        
         return cleaned_data
 
 class ROIForm(forms.ModelForm):
@@ -59,7 +76,9 @@ class ROIForm(forms.ModelForm):
             'y_coordinate',
             'width',
             'height',
+            'polygon',
             'description',
+            'violation_type',
             'is_active',
         ]
         widgets = {
@@ -87,16 +106,30 @@ class ROIForm(forms.ModelForm):
                 'min': '1',
                 'placeholder': 'Height'
             }),
+            'polygon': forms.Textarea(attrs={
+                'class': 'form-control',
+                'rows': 2,
+                'placeholder': 'Optional polygon vertices, e.g. [[100, 400], [300, 200], [420, 200], [640, 400]]'
+            }),
             'description': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 2,
                 'placeholder': 'Brief description of this ROI'
             }),
+            'violation_type': forms.Select(attrs={
+                'class': 'form-control'
+            }),
             'is_active': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             }),
         }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A polygon fills in the rectangle, so neither is required on its own
+        for field in ('x_coordinate', 'y_coordinate', 'width', 'height'):
+            self.fields[field].required = False
+    
     def clean(self):
         cleaned_data = super().clean()
         x = cleaned_data.get('x_coordinate')
@@ -116,6 +149,29 @@ class ROIForm(forms.ModelForm):
         if height is not None and height <= 0:
             raise forms.ValidationError("Height must be positive")
         
+        polygon = cleaned_data.get('polygon')
+        if polygon:
+            if (not isinstance(polygon, list) or len(polygon) < 3 or
+                    not all(isinstance(p, list) and len(p) == 2 for p in polygon)):
+                raise forms.ValidationError("Polygon must be a list of at least 3 [x, y] points")
+            try:
+                polygon = [[int(x), int(y)] for x, y in polygon]
+            except (TypeError, ValueError):
+                raise forms.ValidationError("Polygon points must be numbers")
+            if any(x < 0 or y < 0 for x, y in polygon):
+                raise forms.ValidationError("Polygon points cannot be negative")
+            
+            # The rectangle fields hold the polygon's bounds (used for cropping and motion gating)
+            xs = [x for x, _ in polygon]
+            ys = [y for _, y in polygon]
+            cleaned_data['polygon'] = polygon
+            cleaned_data['x_coordinate'] = min(xs)
+            cleaned_data['y_coordinate'] = min(ys)
+            cleaned_data['width'] = max(1, max(xs) - min(xs))
+            cleaned_data['height'] = max(1, max(ys) - min(ys))
+        elif None in (x, y, width, height):
+            raise forms.ValidationError("Enter either a rectangle or a polygon")
+        
         return cleaned_data
 
 class ModelConfigurationForm(forms.ModelForm):
@@ -127,6 +183,8 @@ class ModelConfigurationForm(forms.ModelForm):
             'model_name',
             'model_path',
             'labels_path',
+            'backend',
+            'quantization',
             'confidence_threshold',
             'nms_threshold',
             'max_detections',
@@ -145,6 +203,12 @@ class ModelConfigurationForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Enter path to labels file'
             }),
+            'backend': forms.Select(attrs={
+                'class': 'form-control'
+            }),
+            'quantization': forms.Select(attrs={
+                'class': 'form-control'
+            }),
             'confidence_threshold': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'step': '0.1',
@@ -186,6 +250,16 @@ class ModelConfigurationForm(forms.ModelForm):
         if max_det < 1:
             raise forms.ValidationError("Maximum detections must be at least 1")
         return max_det
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        backend = cleaned_data.get('backend')
+        quantization = cleaned_data.get('quantization')
+        
+        if quantization == 'INT8' and backend not in ('ONNXRUNTIME', 'TFLITE'):
+            raise forms.ValidationError("INT8 quantization requires the ONNX Runtime or TensorFlow Lite backend")
+        
+        return cleaned_data
 
 class DetectionSessionForm(forms.ModelForm):
     """Form for creating detection sessions"""
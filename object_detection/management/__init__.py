@@ -0,0 +1 @@
+# Management package for object detection app
@@ -0,0 +1 @@
+# Commands package for object detection app
@@ -0,0 +1,119 @@
+import os
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from object_detection.models import ModelConfiguration
+from object_detection.utils.backends import FP32, TENSORFLOW, get_backend_class
+from object_detection.utils.postprocessing import PostProcessor, box_iou
+from object_detection.utils.preprocessing import prepare_input
+
+
+def match_detections(reference, candidate, iou_threshold):
+    """Count candidate detections matching a reference detection of the same class"""
+    if not reference or not candidate:
+        return 0
+
+    ref_boxes = np.asarray(reference['boxes'], dtype=np.float32)
+    cand_boxes = np.asarray(candidate['boxes'], dtype=np.float32)
+    ious = box_iou(ref_boxes, cand_boxes)
+    ious[np.asarray(reference['objects'])[:, None] != np.asarray(candidate['objects'])[None, :]] = 0
+
+    # Greedy one-to-one matching, best overlaps first
+    matched = 0
+    used_ref, used_cand = set(), set()
+    for flat in np.argsort(-ious, axis=None):
+        r, c = np.unravel_index(flat, ious.shape)
+        if ious[r, c] < iou_threshold:
+            break
+        if r in used_ref or c in used_cand:
+            continue
+        used_ref.add(r)
+        used_cand.add(c)
+        matched += 1
+    return matched
+
+
+class Command(BaseCommand):
+    help = 'Compare inference backends for speed and agreement on the same video clip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video', help='Video file to run every backend on')
+        parser.add_argument('--backends', nargs='+', default=['TENSORFLOW:FP32'],
+                            help='Backends to compare as BACKEND[:QUANTIZATION], e.g. ONNXRUNTIME:INT8')
+        parser.add_argument('--reference', default='TENSORFLOW:FP32',
+                            help='Backend whose detections the others are scored against')
+        parser.add_argument('--model-path', help='Model directory (defaults to the active configuration)')
+        parser.add_argument('--frames', type=int, default=200, help='Frames to read from the clip')
+        parser.add_argument('--iou', type=float, default=0.5, help='IoU needed for two detections to match')
+
+    def _read_frames(self, video, count):
+        cap = cv2.VideoCapture(video)
+        if not cap.isOpened():
+            raise CommandError(f"Could not open video: {video}")
+        frames = []
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            # The same resized RGB input the detection pipeline feeds every backend
+            frames.append(prepare_input(frame, getattr(settings, 'OBJECT_DETECTION_INPUT_SIZE', 300)))
+        cap.release()
+        return frames
+
+    def _run_backend(self, spec, model_path, frames, postprocessor):
+        name, _, quantization = spec.partition(':')
+        backend = get_backend_class(name or TENSORFLOW)(model_path, quantization or FP32)
+        backend.load()
+        try:
+            # Warm up outside the timed loop
+            backend.run(frames[0][np.newaxis])
+            results = []
+            start_time = time.perf_counter()
+            for frame in frames:
+                boxes, scores, classes, _ = backend.run(frame[np.newaxis])
+                results.append(postprocessor(boxes[0], scores[0], classes[0]))
+            elapsed = time.perf_counter() - start_time
+        finally:
+            backend.close()
+        return results, len(frames) / elapsed
+
+    def handle(self, *args, **options):
+        configuration = ModelConfiguration.objects.filter(is_active=True).order_by('-updated_at').first()
+        model_path = options['model_path']
+        if model_path is None:
+            if configuration is not None:
+                model_path = os.path.join(settings.BASE_DIR, configuration.model_path)
+            else:
+                model_path = os.path.join(settings.BASE_DIR, 'models', getattr(
+                    settings, 'OBJECT_DETECTION_MODEL', 'ssd_mobilenet_v1_coco_11_06_2017'))
+
+        frames = self._read_frames(options['video'], options['frames'])
+        if not frames:
+            raise CommandError("No frames read from the video")
+        postprocessor = PostProcessor.from_configuration(
+            configuration, class_ids=getattr(settings, 'OBJECT_DETECTION_CLASS_IDS', None))
+
+        specs = [options['reference']] + [s for s in options['backends'] if s != options['reference']]
+        results = {}
+        for spec in specs:
+            try:
+                results[spec] = self._run_backend(spec, model_path, frames, postprocessor)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{spec}: {str(e)}"))
+
+        reference = results.get(options['reference'])
+        self.stdout.write(f"{len(frames)} frames from {options['video']}")
+        for spec, (detections, fps) in results.items():
+            line = f"{spec}: {fps:.1f} FPS"
+            if reference is not None and spec != options['reference']:
+                ref_total = sum(len(r['objects']) for r in reference[0] if r)
+                cand_total = sum(len(r['objects']) for r in detections if r)
+                matched = sum(match_detections(r, c, options['iou']) for r, c in zip(reference[0], detections))
+                recall = matched / ref_total if ref_total else 1.0
+                precision = matched / cand_total if cand_total else 1.0
+                line += f", recall {recall:.3f}, precision {precision:.3f} vs {options['reference']}"
+            self.stdout.write(line)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('object_detection', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionsession',
+            name='frames_skipped_static',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='detectionsession',
+            name='inference_time_saved',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('object_detection', '0002_detectionsession_motion_gate_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videosource',
+            name='max_fps',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videosource',
+            name='priority',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('object_detection', '0003_videosource_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelconfiguration',
+            name='backend',
+            field=models.CharField(choices=[('TENSORFLOW', 'TensorFlow'), ('OPENCV_DNN', 'OpenCV DNN'), ('ONNXRUNTIME', 'ONNX Runtime'), ('TFLITE', 'TensorFlow Lite')], default='TENSORFLOW', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='modelconfiguration',
+            name='quantization',
+            field=models.CharField(choices=[('FP32', 'FP32'), ('INT8', 'INT8')], default='FP32', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('object_detection', '0004_modelconfiguration_backend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionsession',
+            name='frames_dropped',
+            field=models.IntegerField(default=0),
+        ),
+    ]
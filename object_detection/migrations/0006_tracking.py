@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('object_detection', '0005_detectionsession_frames_dropped'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionresult',
+            name='track_ids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detectionsession',
+            name='vehicles_tracked',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('object_detection', '0006_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionresult',
+            name='roi_ids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='roi',
+            name='polygon',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
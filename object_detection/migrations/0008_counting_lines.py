@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:17
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('object_detection', '0007_roi_polygons'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountingLine',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('start_x', models.IntegerField()),
+                ('start_y', models.IntegerField()),
+                ('end_x', models.IntegerField()),
+                ('end_y', models.IntegerField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('roi', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='object_detection.roi')),
+                ('video_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='object_detection.videosource')),
+            ],
+            options={
+                'db_table': 'counting_lines',
+            },
+        ),
+        migrations.CreateModel(
+            name='VehicleFlowCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('object_class', models.IntegerField()),
+                ('direction', models.CharField(choices=[('FORWARD', 'Forward'), ('BACKWARD', 'Backward')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('counting_line', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flow_counts', to='object_detection.countingline')),
+            ],
+            options={
+                'db_table': 'vehicle_flow_counts',
+                'unique_together': {('counting_line', 'bucket_start', 'object_class', 'direction')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:19
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challan_app', '0001_initial'),
+        ('object_detection', '0008_counting_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionresult',
+            name='plate_numbers',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='PlateRead',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('track_id', models.IntegerField()),
+                ('plate_number', models.CharField(max_length=20)),
+                ('confidence', models.FloatField()),
+                ('frame_number', models.IntegerField()),
+                ('read_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='object_detection.detectionsession')),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='challan_app.vehicle')),
+                ('video_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='object_detection.videosource')),
+            ],
+            options={
+                'db_table': 'plate_reads',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challan_app', '0003_violation_events'),
+        ('object_detection', '0009_plate_reads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roi',
+            name='violation_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='challan_app.violationtype'),
+        ),
+    ]
@@ -19,11 +19,22 @@ class DetectionSession(models.Model):
     ended_at = models.DateTimeField(blank=True, null=True)
     total_frames_processed = models.IntegerField(default=0)
     total_detections = models.IntegerField(default=0)
+    frames_skipped_static = models.IntegerField(default=0)  # Frames the motion gate kept from the model
+    inference_time_saved = models.FloatField(default=0)  # Estimated model time saved by the motion gate
+    frames_dropped = models.IntegerField(default=0)  # Live frames replaced by newer ones before analysis
+    vehicles_tracked = models.IntegerField(default=0)  # Confirmed tracks, i.e. distinct vehicles seen
     processing_notes = models.TextField(blank=True, null=True)
     
     def __str__(self):
         return f"Session {self.session_name} - {self.user.username}"
     
+    @property
+    def skip_ratio(self):
+        """Fraction of processed frames that skipped inference"""
+        if not self.total_frames_processed:
+            return 0.0
+        return self.frames_skipped_static / self.total_frames_processed
+    
     class Meta:
         db_table = 'detection_sessions'
         app_label = 'object_detection'
@@ -41,6 +52,8 @@ class VideoSource(models.Model):
     source_type = models.CharField(max_length=20, choices=SOURCE_TYPES)
     source_url = models.CharField(max_length=500, blank=True, null=True)
     file_path = models.CharField(max_length=500, blank=True, null=True)
+    priority = models.PositiveIntegerField(default=1)  # Share of scheduled inference time
+    max_fps = models.FloatField(blank=True, null=True)  # Inference rate limit, unlimited if empty
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -62,6 +75,9 @@ class DetectionResult(models.Model):
     detected_objects = models.JSONField()  # Store detection results as JSON
     confidence_scores = models.JSONField()  # Store confidence scores
     bounding_boxes = models.JSONField()  # Store bounding box coordinates
+    roi_ids = models.JSONField(blank=True, null=True)  # ROI each detection stands in, None outside every ROI
+    plate_numbers = models.JSONField(blank=True, null=True)  # Plate read for each detection's track, if any
+    track_ids = models.JSONField(blank=True, null=True)  # Tracker id of each detection
     processing_time = models.FloatField()  # Time taken to process this frame
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -72,6 +88,25 @@ class DetectionResult(models.Model):
         db_table = 'detection_results'
         app_label = 'object_detection'
 
+class PlateRead(models.Model):
+    """Model for storing the number plate read for a tracked vehicle"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(DetectionSession, on_delete=models.CASCADE)
+    video_source = models.ForeignKey(VideoSource, on_delete=models.CASCADE)
+    track_id = models.IntegerField()
+    plate_number = models.CharField(max_length=20)
+    confidence = models.FloatField()
+    vehicle = models.ForeignKey('challan_app.Vehicle', on_delete=models.SET_NULL, blank=True, null=True)
+    frame_number = models.IntegerField()
+    read_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Plate {self.plate_number} - Track {self.track_id}"
+    
+    class Meta:
+        db_table = 'plate_reads'
+        app_label = 'object_detection'
+
 class ROI(models.Model):
     """Model for storing Region of Interest (ROI) definitions"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -81,6 +116,9 @@ class ROI(models.Model):
     y_coordinate = models.IntegerField()
     width = models.IntegerField()
     height = models.IntegerField()
+    polygon = models.JSONField(blank=True, null=True)  # [[x, y], ...] vertices; the rectangle holds its bounds
+    # Vehicles read inside this ROI are reported as this violation
+    violation_type = models.ForeignKey('challan_app.ViolationType', on_delete=models.SET_NULL, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -89,16 +127,79 @@ class ROI(models.Model):
     def __str__(self):
         return f"ROI {self.name} - ({self.x_coordinate}, {self.y_coordinate})"
     
+    def get_points(self):
+        """Vertices of the ROI: its polygon, or the corners of its rectangle"""
+        if self.polygon:
+            return self.polygon
+        x, y = self.x_coordinate, self.y_coordinate
+        return [[x, y], [x + self.width, y], [x + self.width, y + self.height], [x, y + self.height]]
+    
     class Meta:
         db_table = 'rois'
         app_label = 'object_detection'
 
+class CountingLine(models.Model):
+    """Model for storing lines that tracked vehicles are counted crossing"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100)
+    video_source = models.ForeignKey(VideoSource, on_delete=models.CASCADE)
+    roi = models.ForeignKey(ROI, on_delete=models.SET_NULL, blank=True, null=True)  # Only count vehicles in this ROI
+    start_x = models.IntegerField()
+    start_y = models.IntegerField()
+    end_x = models.IntegerField()
+    end_y = models.IntegerField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Line {self.name} - ({self.start_x}, {self.start_y}) to ({self.end_x}, {self.end_y})"
+    
+    class Meta:
+        db_table = 'counting_lines'
+        app_label = 'object_detection'
+
+class VehicleFlowCount(models.Model):
+    """Model for storing vehicle line crossings per time bucket, class and direction"""
+    DIRECTION_CHOICES = [
+        ('FORWARD', 'Forward'),  # Left to right, looking from the line's start to its end
+        ('BACKWARD', 'Backward'),
+    ]
+    
+    counting_line = models.ForeignKey(CountingLine, on_delete=models.CASCADE, related_name='flow_counts')
+    bucket_start = models.DateTimeField()
+    object_class = models.IntegerField()  # Label map class id
+    direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES)
+    count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.counting_line.name} {self.bucket_start} class {self.object_class} {self.direction}: {self.count}"
+    
+    class Meta:
+        db_table = 'vehicle_flow_counts'
+        app_label = 'object_detection'
+        # Also serves range queries on (counting_line, bucket_start)
+        unique_together = ['counting_line', 'bucket_start', 'object_class', 'direction']
+
 class ModelConfiguration(models.Model):
     """Model for storing object detection model configurations"""
+    BACKEND_CHOICES = [
+        ('TENSORFLOW', 'TensorFlow'),
+        ('OPENCV_DNN', 'OpenCV DNN'),
+        ('ONNXRUNTIME', 'ONNX Runtime'),
+        ('TFLITE', 'TensorFlow Lite'),
+    ]
+    QUANTIZATION_CHOICES = [
+        ('FP32', 'FP32'),
+        ('INT8', 'INT8'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     model_name = models.CharField(max_length=100)
     model_path = models.CharField(max_length=500)
     labels_path = models.CharField(max_length=500)
+    backend = models.CharField(max_length=20, choices=BACKEND_CHOICES, default='TENSORFLOW')
+    quantization = models.CharField(max_length=10, choices=QUANTIZATION_CHOICES, default='FP32')
     confidence_threshold = models.FloatField(default=0.5)
     nms_threshold = models.FloatField(default=0.4)
     max_detections = models.IntegerField(default=100)
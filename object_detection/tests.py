@@ -1,3 +1,719 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from challan_app.models import Vehicle, ViolationEvidence
+from challan_app.utils.vehicle_lookup import VehicleLookupCache
+from .utils.clip_buffer import BufferFeeder, FrameRingBuffer
+from .utils.evidence_writer import BLOCK, DROP_NEWEST, DROP_OLDEST, EvidenceWriter, SnapshotJob
+from .models import DetectionSession
+from .management.commands.benchmark_postprocessing import Command as BenchmarkPostprocessingCommand, loop_nms
+from .utils import capture_hub, mjpeg_broadcaster
+from .utils.backends import OpenCVDNNBackend, TFLiteBackend
+from .utils.capture_hub import CaptureHubRegistry
+from .utils.mjpeg_broadcaster import MjpegBroadcasterRegistry, StreamProfile
+from .utils.object_detector import ObjectDetector
+from .utils.line_counter import LineCrossingCounter
+from .utils.plate_recognition import (PlateReading, PlateRecognitionEngine, PlateRecognizer, StubPlateEngine,
+                                      get_plate_engine)
+from .utils.postprocessing import PostProcessor, VEHICLE_CLASS_IDS, class_aware_nms
+from .utils.result_writer import DetectionResultWriter
+from .utils.tracking import MultiObjectTracker
+
+
+class LineCrossingCounterTests(SimpleTestCase):
+    """Counting a track's bottom-centre point across a counting line"""
+
+    FRAME_SHAPE = (480, 640)
+
+    def _run(self, lines, lefts, top=200, bottom=300, width=40, **kwargs):
+        """Move one 40px wide box through the given left edges, one per frame"""
+        counter = LineCrossingCounter(lines, self.FRAME_SHAPE, **kwargs)
+        for frame, left in enumerate(lefts):
+            box = [top / 480, left / 640, bottom / 480, (left + width) / 640]
+            counter.update({'boxes': [box], 'track_ids': [1], 'objects': [3]}, 1000.0 + frame)
+        return counter.totals
+
+    def test_point_landing_exactly_on_the_line_counts_once(self):
+        # The centre moves 2px per frame and hits x=320 exactly
+        totals = self._run([('line', None, (320, 0, 320, 480))], range(280, 320, 2))
+        self.assertEqual(dict(totals), {('line', 3, 'BACKWARD'): 1})
+
+    def test_direction_follows_the_side_the_track_ends_on(self):
+        totals = self._run([('line', None, (320, 0, 320, 480))], range(320, 280, -2))
+        self.assertEqual(dict(totals), {('line', 3, 'FORWARD'): 1})
+
+    def test_stepping_over_the_line_counts(self):
+        totals = self._run([('line', None, (320, 0, 320, 480))], range(281, 321, 5))
+        self.assertEqual(dict(totals), {('line', 3, 'BACKWARD'): 1})
+
+    def test_touching_the_line_and_turning_back_does_not_count(self):
+        totals = self._run([('line', None, (320, 0, 320, 480))], [290, 296, 300, 296, 290])
+        self.assertEqual(dict(totals), {})
+
+    def test_passing_beyond_the_line_ends_does_not_count(self):
+        # The line covers only the top of the frame; the box bottom is at y=300
+        totals = self._run([('line', None, (320, 0, 320, 200))], range(280, 320, 2))
+        self.assertEqual(dict(totals), {})
+
+    def test_live_tracks_survive_forgetting_ended_ones(self):
+        # Crosses both lines after several forget passes have run
+        lines = [('first', None, (320, 0, 320, 480)), ('second', None, (330, 0, 330, 480))]
+        totals = self._run(lines, range(270, 330, 2), forget_after=4)
+        self.assertEqual(dict(totals), {('first', 3, 'BACKWARD'): 1, ('second', 3, 'BACKWARD'): 1})
+
+    def test_ended_tracks_are_forgotten(self):
+        counter = LineCrossingCounter([('first', None, (320, 0, 320, 480)), ('second', None, (330, 0, 330, 480))],
+                                      self.FRAME_SHAPE, forget_after=4)
+        counter.update({'boxes': [[0.4, 0.4, 0.6, 0.45]], 'track_ids': [1], 'objects': [3]}, 1000.0)
+        for frame in range(8):
+            counter.update({'boxes': [[0.4, 0.1, 0.6, 0.15]], 'track_ids': [2], 'objects': [3]}, 1001.0 + frame)
+        self.assertEqual(counter.get_statistics()['tracked_points'], 1)
+
+
+class MultiObjectTrackerTests(SimpleTestCase):
+    """Associating detections with tracks across frames"""
+
+    def _detections(self, *boxes, classes=None):
+        return {'boxes': [list(box) for box in boxes], 'objects': classes or [3] * len(boxes),
+                'scores': [0.9] * len(boxes)}
+
+    def _box(self, left, top=0.4, size=0.1):
+        return (top, left, top + size, left + size)
+
+    def test_each_vehicle_keeps_its_track_id_while_moving(self):
+        tracker = MultiObjectTracker()
+        ids = []
+        for frame in range(10):
+            # Two cars driving apart, listed in a different order every other frame
+            boxes = [self._box(0.30 - 0.01 * frame), self._box(0.50 + 0.01 * frame)]
+            result = tracker.update(self._detections(*(boxes[::-1] if frame % 2 else boxes)))
+            track_ids = result['track_ids'][::-1] if frame % 2 else result['track_ids']
+            ids.append(track_ids)
+        self.assertEqual(ids, [[1, 2]] * 10)
+        self.assertEqual(tracker.get_statistics()['tracks_started'], 2)
+
+    def test_tracks_carry_over_skipped_frames(self):
+        tracker = MultiObjectTracker()
+        first = tracker.update(self._detections(self._box(0.20)))['track_ids']
+        tracker.update(self._detections(self._box(0.22)))
+        # The detector skips two frames; the tracker predicts the car along
+        predicted = tracker.predict()
+        self.assertEqual(predicted['track_ids'], first)
+        self.assertGreater(predicted['boxes'][0][1], 0.22)
+        tracker.predict()
+        self.assertEqual(tracker.update(self._detections(self._box(0.28)))['track_ids'], first)
+
+    def test_detections_only_match_tracks_of_their_class(self):
+        tracker = MultiObjectTracker()
+        tracker.update(self._detections(self._box(0.20), classes=[3]))
+        result = tracker.update(self._detections(self._box(0.20), classes=[8]))
+        self.assertEqual(result['track_ids'], [2])
+        self.assertEqual(tracker.get_statistics()['active_tracks'], 2)
+
+    def test_tracks_missing_more_than_max_age_runs_are_dropped(self):
+        tracker = MultiObjectTracker(max_age=2)
+        track_id = tracker.update(self._detections(self._box(0.20)))['track_ids'][0]
+        for _ in range(2):
+            self.assertIsNone(tracker.update(None))
+            self.assertEqual(tracker.track_ids.tolist(), [track_id])
+        tracker.update(None)
+        self.assertEqual(tracker.get_statistics()['active_tracks'], 0)
+        # The car coming back is a new track
+        self.assertEqual(tracker.update(self._detections(self._box(0.20)))['track_ids'], [track_id + 1])
+
+    def test_a_track_within_max_age_is_picked_up_again(self):
+        tracker = MultiObjectTracker(max_age=2)
+        track_id = tracker.update(self._detections(self._box(0.20)))['track_ids'][0]
+        tracker.update(None)
+        self.assertEqual(tracker.update(self._detections(self._box(0.20)))['track_ids'], [track_id])
+
+    def test_tracks_are_confirmed_after_min_hits_detections(self):
+        tracker = MultiObjectTracker(min_hits=3)
+        for expected in (0, 0, 1, 1):
+            tracker.update(self._detections(self._box(0.20)))
+            self.assertEqual(tracker.get_statistics()['tracks_confirmed'], expected)
+
+        tracker = MultiObjectTracker(min_hits=1)
+        tracker.update(self._detections(self._box(0.20), self._box(0.60)))
+        self.assertEqual(tracker.get_statistics()['tracks_confirmed'], 2)
+
+
+class _ReadingsEngine(PlateRecognitionEngine):
+    """Returns the given (text, confidence) readings in turn, then nothing"""
+
+    name = 'READINGS'
+
+    def __init__(self, readings):
+        self.readings = list(readings)
+
+    def read(self, vehicle_image):
+        if not self.readings:
+            return None
+        return PlateReading(*self.readings.pop(0))
+
+
+class PlateRecognizerTests(TestCase):
+    """Reading each tracked vehicle's plate once through a plate engine"""
+
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(registration_number='MH 12 AB 1234', vehicle_type='4W',
+                                              owner_name='Owner', owner_phone='9999999999', owner_address='Pune')
+        self.lookup = VehicleLookupCache()
+        self.frame = np.zeros((100, 100, 3), dtype=np.uint8)
+
+    def _result(self, *track_ids):
+        return {'boxes': [[0.1, 0.1, 0.5, 0.5]] * len(track_ids), 'scores': [0.9] * len(track_ids),
+                'objects': [3] * len(track_ids), 'track_ids': list(track_ids)}
+
+    def test_stub_engine_is_registered(self):
+        engine = get_plate_engine('STUB', plates=['MH12AB1234'])
+        self.assertIsInstance(engine, StubPlateEngine)
+        self.assertEqual(engine.read(self.frame).text, 'MH12AB1234')
+        with self.assertRaises(Exception):
+            get_plate_engine('no.such.Engine')
+
+    def test_each_track_is_read_once(self):
+        recognizer = PlateRecognizer(StubPlateEngine(['mh-12-ab-1234']), lookup=self.lookup)
+        reads, new_track_ids = recognizer.process(self.frame, self._result(1))
+        self.assertEqual(reads, {1: ('MH12AB1234', 0.99, self.vehicle.id)})
+        self.assertEqual(new_track_ids, [1])
+
+        for _ in range(4):
+            reads, new_track_ids = recognizer.process(self.frame, self._result(1))
+        self.assertEqual(reads, {1: ('MH12AB1234', 0.99, self.vehicle.id)})
+        self.assertEqual(new_track_ids, [])
+        self.assertEqual(recognizer.engine_calls, 1)
+        self.assertEqual(recognizer.vehicles_matched, 1)
+
+    def test_low_confidence_reads_are_retried_up_to_max_attempts(self):
+        engine = _ReadingsEngine([('MH12AB1234', 0.3), ('MH12AB1234', 0.4), ('MH12AB1234', 0.95)])
+        recognizer = PlateRecognizer(engine, min_confidence=0.6, max_attempts=3, lookup=self.lookup)
+        self.assertEqual(recognizer.process(self.frame, self._result(1)), ({}, []))
+        self.assertEqual(recognizer.process(self.frame, self._result(1)), ({}, []))
+        reads, new_track_ids = recognizer.process(self.frame, self._result(1))
+        self.assertEqual(reads[1][:2], ('MH12AB1234', 0.95))
+        self.assertEqual(new_track_ids, [1])
+
+    def test_gives_up_after_max_attempts(self):
+        recognizer = PlateRecognizer(StubPlateEngine(['MH12AB1234'], confidence=0.3),
+                                     min_confidence=0.6, max_attempts=2, lookup=self.lookup)
+        for _ in range(5):
+            self.assertEqual(recognizer.process(self.frame, self._result(1)), ({}, []))
+        self.assertEqual(recognizer.engine_calls, 2)
+
+    def test_unregistered_plate_is_read_without_a_vehicle(self):
+        recognizer = PlateRecognizer(StubPlateEngine(['KA01ZZ0001']), lookup=self.lookup)
+        reads, _ = recognizer.process(self.frame, self._result(1))
+        self.assertEqual(reads, {1: ('KA01ZZ0001', 0.99, None)})
+        self.assertEqual(recognizer.vehicles_matched, 0)
+
+    def test_forget_drops_ended_tracks(self):
+        recognizer = PlateRecognizer(StubPlateEngine(['MH12AB1234']), lookup=self.lookup)
+        recognizer.process(self.frame, self._result(1, 2))
+        recognizer.forget([2])
+        reads, new_track_ids = recognizer.process(self.frame, self._result(1, 2))
+        self.assertEqual(new_track_ids, [1])
+        self.assertEqual(recognizer.engine_calls, 3)
+
+    def test_untracked_detections_are_not_read(self):
+        recognizer = PlateRecognizer(StubPlateEngine(['MH12AB1234']), lookup=self.lookup)
+        result = self._result(1)
+        result['track_ids'] = None
+        self.assertEqual(recognizer.process(self.frame, result), ({}, []))
+        self.assertEqual(recognizer.engine_calls, 0)
+
+
+class FrameRingBufferClipTests(SimpleTestCase):
+    """Cutting clips on the buffer's own clock as frames arrive"""
+
+    def setUp(self):
+        self.buffer = FrameRingBuffer(seconds=4, fps=10, memory_budget=64 * 1024 * 1024, max_width=None)
+        self.clips = []
+
+    def _push(self, timestamps):
+        for timestamp in timestamps:
+            self.buffer.push(np.full((24, 32, 3), int(timestamp * 10), dtype=np.uint8), timestamp)
+
+    def test_clip_is_cut_by_the_push_that_completes_it(self):
+        self._push([0.0, 0.1, 0.2, 0.3])
+        self.buffer.add_clip(0.1, 0.5, self.clips.append)
+        self._push([0.4])
+        self.assertEqual(self.clips, [])
+        self._push([0.5, 0.6])
+        self.assertEqual(len(self.clips), 1)
+        self.assertEqual([timestamp for timestamp, _ in self.clips[0]], [0.1, 0.2, 0.3, 0.4, 0.5])
+        self.assertEqual(int(self.clips[0][-1][1][0, 0, 0]), 5)
+
+    def test_buffered_window_is_cut_immediately(self):
+        self._push([0.0, 0.1, 0.2])
+        self.buffer.add_clip(0.0, 0.1, self.clips.append)
+        self.assertEqual(len(self.clips[0]), 2)
+
+    def test_close_cuts_clips_the_source_ended_before(self):
+        self._push([0.0, 0.1])
+        self.buffer.add_clip(0.0, 5.0, self.clips.append)
+        self.buffer.close()
+        self.assertEqual([timestamp for timestamp, _ in self.clips[0]], [0.0, 0.1])
+        self.buffer.add_clip(0.0, 5.0, self.clips.append)
+        self.assertEqual(len(self.clips), 2)
+
+    def test_feeder_pushes_offered_frames_on_its_own_thread(self):
+        feeder = BufferFeeder(self.buffer)
+        self.buffer.add_clip(0.0, 0.2, self.clips.append)
+        for timestamp in (0.0, 0.1, 0.2):
+            feeder.offer(np.zeros((24, 32, 3), dtype=np.uint8), timestamp)
+        feeder.close()
+        self.assertEqual(self.buffer.frames_pushed, 3)
+        self.assertEqual(len(self.clips[0]), 3)
+
+
+class DetectionResultWriterTests(TestCase):
+    """Batching session statistics and results into few transactions"""
+
+    def setUp(self):
+        user = User.objects.create_user('operator', password='secret')
+        self.session = DetectionSession.objects.create(session_name='Junction', user=user)
+
+    def test_frames_wait_for_a_full_batch(self):
+        writer = DetectionResultWriter(self.session, batch_size=100, flush_interval=60)
+        self.session.total_frames_processed = 5
+        self.assertFalse(writer.add())
+        self.assertFalse(writer.flush_if_due())
+        self.assertEqual(DetectionSession.objects.get(pk=self.session.pk).total_frames_processed, 0)
+
+    def test_idle_flush_writes_frames_older_than_the_interval(self):
+        writer = DetectionResultWriter(self.session, batch_size=100, flush_interval=60)
+        self.session.total_frames_processed = 5
+        writer.add()
+        writer._last_flush -= 120
+        self.assertTrue(writer.flush_if_due())
+        self.assertEqual(DetectionSession.objects.get(pk=self.session.pk).total_frames_processed, 5)
+        self.assertFalse(writer.flush_if_due())
+
+    def test_statistics_never_overwrite_a_stop(self):
+        writer = DetectionResultWriter(self.session, batch_size=1)
+        DetectionSession.objects.filter(pk=self.session.pk).update(status='COMPLETED')
+        writer.add()
+        self.assertEqual(DetectionSession.objects.get(pk=self.session.pk).status, 'COMPLETED')
+
+
+class _FakeInterpreter:
+    """Returns fixed output tensors, keyed by tensor index"""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def set_tensor(self, index, value):
+        pass
+
+    def invoke(self):
+        pass
+
+    def get_tensor(self, index):
+        return self.outputs[index]
+
+
+class _FakeNet:
+    """Echoes each caller's input after a pause, so overlapping calls would swap results"""
+
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self):
+        time.sleep(0.01)
+        image_id = float(self.blob[0, 0, 0, 0])
+        return np.array([[[[0, image_id, 0.9, 0.1, 0.1, 0.5, 0.5]]]], dtype=np.float32)
+
+
+class BackendOutputTests(SimpleTestCase):
+    """Backends return the same tensors whatever the runtime calls them"""
+
+    BOXES = np.array([[[0.1, 0.1, 0.5, 0.5], [0.2, 0.2, 0.6, 0.6]]], dtype=np.float32)
+    CLASSES = np.array([[2.0, 0.0]], dtype=np.float32)
+    SCORES = np.array([[0.9, 0.7]], dtype=np.float32)
+    NUM = np.array([2.0], dtype=np.float32)
+
+    def _tflite(self, details):
+        backend = TFLiteBackend.__new__(TFLiteBackend)
+        backend.input_details = {'index': 0, 'dtype': np.float32}
+        backend.input_height = backend.input_width = 8
+        backend.output_details = [{'name': name, 'index': index, 'shape': np.array(tensor.shape)}
+                                  for name, index, tensor in details]
+        backend.interpreter = _FakeInterpreter({index: tensor for _, index, tensor in details})
+        backend._map_outputs()
+        backend._lock = threading.Lock()
+        return backend
+
+    def _assert_outputs(self, backend):
+        boxes, scores, classes, num = backend.run(np.zeros((1, 16, 16, 3), dtype=np.uint8))
+        np.testing.assert_array_equal(boxes, self.BOXES)
+        np.testing.assert_array_equal(scores, self.SCORES)
+        np.testing.assert_array_equal(classes, self.CLASSES + 1)
+        np.testing.assert_array_equal(num, self.NUM)
+
+    def test_tflite_outputs_matched_by_name(self):
+        self._assert_outputs(self._tflite([
+            ('detection_scores', 1, self.SCORES), ('num_detections', 2, self.NUM),
+            ('detection_classes', 3, self.CLASSES), ('detection_boxes', 4, self.BOXES),
+        ]))
+
+    def test_tflite_unnamed_outputs_matched_by_shape_and_values(self):
+        self._assert_outputs(self._tflite([
+            ('StatefulPartitionedCall:0', 1, self.SCORES), ('StatefulPartitionedCall:1', 2, self.BOXES),
+            ('StatefulPartitionedCall:2', 3, self.NUM), ('StatefulPartitionedCall:3', 4, self.CLASSES),
+        ]))
+
+    def test_opencv_dnn_calls_do_not_interleave(self):
+        backend = OpenCVDNNBackend.__new__(OpenCVDNNBackend)
+        backend.net = _FakeNet()
+        backend._lock = threading.Lock()
+        results = {}
+
+        def run(value):
+            _, _, classes, _ = backend.run(np.full((1, 300, 300, 3), value, dtype=np.uint8))
+            results[value] = float(classes[0, 0])
+
+        threads = [threading.Thread(target=run, args=(value,)) for value in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {value: float(value) for value in range(1, 9)})
+
+
+class PostProcessorTests(SimpleTestCase):
+    """Vectorized NMS, class filter and top-k against the reference greedy loop"""
+
+    CLASS_IDS = {float(class_id) for class_id in VEHICLE_CLASS_IDS}
+
+    def _frames(self, count, num_boxes, seed=0):
+        return BenchmarkPostprocessingCommand()._make_frames(count, num_boxes, np.random.default_rng(seed))
+
+    def _assert_matches_reference(self, postprocessor, boxes, scores, classes):
+        expected = loop_nms(boxes, scores, classes, postprocessor.confidence_threshold,
+                            postprocessor.nms_threshold, postprocessor.max_detections, self.CLASS_IDS)
+        result = postprocessor(boxes, scores, classes)
+        if not expected:
+            self.assertIsNone(result)
+            return
+        # Same boxes, in the same (descending score) order
+        np.testing.assert_array_equal(result['scores'], scores[expected])
+        np.testing.assert_array_equal(result['objects'], classes[expected])
+        np.testing.assert_array_equal(result['boxes'], boxes[expected])
+
+    def test_matches_greedy_nms_on_crowded_frames(self):
+        postprocessor = PostProcessor(max_detections=1000)
+        for num_boxes in (1, 20, 100, 500):
+            for boxes, scores, classes in self._frames(5, num_boxes, seed=num_boxes):
+                self._assert_matches_reference(postprocessor, boxes, scores, classes)
+
+    def test_top_k_keeps_the_best_of_greedy_nms(self):
+        for max_detections in (1, 5, 30):
+            postprocessor = PostProcessor(max_detections=max_detections)
+            for boxes, scores, classes in self._frames(5, 500, seed=max_detections):
+                self._assert_matches_reference(postprocessor, boxes, scores, classes)
+                self.assertLessEqual(len(postprocessor(boxes, scores, classes)['scores']), max_detections)
+
+    def test_class_filter_and_threshold(self):
+        boxes = np.array([[0.1, 0.1, 0.5, 0.5]] * 4, dtype=np.float32)
+        scores = np.array([0.9, 0.8, 0.7, 0.4], dtype=np.float32)
+        classes = np.array([1, 3, 8, 3], dtype=np.float32)  # person, car, truck, weak car
+        result = PostProcessor(confidence_threshold=0.5)(boxes, scores, classes)
+        self.assertEqual(result['objects'], [3.0, 8.0])
+        self.assertIsNone(PostProcessor(class_ids=[1], confidence_threshold=0.95)(boxes, scores, classes))
+        self.assertEqual(PostProcessor(class_ids=None)(boxes, scores, classes)['objects'], [1.0, 3.0, 8.0])
+
+    def test_overlapping_boxes_of_different_classes_are_both_kept(self):
+        boxes = np.array([[0.1, 0.1, 0.5, 0.5], [0.1, 0.1, 0.5, 0.5], [0.12, 0.1, 0.5, 0.5], [0.6, 0.6, 0.9, 0.9]])
+        scores = np.array([0.6, 0.9, 0.8, 0.7])
+        classes = np.array([3, 8, 3, 3])
+        self.assertEqual(class_aware_nms(boxes, scores, classes, 0.4).tolist(), [1, 2, 3])
+        self.assertEqual(class_aware_nms(boxes, scores, classes, 0.4, max_output=2).tolist(), [1, 2])
+        self.assertEqual(class_aware_nms(boxes[:0], scores[:0], classes[:0], 0.4).tolist(), [])
+
+
+class EvidenceWriterTests(SimpleTestCase):
+    """What a full snapshot queue drops under each policy"""
+
+    def _writer(self, drop_policy, **kwargs):
+        # No workers, so submitted jobs stay queued
+        writer = EvidenceWriter(max_workers=0, queue_size=2, flush_interval=60, drop_policy=drop_policy, **kwargs)
+        self.addCleanup(writer.close, 0)
+        return writer
+
+    def _submit(self, writer, *names):
+        return [writer.submit(SnapshotJob(None, None, name)) for name in names]
+
+    def _queued(self, writer):
+        return [job.path for job in writer._queue.queue]
+
+    def test_drop_newest_refuses_new_snapshots(self):
+        writer = self._writer(DROP_NEWEST)
+        self.assertEqual(self._submit(writer, 'a', 'b', 'c'), [True, True, False])
+        self.assertEqual(self._queued(writer), ['a', 'b'])
+        self.assertEqual(writer.get_statistics()['dropped'], 1)
+
+    def test_drop_oldest_makes_room_for_new_snapshots(self):
+        writer = self._writer(DROP_OLDEST)
+        self.assertEqual(self._submit(writer, 'a', 'b', 'c', 'd'), [True, True, True, True])
+        self.assertEqual(self._queued(writer), ['c', 'd'])
+        self.assertEqual(writer.get_statistics()['dropped'], 2)
+
+    def test_block_waits_for_room_then_gives_up(self):
+        writer = self._writer(BLOCK, block_timeout=0.05)
+        self._submit(writer, 'a', 'b')
+        start_time = time.time()
+        self.assertEqual(self._submit(writer, 'c'), [False])
+        self.assertGreaterEqual(time.time() - start_time, 0.05)
+
+        writer.block_timeout = 5
+        threading.Timer(0.05, writer._queue.get).start()
+        self.assertEqual(self._submit(writer, 'd'), [True])
+        self.assertEqual(self._queued(writer), ['b', 'd'])
+        self.assertEqual(writer.get_statistics()['dropped'], 1)
+
+    def test_closed_writer_drops_new_snapshots(self):
+        writer = self._writer(DROP_OLDEST)
+        writer.close(0)
+        self.assertEqual(self._submit(writer, 'a'), [False])
+
+
+class EvidenceWriterFlushTests(TransactionTestCase):
+    """Snapshots written to disk and their rows inserted in batches"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.frame = np.zeros((120, 160, 3), dtype=np.uint8)
+
+    def _submit(self, writer, count):
+        for _ in range(count):
+            writer.submit(SnapshotJob(self.frame, None, os.path.join(self.directory, str(uuid.uuid4()))))
+
+    def test_rows_are_inserted_per_batch_and_on_close(self):
+        writer = EvidenceWriter(max_workers=2, batch_size=3, flush_interval=60, thumbnail_width=80)
+        self._submit(writer, 3)
+        # A full batch flushes without waiting for the interval
+        deadline = time.time() + 10
+        while writer.get_statistics()['rows_created'] < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(writer.get_statistics()['batches_flushed'], 1)
+
+        self._submit(writer, 1)
+        writer.close()
+        stats = writer.get_statistics()
+        self.assertEqual((stats['written'], stats['rows_created'], stats['batches_flushed']), (4, 4, 2))
+        self.assertEqual(ViolationEvidence.objects.filter(thumbnail_path__isnull=False).count(), 4)
+        self.assertFalse(any(thread.is_alive() for thread in writer._workers + [writer._flusher]))
+
+
+class _FakeCapture:
+    """Stands in for cv2.VideoCapture: numbered frames at ``fps``, ``frame_count`` of them if given"""
+
+    opened = []
+
+    def __init__(self, url, fps=200.0, frame_count=None, opens=True, shape=(4, 4, 3)):
+        self.url = url
+        self.shape = shape
+        self.fps = fps
+        self.frame_count = frame_count
+        self.opens = opens
+        self.frames_read = 0
+        self.released = False
+        _FakeCapture.opened.append(self)
+
+    def isOpened(self):
+        return self.opens
+
+    def get(self, prop):
+        return self.fps
+
+    def read(self):
+        if self.released or (self.frame_count is not None and self.frames_read >= self.frame_count):
+            return False, None
+        time.sleep(1 / self.fps)
+        self.frames_read += 1
+        return True, np.full(self.shape, self.frames_read % 256, dtype=np.uint8)
+
+    def release(self):
+        self.released = True
+
+
+class CaptureHubTests(SimpleTestCase):
+    """One capture per live source, shared by its subscribers and released by the last"""
+
+    def setUp(self):
+        _FakeCapture.opened = []
+        self.capture_options = {}
+        patcher = mock.patch.object(capture_hub.cv2, 'VideoCapture',
+                                    lambda url: _FakeCapture(url, **self.capture_options))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = CaptureHubRegistry()
+        self.source = SimpleNamespace(id=uuid.uuid4(), source_type='CAMERA', source_url='rtsp://camera')
+
+    def _wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.005)
+        self.assertTrue(condition())
+
+    def test_subscribers_share_one_capture(self):
+        first, hub = self.registry.subscribe(self.source)
+        second, same_hub = self.registry.subscribe(self.source)
+        self.addCleanup(first.stop)
+        self.addCleanup(second.stop)
+
+        self.assertIs(hub, same_hub)
+        self.assertEqual(len(_FakeCapture.opened), 1)
+        _, frame, _ = first.read(timeout=5)
+        self.assertIsNotNone(second.read(timeout=5))
+        self.assertFalse(frame.flags.writeable)
+        self.assertEqual(hub.get_statistics()['subscribers'], 2)
+
+    def test_capture_is_released_when_the_last_subscriber_leaves(self):
+        first, hub = self.registry.subscribe(self.source)
+        second, _ = self.registry.subscribe(self.source)
+        capture = _FakeCapture.opened[0]
+
+        first.stop()
+        self.assertFalse(capture.released)
+        self.assertIsNotNone(second.read(timeout=5))
+
+        second.stop()
+        self.assertTrue(capture.released)
+        self.assertTrue(hub.closed)
+        self.assertFalse(hub._thread.is_alive())
+        self.assertEqual(self.registry.get_statistics(), [])
+
+        # The next subscriber opens the source afresh
+        third, new_hub = self.registry.subscribe(self.source)
+        self.addCleanup(third.stop)
+        self.assertIsNot(new_hub, hub)
+        self.assertEqual(len(_FakeCapture.opened), 2)
+
+    def test_stopping_twice_unsubscribes_once(self):
+        first, hub = self.registry.subscribe(self.source)
+        second, _ = self.registry.subscribe(self.source)
+        self.addCleanup(second.stop)
+        first.stop()
+        first.stop()
+        self.assertEqual(hub.get_statistics()['subscribers'], 1)
+        self.assertFalse(_FakeCapture.opened[0].released)
+
+    def test_source_ending_ends_every_subscriber(self):
+        self.capture_options = {'frame_count': 5}
+        first, hub = self.registry.subscribe(self.source)
+        second, _ = self.registry.subscribe(self.source)
+        self._wait_for(lambda: first.ended and second.ended)
+        self.assertEqual(self.registry.get_statistics(), [])
+        first.stop()
+        second.stop()
+        self.assertTrue(_FakeCapture.opened[0].released)
+
+    def test_source_that_fails_to_open_leaves_no_hub(self):
+        self.capture_options = {'opens': False}
+        with self.assertRaises(Exception):
+            self.registry.subscribe(self.source)
+        self.assertEqual(self.registry.get_statistics(), [])
+        self.assertTrue(_FakeCapture.opened[0].released)
+
+    def test_only_live_sources_are_shared(self):
+        with self.assertRaises(Exception):
+            self.registry.subscribe(SimpleNamespace(id=uuid.uuid4(), source_type='FILE', source_url=None))
+
+
+class MjpegBroadcasterTests(SimpleTestCase):
+    """Sharing one encoder between viewers of a live source"""
+
+    def setUp(self):
+        _FakeCapture.opened = []
+        hubs = CaptureHubRegistry()
+        self.detectors = {}
+        for patcher in (
+            mock.patch.object(capture_hub.cv2, 'VideoCapture', lambda url: _FakeCapture(url, shape=(64, 64, 3))),
+            mock.patch.object(mjpeg_broadcaster, 'capture_hubs', hubs),
+            mock.patch.object(mjpeg_broadcaster, 'active_detectors', self.detectors),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.registry = MjpegBroadcasterRegistry(overlay_max_age=1.0)
+        self.source = SimpleNamespace(id=uuid.uuid4(), source_type='CAMERA', source_url='rtsp://camera')
+
+    def _decode(self, part):
+        jpeg = part[part.index(b'\r\n\r\n') + 4:-2]
+        return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def _is_green(self, pixel):
+        # The fake frames are grey, the overlay's boxes green
+        blue, green, red = pixel.astype(int)
+        return green - blue > 100 and green - red > 100
+
+    def test_slow_client_drops_frames_instead_of_queueing_them(self):
+        fast = self.registry.stream(self.source, StreamProfile())
+        slow = self.registry.stream(self.source, StreamProfile())
+        next(fast)
+        next(slow)
+        broadcaster = self.registry._broadcasters[(str(self.source.id), StreamProfile().key)]
+
+        fast_parts = 0
+        deadline = time.time() + 0.3
+        while time.time() < deadline:
+            next(fast)
+            fast_parts += 1
+        # The slow client gets the newest part, skipping everything published while it was away
+        next(slow)
+        stats = broadcaster.get_statistics()
+        self.assertGreater(fast_parts, 5)
+        self.assertGreaterEqual(stats['client_frames_dropped'], fast_parts - 2)
+        self.assertEqual(stats['clients'], 2)
+
+        fast.close()
+        slow.close()
+        self.assertEqual(self.registry.get_statistics(), [])
+        self.assertTrue(_FakeCapture.opened[0].released)
+
+    def test_annotated_stream_draws_the_sessions_latest_detections(self):
+        detector = ObjectDetector.__new__(ObjectDetector)
+        detector.category_index = {3: {'id': 3, 'name': 'car'}}
+        detector.latest_detection = ({'boxes': [[0.25, 0.25, 0.75, 0.75]], 'scores': [0.9], 'objects': [3]},
+                                     time.time() + 60)
+        self.detectors[self.source.id] = detector
+
+        plain = self.registry.stream(self.source, StreamProfile(quality=95))
+        annotated = self.registry.stream(self.source, StreamProfile(quality=95, annotated=True))
+        self.addCleanup(plain.close)
+        self.addCleanup(annotated.close)
+        plain_frame = self._decode(next(plain))
+        annotated_frame = self._decode(next(annotated))
+
+        # Green box edges on the annotated stream only; the shared frame stays untouched
+        self.assertTrue(self._is_green(annotated_frame[32, 16]))
+        self.assertFalse(self._is_green(plain_frame[32, 16]))
+        stats = self.registry.get_statistics()
+        self.assertEqual(sorted((s['annotated'], s['frames_annotated'] > 0) for s in stats),
+                         [(False, False), (True, True)])
+
+    def test_stale_detections_are_not_drawn(self):
+        detector = ObjectDetector.__new__(ObjectDetector)
+        detector.category_index = {}
+        detector.latest_detection = ({'boxes': [[0.25, 0.25, 0.75, 0.75]], 'scores': [0.9], 'objects': [3]},
+                                     time.time() - 5)
+        self.detectors[self.source.id] = detector
+
+        annotated = self.registry.stream(self.source, StreamProfile(quality=95, annotated=True))
+        self.addCleanup(annotated.close)
+        frame = self._decode(next(annotated))
+        self.assertFalse(self._is_green(frame[32, 16]))
+        self.assertEqual(self.registry.get_statistics()[0]['frames_annotated'], 0)
@@ -34,4 +34,7 @@ urlpatterns = [
     path('api/sessions/<uuid:session_id>/results/', views.api_detection_results, name='api_detection_results'),
     path('api/start-detection/', views.api_start_detection, name='api_start_detection'),
     path('api/sessions/<uuid:session_id>/stop/', views.api_stop_detection, name='api_stop_detection'),
+    path('api/models/', views.api_model_registry, name='api_model_registry'),
+    path('api/sources/<uuid:source_id>/flow/', views.api_vehicle_flow, name='api_vehicle_flow'),
+    path('api/capture-hubs/', views.api_capture_hubs, name='api_capture_hubs'),
 ]
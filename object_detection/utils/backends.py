@@ -0,0 +1,307 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Backend identifiers, as stored in ModelConfiguration.backend
+TENSORFLOW = 'TENSORFLOW'
+OPENCV_DNN = 'OPENCV_DNN'
+ONNXRUNTIME = 'ONNXRUNTIME'
+TFLITE = 'TFLITE'
+
+FP32 = 'FP32'
+INT8 = 'INT8'
+
+
+class InferenceBackend:
+    """A CPU runtime that runs an SSD-style detector
+
+    ``run`` takes a uint8 BGR/RGB batch of shape (N, H, W, 3) and returns
+    ``(boxes, scores, classes, num)`` shaped like the TensorFlow Object
+    Detection API outputs: normalized (ymin, xmin, ymax, xmax) boxes and
+    label map class ids, so every backend feeds the same post-processing.
+    """
+
+    name = None
+
+    # Model file names looked up when the configured path is a directory
+    default_files = {FP32: None, INT8: None}
+
+    def __init__(self, model_path, quantization=FP32):
+        self.model_path = model_path
+        self.quantization = quantization
+        self.model_file = self.resolve_model_file(model_path, quantization)
+
+    @classmethod
+    def resolve_model_file(cls, model_path, quantization=FP32):
+        if os.path.isfile(model_path):
+            return os.path.abspath(model_path)
+
+        file_name = cls.default_files.get(quantization)
+        if file_name is None:
+            raise Exception(f"{cls.name} backend has no {quantization} model option")
+        return os.path.abspath(os.path.join(model_path, file_name))
+
+    def load(self):
+        raise NotImplementedError
+
+    def run(self, images):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    @property
+    def model_bytes(self):
+        return os.path.getsize(self.model_file)
+
+
+class TensorFlowBackend(InferenceBackend):
+    """Frozen TF Object Detection API graph on one long-lived session
+
+    Uses the ``tf.compat.v1`` graph APIs, which TensorFlow 2 still ships.
+    ``Session.run`` is thread-safe, so concurrent callers share the session.
+    """
+
+    name = TENSORFLOW
+    default_files = {FP32: 'frozen_inference_graph.pb', INT8: None}
+
+    def load(self):
+        import tensorflow as tf
+        tf1 = tf.compat.v1 if hasattr(tf, 'compat') else tf
+
+        self.graph = tf1.Graph()
+        with self.graph.as_default():
+            od_graph_def = tf1.GraphDef()
+            with tf1.gfile.GFile(self.model_file, 'rb') as fid:
+                od_graph_def.ParseFromString(fid.read())
+                tf1.import_graph_def(od_graph_def, name='')
+
+        self.session = tf1.Session(graph=self.graph)
+
+        # Resolve tensors once instead of on every frame
+        self.image_tensor = self.graph.get_tensor_by_name('image_tensor:0')
+        self.fetches = [
+            self.graph.get_tensor_by_name('detection_boxes:0'),
+            self.graph.get_tensor_by_name('detection_scores:0'),
+            self.graph.get_tensor_by_name('detection_classes:0'),
+            self.graph.get_tensor_by_name('num_detections:0'),
+        ]
+
+    def run(self, images):
+        return self.session.run(self.fetches, feed_dict={self.image_tensor: images})
+
+    def close(self):
+        self.session.close()
+
+
+class OpenCVDNNBackend(InferenceBackend):
+    """The same frozen graph run through ``cv2.dnn``
+
+    Needs the text graph OpenCV generates for TF Object Detection API models
+    (``tf_text_graph_ssd.py``) next to the frozen graph as ``graph.pbtxt``.
+    """
+
+    name = OPENCV_DNN
+    default_files = {FP32: 'frozen_inference_graph.pb', INT8: None}
+    input_size = 300
+
+    def load(self):
+        config_file = os.path.join(os.path.dirname(self.model_file), 'graph.pbtxt')
+        if not os.path.exists(config_file):
+            raise Exception(f"OpenCV text graph not found: {config_file}")
+
+        self.net = cv2.dnn.readNetFromTensorflow(self.model_file, config_file)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self._lock = threading.Lock()
+
+    def run(self, images):
+        blob = cv2.dnn.blobFromImages(list(images), size=(self.input_size, self.input_size))
+        # The net holds its input, so another caller's setInput must not land before our forward
+        with self._lock:
+            self.net.setInput(blob)
+            # One row per detection: [image_id, class_id, score, xmin, ymin, xmax, ymax]
+            detections = self.net.forward().reshape(-1, 7)
+
+        batch_size = len(images)
+        image_ids = detections[:, 0].astype(np.int64)
+        counts = np.bincount(image_ids, minlength=batch_size)[:batch_size]
+        max_count = max(1, int(counts.max()) if len(counts) else 1)
+
+        boxes = np.zeros((batch_size, max_count, 4), dtype=np.float32)
+        scores = np.zeros((batch_size, max_count), dtype=np.float32)
+        classes = np.zeros((batch_size, max_count), dtype=np.float32)
+
+        # Slot of each row within its image, computed without a per-row loop
+        order = np.argsort(image_ids, kind='stable')
+        sorted_ids = image_ids[order]
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        slots = np.arange(len(order)) - starts[sorted_ids]
+        rows = detections[order]
+
+        boxes[sorted_ids, slots] = rows[:, [4, 3, 6, 5]]
+        scores[sorted_ids, slots] = rows[:, 2]
+        classes[sorted_ids, slots] = rows[:, 1]
+        return boxes, scores, classes, counts.astype(np.float32)
+
+
+class ONNXRuntimeBackend(InferenceBackend):
+    """A ``tf2onnx`` export of the detector on ONNX Runtime's CPU provider
+
+    INT8 uses a model quantized offline with ``onnxruntime.quantization``.
+    """
+
+    name = ONNXRUNTIME
+    default_files = {FP32: 'model.onnx', INT8: 'model_int8.onnx'}
+
+    def load(self):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise Exception("onnxruntime is not installed")
+
+        self.session = onnxruntime.InferenceSession(self.model_file, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        # tf2onnx keeps the TF tensor names, e.g. "detection_boxes:0"; match them
+        # exactly so outputs like "raw_detection_boxes" are never picked instead
+        output_names = {output.name.split(':')[0]: output.name for output in self.session.get_outputs()}
+        self.output_names = []
+        for wanted in ('detection_boxes', 'detection_scores', 'detection_classes', 'num_detections'):
+            if wanted not in output_names:
+                raise Exception(f"ONNX model has no {wanted} output")
+            self.output_names.append(output_names[wanted])
+
+    def run(self, images):
+        return self.session.run(self.output_names, {self.input_name: images})
+
+
+class TFLiteBackend(InferenceBackend):
+    """A TFLite SSD export, optionally full-integer quantized
+
+    TFLite detection models take one fixed-size image per invocation and
+    number classes from 0, so images are resized and run one at a time and
+    classes are shifted back onto the label map.
+    """
+
+    name = TFLITE
+    default_files = {FP32: 'detect.tflite', INT8: 'detect_int8.tflite'}
+
+    def load(self):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=self.model_file)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        _, self.input_height, self.input_width, _ = self.input_details['shape']
+        self.output_details = self.interpreter.get_output_details()
+        self._map_outputs()
+        self._lock = threading.Lock()
+
+    def _map_outputs(self):
+        """Find the boxes, classes, scores and count among the output tensors
+
+        Exports name them inconsistently: descriptively, after the
+        post-processing op ("TFLite_Detection_PostProcess:1") or after the
+        saved model's call ("StatefulPartitionedCall:3"), in no fixed order.
+        Descriptive names are used when present; otherwise boxes and count
+        are told apart by shape, and classes from scores, which share a
+        shape, by their values once an image yields detections.
+        """
+        self.output_index = {}
+        for detail in self.output_details:
+            name = detail['name'].lower()
+            for role in ('box', 'class', 'score', 'num'):
+                if role in name and role not in self.output_index:
+                    self.output_index[role] = detail['index']
+        self._per_detection = None
+        if len(self.output_index) == 4:
+            return
+
+        self.output_index = {}
+        per_detection = []
+        for detail in self.output_details:
+            shape = tuple(detail['shape'])
+            if len(shape) == 3 and shape[-1] == 4:
+                self.output_index['box'] = detail['index']
+            elif int(np.prod(shape)) == 1:
+                self.output_index['num'] = detail['index']
+            elif len(shape) == 2:
+                per_detection.append(detail['index'])
+        if len(self.output_index) != 2 or len(per_detection) != 2:
+            raise Exception(f"Unrecognised TFLite detection outputs: {[d['name'] for d in self.output_details]}")
+        # Provisionally in the post-processing op's order, classes before scores
+        self.output_index['class'], self.output_index['score'] = per_detection
+        self._per_detection = per_detection
+
+    def _resolve_classes(self, first, second, count):
+        """Tell classes from scores by the first detections: class ids are whole numbers, scores sorted"""
+        first, second = first[0, :count], second[0, :count]
+        first_whole = np.all(first == np.round(first))
+        second_whole = np.all(second == np.round(second))
+        if first_whole != second_whole:
+            swap = second_whole
+        elif np.all(np.diff(first) <= 0) != np.all(np.diff(second) <= 0):
+            swap = np.all(np.diff(first) <= 0)
+        else:
+            return  # Still ambiguous; try again on the next image
+        if swap:
+            self.output_index['class'], self.output_index['score'] = self.output_index['score'], self.output_index['class']
+        self._per_detection = None
+
+    def _prepare(self, image):
+        image = cv2.resize(image, (self.input_width, self.input_height), interpolation=cv2.INTER_AREA)
+        dtype = self.input_details['dtype']
+        if dtype == np.uint8:
+            return image[np.newaxis]
+        # Float and int8 models take the same [-1, 1] input; int8 quantizes it
+        normalized = (image.astype(np.float32) - 127.5) / 127.5
+        if dtype == np.int8:
+            scale, zero_point = self.input_details['quantization']
+            quantized = np.round(normalized / scale + zero_point)
+            return np.clip(quantized, -128, 127).astype(np.int8)[np.newaxis]
+        return normalized[np.newaxis]
+
+    def _invoke(self, image):
+        # An interpreter holds its tensors, so invocations must not overlap
+        with self._lock:
+            self.interpreter.set_tensor(self.input_details['index'], self._prepare(image))
+            self.interpreter.invoke()
+            if self._per_detection is not None:
+                count = int(np.ravel(self.interpreter.get_tensor(self.output_index['num']))[0])
+                if count > 1:
+                    self._resolve_classes(*[self.interpreter.get_tensor(index) for index in self._per_detection],
+                                          count)
+            boxes, classes, scores, num = [
+                self.interpreter.get_tensor(self.output_index[role]) for role in ('box', 'class', 'score', 'num')
+            ]
+        return boxes[0], scores[0], classes[0] + 1, num[0]
+
+    def run(self, images):
+        outputs = [self._invoke(image) for image in images]
+        boxes, scores, classes, num = zip(*outputs)
+        return np.stack(boxes), np.stack(scores), np.stack(classes), np.stack(num)
+
+
+BACKENDS = {
+    TENSORFLOW: TensorFlowBackend,
+    OPENCV_DNN: OpenCVDNNBackend,
+    ONNXRUNTIME: ONNXRuntimeBackend,
+    TFLITE: TFLiteBackend,
+}
+
+
+def get_backend_class(name):
+    try:
+        return BACKENDS[name or TENSORFLOW]
+    except KeyError:
+        raise Exception(f"Unknown inference backend: {name}")
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def run_stacked(run_batch, images):
+    """Run equally sized images as one stacked call each, returning per-image outputs"""
+    groups = {}
+    for i, image in enumerate(images):
+        groups.setdefault(image.shape, []).append(i)
+
+    outputs = [None] * len(images)
+    for indices in groups.values():
+        boxes, scores, classes, num = run_batch(np.stack([images[i] for i in indices]))
+        for j, i in enumerate(indices):
+            outputs[i] = (boxes[j:j + 1], scores[j:j + 1], classes[j:j + 1], num[j:j + 1])
+    return outputs
+
+
+class BatchInferenceQueue:
+    """Stacks frames from any number of callers into one inference batch
+
+    Frames are grouped until ``batch_size`` frames are waiting or the oldest
+    one has waited ``max_wait`` seconds, then run through ``run_batch`` as a
+    single (N, H, W, 3) tensor. Frames with different shapes cannot share a
+    tensor, so each shape is batched separately.
+    """
+
+    def __init__(self, run_batch, batch_size=8, max_wait=0.05):
+        self.run_batch = run_batch
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+
+        self._pending = queue.Queue()
+        self._running = True
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._frames = 0
+        self._inference_time = 0.0
+        self._started_at = time.time()
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, frame):
+        """Queue a frame; the Future resolves to (boxes, scores, classes, num)"""
+        future = Future()
+        self._pending.put((frame, future))
+        return future
+
+    def close(self):
+        """Stop the worker once already queued frames are processed"""
+        self._running = False
+        self._pending.put(None)
+        self._worker.join(timeout=5)
+
+    def _run(self):
+        while self._running or not self._pending.empty():
+            item = self._pending.get()
+            if item is None:
+                continue
+
+            batch = [item]
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                batch.append(item)
+
+            # Group by frame shape so every group stacks into one tensor
+            groups = {}
+            for frame, future in batch:
+                groups.setdefault(frame.shape, []).append((frame, future))
+
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group):
+        frames = np.stack([frame for frame, _ in group])
+        start_time = time.time()
+        try:
+            boxes, scores, classes, num = self.run_batch(frames)
+        except Exception as e:
+            for _, future in group:
+                future.set_exception(e)
+            return
+        elapsed = time.time() - start_time
+
+        with self._stats_lock:
+            self._batches += 1
+            self._frames += len(group)
+            self._inference_time += elapsed
+
+        # Split the batched outputs back into per-frame results
+        for i, (_, future) in enumerate(group):
+            future.set_result((boxes[i:i + 1], scores[i:i + 1], classes[i:i + 1], num[i:i + 1]))
+
+    def get_statistics(self):
+        """Batch sizes and throughput achieved so far"""
+        with self._stats_lock:
+            batches = self._batches
+            frames = self._frames
+            inference_time = self._inference_time
+        return {
+            'batch_size': self.batch_size,
+            'max_wait': self.max_wait,
+            'batches': batches,
+            'frames': frames,
+            'queued_frames': self._pending.qsize(),
+            'average_batch_size': frames / batches if batches else 0.0,
+            'inference_fps': frames / inference_time if inference_time else 0.0,
+            'wall_fps': frames / max(time.time() - self._started_at, 1e-9),
+        }
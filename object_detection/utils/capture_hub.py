@@ -0,0 +1,158 @@
+import threading
+import time
+
+import cv2
+
+from .frame_grabber import LatestFrameGrabber
+
+# Sources a hub can share; files are read from the start by each reader
+LIVE_SOURCE_TYPES = ('CAMERA', 'STREAM')
+
+
+class CaptureHub:
+    """Decodes one live source once and fans its frames out to every subscriber
+
+    Each subscriber is a LatestFrameGrabber fed by the hub's reader thread,
+    so a slow subscriber only drops its own frames. Frames are shared, not
+    copied, and marked read-only so no subscriber can change what the
+    others see. The capture is opened by the first subscriber and released
+    when the last one stops.
+    """
+
+    def __init__(self, source_id, source_url, registry=None):
+        self.source_id = source_id
+        self.source_url = source_url
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._cap = None
+        self._thread = None
+        self._running = False
+        self.closed = False
+        self.fps = 0.0
+
+        self.frames_decoded = 0
+        self.subscriptions = 0
+        self.started_at = None
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source_url)
+        if not cap.isOpened():
+            cap.release()
+            raise Exception("Could not open video source")
+        self._cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self._running = True
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=f'capture-hub-{self.source_id}', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while self._running:
+                ret, frame = self._cap.read()
+                captured_at = time.time()
+                if not ret:
+                    break
+                frame.flags.writeable = False
+                self.frames_decoded += 1
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for subscriber in subscribers:
+                    subscriber.put(frame, captured_at)
+        finally:
+            # A source that stopped delivering can't be shared any more; the
+            # next subscriber opens it afresh
+            with self._lock:
+                self._close()
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber.end()
+
+    def subscribe(self, on_frame=None):
+        """New subscriber grabber, or None if the hub has already shut down"""
+        with self._lock:
+            if self.closed:
+                return None
+            if self._cap is None:
+                try:
+                    self._open()
+                except Exception:
+                    self._close()
+                    raise
+            subscriber = LatestFrameGrabber(on_frame=on_frame, on_stop=self._unsubscribe)
+            self._subscribers.append(subscriber)
+            self.subscriptions += 1
+            return subscriber
+
+    def _unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.remove(subscriber)
+            if self._subscribers:
+                return
+            self._close()
+        # Release outside the lock; the reader thread may be inside put()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if self._cap is not None:
+            self._cap.release()
+
+    def _close(self):
+        """Stop reading and leave the registry; called with the lock held"""
+        self.closed = True
+        self._running = False
+        if self.registry is not None:
+            self.registry.discard(self)
+
+    def get_statistics(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            'source_id': str(self.source_id),
+            'subscribers': len(subscribers),
+            'subscriptions': self.subscriptions,
+            'frames_decoded': self.frames_decoded,
+            'decode_fps': self.frames_decoded / elapsed if elapsed else 0.0,
+            'frames_dropped': sum(subscriber.frames_dropped for subscriber in subscribers),
+        }
+
+
+class CaptureHubRegistry:
+    """The running CaptureHub of each live source"""
+
+    def __init__(self):
+        self._hubs = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, video_source, on_frame=None):
+        """Subscribe to a live source, opening its capture if nobody else has"""
+        if video_source.source_type not in LIVE_SOURCE_TYPES:
+            raise Exception(f"Only live sources can be shared, not {video_source.source_type}")
+
+        key = str(video_source.id)
+        while True:
+            with self._lock:
+                hub = self._hubs.get(key)
+                if hub is None or hub.closed:
+                    hub = CaptureHub(key, video_source.source_url, registry=self)
+                    self._hubs[key] = hub
+            subscriber = hub.subscribe(on_frame)
+            if subscriber is not None:
+                return subscriber, hub
+            # The hub shut down between lookup and subscribe; start a new one
+
+    def discard(self, hub):
+        with self._lock:
+            if self._hubs.get(hub.source_id) is hub:
+                del self._hubs[hub.source_id]
+
+    def get_statistics(self):
+        with self._lock:
+            hubs = list(self._hubs.values())
+        return [hub.get_statistics() for hub in hubs]
+
+
+capture_hubs = CaptureHubRegistry()
@@ -0,0 +1,314 @@
+import collections
+import functools
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+class FrameRingBuffer:
+    """The last few seconds of one source's frames, held within a memory budget
+
+    Frames are scaled down to at most ``max_width`` pixels wide. If the whole
+    window fits the budget uncompressed, the frames are copied into one
+    preallocated array. Otherwise each frame is stored JPEG-encoded, and
+    the oldest frames are dropped while the encoded window is over the
+    budget. That shortens the pre-roll but never grows the buffer.
+
+    Timestamps are whatever clock the source runs on: capture time for live
+    sources, media time for files. Clips are cut on that clock too, by the
+    first push that reaches their end, so a file decoded faster than real
+    time still gets its post-event window.
+    """
+
+    RAW = 'RAW'
+    JPEG = 'JPEG'
+
+    def __init__(self, seconds, fps, memory_budget, max_width=960, jpeg_quality=80):
+        self.capacity = max(1, int(math.ceil(seconds * (fps or 25))))
+        self.memory_budget = memory_budget
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self._lock = threading.Lock()
+
+        self.mode = None
+        self.frame_size = None  # (width, height) of the stored frames
+        self._frames = None  # RAW: (capacity, height, width, 3) array
+        self._timestamps = None  # RAW: capture time of each slot
+        self._next = 0
+        self._count = 0
+        self._encoded = collections.deque()  # JPEG: (timestamp, bytes), oldest first
+        self._encoded_bytes = 0
+        self._scaled = None  # JPEG: scratch frame the scaled copy is drawn into
+        self._clips = []  # (start, end, on_ready) of clips waiting for their last frame
+        self.closed = False
+
+        self.latest_timestamp = None
+        self.frames_pushed = 0
+        self.frames_evicted_for_budget = 0
+
+    def _allocate(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(1.0, self.max_width / frame_width) if self.max_width else 1.0
+        width, height = max(1, int(frame_width * scale)), max(1, int(frame_height * scale))
+        self.frame_size = (width, height)
+
+        if self.capacity * width * height * 3 <= self.memory_budget:
+            self.mode = self.RAW
+            self._frames = np.empty((self.capacity, height, width, 3), dtype=np.uint8)
+            self._timestamps = np.full(self.capacity, -np.inf)
+        else:
+            self.mode = self.JPEG
+            self._scaled = np.empty((height, width, 3), dtype=np.uint8)
+
+    def _scale_into(self, frame, out):
+        if frame.shape[1::-1] == self.frame_size:
+            np.copyto(out, frame)
+        else:
+            cv2.resize(frame, self.frame_size, dst=out, interpolation=cv2.INTER_LINEAR)
+
+    def push(self, frame, timestamp=None):
+        """Store a BGR frame captured at ``timestamp``; called by a single capture thread
+
+        Clips whose window this frame completes are cut here.
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        if self.mode is None:
+            with self._lock:
+                if self.mode is None:
+                    self._allocate(frame)
+
+        if self.mode == self.RAW:
+            with self._lock:
+                slot = self._next
+                self._scale_into(frame, self._frames[slot])
+                self._timestamps[slot] = timestamp
+                self._next = (slot + 1) % self.capacity
+                self._count = min(self._count + 1, self.capacity)
+                self.latest_timestamp = timestamp
+                self.frames_pushed += 1
+                ready = self._pop_clips(timestamp)
+            self._cut(ready)
+            return
+
+        # Encode outside the lock; only the deque update is shared
+        self._scale_into(frame, self._scaled)
+        ok, encoded = cv2.imencode('.jpg', self._scaled, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        data = encoded.tobytes()
+        with self._lock:
+            self._encoded.append((timestamp, data))
+            self._encoded_bytes += len(data)
+            while len(self._encoded) > self.capacity:
+                self._encoded_bytes -= len(self._encoded.popleft()[1])
+            # The scratch frame counts against the budget too
+            while self._encoded_bytes + self._scaled.nbytes > self.memory_budget and len(self._encoded) > 1:
+                self._encoded_bytes -= len(self._encoded.popleft()[1])
+                self.frames_evicted_for_budget += 1
+            self.latest_timestamp = timestamp
+            self.frames_pushed += 1
+            ready = self._pop_clips(timestamp)
+        self._cut(ready)
+
+    def add_clip(self, start, end, on_ready):
+        """Call ``on_ready(frames)`` with the frames from ``start`` to ``end`` once ``end`` is buffered
+
+        ``frames`` is what ``frames_between`` returns. The call is made on
+        the thread whose push completes the window, or on this one if it
+        is already buffered or the buffer has been closed.
+        """
+        with self._lock:
+            if not self.closed and (self.latest_timestamp is None or self.latest_timestamp < end):
+                self._clips.append((start, end, on_ready))
+                return
+        on_ready(self.frames_between(start, end))
+
+    def _pop_clips(self, timestamp):
+        """Remove and return the clips complete at ``timestamp``; called with the lock held"""
+        if not self._clips:
+            return []
+        ready = [clip for clip in self._clips if clip[1] <= timestamp]
+        if ready:
+            self._clips = [clip for clip in self._clips if clip[1] > timestamp]
+        return ready
+
+    def _cut(self, clips):
+        for start, end, on_ready in clips:
+            on_ready(self.frames_between(start, end))
+
+    def close(self):
+        """The source has ended: cut every waiting clip from the frames there are"""
+        with self._lock:
+            self.closed = True
+            ready, self._clips = self._clips, []
+        self._cut(ready)
+
+    def frames_between(self, start, end):
+        """(timestamp, frame) pairs captured from ``start`` to ``end``, oldest first
+
+        RAW frames are copied and JPEG frames returned still encoded as
+        bytes, so the caller can decode them off the capture thread.
+        """
+        with self._lock:
+            if self.mode == self.RAW:
+                order = (self._next - self._count + np.arange(self._count)) % self.capacity
+                order = order[(self._timestamps[order] >= start) & (self._timestamps[order] <= end)]
+                return list(zip(self._timestamps[order].tolist(), self._frames[order]))
+            return [(timestamp, data) for timestamp, data in self._encoded if start <= timestamp <= end]
+
+    def memory_bytes(self):
+        if self.mode == self.RAW:
+            return self._frames.nbytes
+        return self._encoded_bytes + (self._scaled.nbytes if self._scaled is not None else 0)
+
+    def get_statistics(self):
+        with self._lock:
+            if self.mode == self.RAW:
+                buffered = self._count
+                oldest = float(self._timestamps[(self._next - self._count) % self.capacity]) if self._count else None
+            else:
+                buffered = len(self._encoded)
+                oldest = self._encoded[0][0] if self._encoded else None
+            return {
+                'mode': self.mode,
+                'frame_size': self.frame_size,
+                'capacity': self.capacity,
+                'frames_buffered': buffered,
+                'seconds_buffered': (self.latest_timestamp - oldest) if oldest is not None else 0.0,
+                'memory_bytes': self.memory_bytes() if self.mode else 0,
+                'memory_budget': self.memory_budget,
+                'frames_pushed': self.frames_pushed,
+                'frames_evicted_for_budget': self.frames_evicted_for_budget,
+                'clips_waiting': len(self._clips),
+            }
+
+
+class BufferFeeder:
+    """Pushes frames into a FrameRingBuffer on its own thread
+
+    A shared capture thread hands frames over with ``offer``, which never
+    blocks, so scaling and encoding them never slows its other
+    subscribers. Frames offered while ``queue_size`` are already waiting
+    are dropped and counted.
+    """
+
+    def __init__(self, buffer, queue_size=32, name='clip-buffer'):
+        self.buffer = buffer
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.frames_dropped = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def offer(self, frame, timestamp):
+        try:
+            self._queue.put_nowait((frame, timestamp))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self.buffer.push(*item)
+            except Exception as e:
+                print(f"Error buffering frame for clips: {str(e)}")
+
+    def close(self):
+        """Push the frames still queued, then stop; no more frames may be offered"""
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+
+class ClipExporter:
+    """Cuts event clips out of ring buffers and encodes them on a thread pool
+
+    A clip is cut by its buffer once the post-event window has been pushed,
+    so no thread waits on a request; only the encoding runs on the pool.
+    """
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='clip-export')
+        self._lock = threading.Lock()
+        self.clips_requested = 0
+        self.clips_exported = 0
+        self.clips_failed = 0
+        self.export_time = 0.0
+
+    def request(self, buffer, event_time, pre_seconds, post_seconds, path, callback=None):
+        """Export the frames from ``pre_seconds`` before to ``post_seconds`` after an event
+
+        ``event_time`` is on the buffer's clock. ``callback(path, file_size,
+        mime_type)`` runs on the pool once the clip is written.
+        """
+        with self._lock:
+            self.clips_requested += 1
+        buffer.add_clip(event_time - pre_seconds, event_time + post_seconds,
+                        functools.partial(self._submit, buffer, path, callback))
+
+    def _submit(self, buffer, path, callback, frames):
+        if not frames:
+            with self._lock:
+                self.clips_failed += 1
+            return
+        self._executor.submit(self._export, frames, buffer.frame_size, path, callback)
+
+    def _export(self, frames, frame_size, path, callback):
+        start_time = time.time()
+        try:
+            # Play back at the rate the frames were captured, within what MPEG-4 accepts
+            duration = frames[-1][0] - frames[0][0]
+            fps = (len(frames) - 1) / duration if duration > 0 else 1.0
+            fps = round(min(max(fps, 1.0), 60.0), 2)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, frame_size)
+            if not writer.isOpened():
+                raise Exception(f"Could not open video writer for {path}")
+            try:
+                for _, frame in frames:
+                    if isinstance(frame, bytes):
+                        frame = cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    writer.write(frame)
+            finally:
+                writer.release()
+
+            file_size = os.path.getsize(path)
+            if callback is not None:
+                callback(path, file_size, 'video/mp4')
+            with self._lock:
+                self.clips_exported += 1
+                self.export_time += time.time() - start_time
+        except Exception as e:
+            print(f"Error exporting evidence clip: {str(e)}")
+            with self._lock:
+                self.clips_failed += 1
+
+    def get_statistics(self):
+        with self._lock:
+            return {
+                'clips_requested': self.clips_requested,
+                'clips_exported': self.clips_exported,
+                'clips_failed': self.clips_failed,
+                'average_export_time': self.export_time / self.clips_exported if self.clips_exported else 0.0,
+            }
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_clip_exporter(max_workers=2):
+    """Process-wide clip exporter, shared by every detection session"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = ClipExporter(max_workers)
+        return _exporter
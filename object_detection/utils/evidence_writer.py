@@ -0,0 +1,288 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+from django.db import connection
+
+# Encoder settings and MIME type of each snapshot format
+SNAPSHOT_FORMATS = {
+    'JPEG': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'WEBP': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+}
+
+DROP_NEWEST = 'DROP_NEWEST'  # Refuse new snapshots while the queue is full
+DROP_OLDEST = 'DROP_OLDEST'  # Discard the oldest queued snapshot to make room
+BLOCK = 'BLOCK'  # Wait up to block_timeout for room, then refuse
+
+
+class SnapshotJob:
+    """One evidence snapshot waiting to be annotated, encoded and written"""
+
+    def __init__(self, frame, detection_result, path, violation_event_id=None, challan_id=None, annotate=None):
+        self.frame = frame  # Must not be modified by the caller after submitting
+        self.detection_result = detection_result
+        self.path = path  # Without extension; the format adds it
+        self.violation_event_id = violation_event_id
+        self.challan_id = challan_id
+        self.annotate = annotate  # annotate(frame, detection_result) -> annotated copy
+        self.submitted_at = time.time()
+
+
+class EvidenceWriter:
+    """Writes annotated evidence snapshots and thumbnails on a thread pool
+
+    Detection threads only enqueue a job. Workers draw the detections,
+    encode the snapshot and its thumbnail and write both to disk, and
+    ViolationEvidence rows are inserted together by ``bulk_create`` every
+    ``batch_size`` rows or ``flush_interval`` seconds. The queue is bounded;
+    when a slow disk lets it fill up, ``drop_policy`` decides which snapshot
+    is lost rather than letting detection stall behind the disk.
+    """
+
+    def __init__(self, max_workers=2, queue_size=64, image_format='JPEG', quality=85, thumbnail_width=320,
+                 batch_size=50, flush_interval=1.0, drop_policy=DROP_OLDEST, block_timeout=0.05):
+        if image_format not in SNAPSHOT_FORMATS:
+            raise Exception(f"Unsupported snapshot format: {image_format}")
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST, BLOCK):
+            raise Exception(f"Unsupported drop policy: {drop_policy}")
+
+        self.extension, quality_flag, self.mime_type = SNAPSHOT_FORMATS[image_format]
+        self.encode_params = [quality_flag, quality]
+        self.thumbnail_width = thumbnail_width
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._rows = []
+        self._rows_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._running = True
+
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.encode_time = 0.0
+        self.write_time = 0.0
+        self.queue_wait_time = 0.0
+        self.rows_created = 0
+        self.batches_flushed = 0
+
+        self._workers = [threading.Thread(target=self._work, name=f'evidence-writer-{i}', daemon=True)
+                         for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+        self._flusher = threading.Thread(target=self._flush_loop, name='evidence-flusher', daemon=True)
+        self._flusher.start()
+
+    def submit(self, job):
+        """Queue a snapshot; returns False if the drop policy discarded it"""
+        with self._stats_lock:
+            self.submitted += 1
+        if not self._running:
+            self._count_drop()
+            return False
+
+        if self.drop_policy == BLOCK:
+            try:
+                self._queue.put(job, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                self._count_drop()
+                return False
+
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            if self.drop_policy == DROP_NEWEST:
+                self._count_drop()
+                return False
+
+        # DROP_OLDEST: the newest evidence is the one still worth having
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._count_drop()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(job)
+                return True
+            except queue.Full:
+                continue
+
+    def _count_drop(self):
+        with self._stats_lock:
+            self.dropped += 1
+
+    def _encode_to(self, path, image):
+        ok, encoded = cv2.imencode(self.extension, image, self.encode_params)
+        if not ok:
+            raise Exception(f"Could not encode {path}")
+        with open(path, 'wb') as f:
+            f.write(encoded.tobytes())
+        return len(encoded)
+
+    def _write(self, job):
+        start_time = time.time()
+        frame = job.annotate(job.frame, job.detection_result) if job.annotate else job.frame
+
+        frame_height, frame_width = frame.shape[:2]
+        thumbnail = None
+        if self.thumbnail_width and frame_width > self.thumbnail_width:
+            thumbnail_height = max(1, int(frame_height * self.thumbnail_width / frame_width))
+            thumbnail = cv2.resize(frame, (self.thumbnail_width, thumbnail_height), interpolation=cv2.INTER_AREA)
+        encoded_at = time.time()
+
+        os.makedirs(os.path.dirname(job.path), exist_ok=True)
+        path = job.path + self.extension
+        file_size = self._encode_to(path, frame)
+        thumbnail_path = None
+        if thumbnail is not None:
+            thumbnail_path = job.path + '_thumb' + self.extension
+            self._encode_to(thumbnail_path, thumbnail)
+        written_at = time.time()
+
+        with self._stats_lock:
+            self.written += 1
+            self.bytes_written += file_size
+            self.encode_time += encoded_at - start_time
+            self.write_time += written_at - encoded_at
+            self.queue_wait_time += start_time - job.submitted_at
+        return path, thumbnail_path, file_size
+
+    def _work(self):
+        while self._running:
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                path, thumbnail_path, file_size = self._write(job)
+                with self._rows_lock:
+                    self._rows.append((job, path, thumbnail_path, file_size))
+                    full = len(self._rows) >= self.batch_size
+                if full:
+                    self._flush_event.set()
+            except Exception as e:
+                print(f"Error writing evidence snapshot: {str(e)}")
+                with self._stats_lock:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def _flush_loop(self):
+        try:
+            while self._running:
+                self._flush_event.wait(self.flush_interval)
+                self._flush_event.clear()
+                self.flush()
+        finally:
+            self.flush()
+            connection.close()
+
+    def flush(self):
+        """Insert the ViolationEvidence rows of every snapshot written so far"""
+        with self._rows_lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return
+
+        from challan_app.models import ViolationEvidence
+        from challan_app.utils.challan_ingestion import link_evidence
+
+        try:
+            ViolationEvidence.objects.bulk_create([
+                ViolationEvidence(
+                    challan_id=job.challan_id,
+                    violation_event_id=job.violation_event_id,
+                    evidence_type='IMAGE',
+                    file_path=path,
+                    thumbnail_path=thumbnail_path,
+                    file_size=file_size,
+                    mime_type=self.mime_type,
+                    is_processed=True,
+                )
+                for job, path, thumbnail_path, file_size in rows
+            ])
+            # Events challaned while their snapshots were being written
+            link_evidence({job.violation_event_id for job, _, _, _ in rows if not job.challan_id})
+            with self._stats_lock:
+                self.rows_created += len(rows)
+                self.batches_flushed += 1
+        except Exception as e:
+            print(f"Error saving evidence snapshots: {str(e)}")
+            with self._stats_lock:
+                self.failed += len(rows)
+
+    def join(self, timeout=None):
+        """Wait for queued snapshots to be written, then flush their rows"""
+        deadline = time.time() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(0.01)
+        self.flush()
+
+    def close(self, timeout=10):
+        """Write the queued snapshots and their rows, then stop every thread
+
+        Snapshots submitted afterwards are dropped.
+        """
+        self.join(timeout)
+        self._running = False
+        for worker in self._workers:
+            worker.join(timeout)
+        self._flush_event.set()
+        self._flusher.join(timeout)
+        # Rows of a snapshot finished after the flusher's last pass
+        self.flush()
+
+    def get_statistics(self):
+        with self._stats_lock:
+            written = self.written
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_size': self._queue.maxsize,
+                'drop_policy': self.drop_policy,
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'written': written,
+                'failed': self.failed,
+                'bytes_written': self.bytes_written,
+                'rows_created': self.rows_created,
+                'batches_flushed': self.batches_flushed,
+                'average_encode_time': self.encode_time / written if written else 0.0,
+                'average_write_time': self.write_time / written if written else 0.0,
+                'average_queue_wait': self.queue_wait_time / written if written else 0.0,
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_evidence_writer(**kwargs):
+    """Process-wide evidence writer, shared by every detection session"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = EvidenceWriter(**kwargs)
+        return _writer
+
+
+def close_evidence_writer(timeout=10):
+    """Finish and stop the process-wide evidence writer, if one was started"""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close(timeout)
@@ -0,0 +1,93 @@
+import threading
+import time
+
+
+class LatestFrameGrabber:
+    """One reader's view of a live source, keeping only the newest frame
+
+    ``cv2.VideoCapture`` buffers frames, so a reader slower than the camera
+    falls further behind real time with every frame. A CaptureHub drains
+    the capture as fast as the source delivers and ``put``s each frame
+    here, overwriting a single slot, so ``read`` always returns the current
+    frame. Frames overwritten before anyone read them are counted as
+    dropped. ``on_frame(frame, captured_at)``, if given, sees every frame on
+    the feeding thread, dropped or not; ``on_stop`` lets the feeder know the
+    reader has gone.
+    """
+
+    def __init__(self, on_frame=None, on_stop=None):
+        self.on_frame = on_frame
+        self.on_stop = on_stop
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_number = 0
+        self._captured_at = None
+        self._running = True
+        self._ended = False
+
+        self.frames_grabbed = 0
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+        self.last_frame_age = 0.0
+
+    def put(self, frame, captured_at):
+        """Offer a newly captured frame, replacing any still unread"""
+        if self.on_frame is not None:
+            self.on_frame(frame, captured_at)
+        with self._cond:
+            if self._frame is not None:
+                # The previous frame was never read
+                self.frames_dropped += 1
+            self._frame = frame
+            self._frame_number += 1
+            self._captured_at = captured_at
+            self.frames_grabbed += 1
+            self._cond.notify_all()
+
+    def end(self):
+        """Mark the source as having stopped delivering frames"""
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+    @property
+    def ended(self):
+        """Whether the source stopped delivering frames"""
+        return self._ended
+
+    def read(self, timeout=None):
+        """Wait for a frame newer than the last one read
+
+        Returns ``(frame_number, frame, captured_at)``, or None if the wait
+        timed out, the source has ended or the grabber was stopped.
+        """
+        with self._cond:
+            while self._frame is None:
+                if self._ended or not self._running:
+                    return None
+                if not self._cond.wait(timeout):
+                    return None
+
+            frame, self._frame = self._frame, None
+            self.frames_delivered += 1
+            self.last_frame_age = time.time() - self._captured_at
+            return self._frame_number, frame, self._captured_at
+
+    def stop(self):
+        """Stop reading and let the feeder know"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self.on_stop is not None:
+            self.on_stop(self)
+
+    def get_statistics(self):
+        with self._cond:
+            grabbed = self.frames_grabbed
+            return {
+                'frames_grabbed': grabbed,
+                'frames_delivered': self.frames_delivered,
+                'frames_dropped': self.frames_dropped,
+                'drop_ratio': self.frames_dropped / grabbed if grabbed else 0.0,
+                'last_frame_age': self.last_frame_age,
+            }
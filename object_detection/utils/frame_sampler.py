@@ -0,0 +1,69 @@
+import math
+
+
+class FrameSampler:
+    """Picks which source frames to decode so analysis runs at a target rate
+
+    Frames that are not sampled should be skipped with ``cap.grab()`` so they
+    are never decoded. The stride widens when measured processing time shows
+    the target rate can't be sustained, so a session never drifts further
+    behind real time.
+    """
+
+    def __init__(self, source_fps, target_fps=None, smoothing=0.2):
+        self.source_fps = source_fps if source_fps and source_fps > 0 else 30.0
+        self.target_fps = target_fps
+        self.smoothing = smoothing
+        self.avg_processing_time = None
+        self.stride = self._compute_stride()
+
+        self._next_frame = 1
+        self.frames_seen = 0
+        self.frames_sampled = 0
+
+    def should_sample(self, frame_number):
+        """Whether ``frame_number`` (1-based) should be decoded and analysed"""
+        self.frames_seen += 1
+        if frame_number < self._next_frame:
+            return False
+
+        self._next_frame = frame_number + self.stride
+        self.frames_sampled += 1
+        return True
+
+    def record_processing_time(self, seconds):
+        """Feed back measured per-frame processing time to adapt the stride"""
+        if self.target_fps is None or seconds <= 0:
+            return
+
+        if self.avg_processing_time is None:
+            self.avg_processing_time = seconds
+        else:
+            self.avg_processing_time += self.smoothing * (seconds - self.avg_processing_time)
+        self.stride = self._compute_stride()
+
+    def _compute_stride(self):
+        if not self.target_fps:
+            return 1
+
+        rate = self.target_fps
+        if self.avg_processing_time:
+            # Never sample faster than frames can actually be processed
+            rate = min(rate, 1.0 / self.avg_processing_time)
+        return max(1, int(math.ceil(self.source_fps / rate)))
+
+    @property
+    def analysis_fps(self):
+        return self.source_fps / self.stride
+
+    def get_statistics(self):
+        return {
+            'source_fps': self.source_fps,
+            'target_fps': self.target_fps,
+            'analysis_fps': self.analysis_fps,
+            'stride': self.stride,
+            'frames_seen': self.frames_seen,
+            'frames_sampled': self.frames_sampled,
+            'frames_skipped': self.frames_seen - self.frames_sampled,
+            'avg_processing_time': self.avg_processing_time,
+        }
@@ -0,0 +1,140 @@
+import collections
+import datetime
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def _orientation(a, b, c):
+    """Sign of the turn a -> b -> c for broadcastable (..., 2) point arrays"""
+    return np.sign((b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) -
+                   (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0]))
+
+
+class LineCrossingCounter:
+    """Counts tracked vehicles crossing a source's counting lines, in memory
+
+    For each track and line, the last bottom-centre point seen off the line
+    and the side it was on are remembered between frames; a track that
+    reappears on the other side, having passed between the line's ends,
+    counts once for that line, its class and its direction. Points landing
+    exactly on a line keep the earlier side, so a step onto the line and a
+    step off it still count as one crossing. Counts accumulate per time
+    bucket until ``drain`` hands them over to be flushed.
+    """
+
+    def __init__(self, lines, frame_shape, bucket_seconds=60, forget_after=300):
+        """``lines`` are (line_id, roi_id or None, (x1, y1, x2, y2) in pixels)"""
+        frame_height, frame_width = frame_shape[:2]
+        scale = np.array([frame_width, frame_height, frame_width, frame_height], dtype=np.float64)
+        self.line_ids = [line_id for line_id, _, _ in lines]
+        self.line_rois = np.array([str(roi_id) if roi_id else '' for _, roi_id, _ in lines], dtype=object)
+        endpoints = np.array([coords for _, _, coords in lines], dtype=np.float64).reshape(-1, 4) / scale
+        self.starts = endpoints[:, :2]
+        self.ends = endpoints[:, 2:]
+
+        self.bucket_seconds = bucket_seconds
+        self.forget_after = forget_after
+        self._points = {}  # track id -> (last off-line point per line, its side per line, frame seen)
+        self._frame = 0
+        self._pending = collections.Counter()
+        self.totals = collections.Counter()
+
+    def _bucket_start(self, timestamp):
+        start = timestamp - timestamp % self.bucket_seconds
+        return datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc)
+
+    def update(self, detection_result, timestamp, roi_ids=None):
+        """Count the crossings made by the tracked detections of one frame"""
+        self._frame += 1
+        if detection_result and detection_result.get('track_ids') and len(self.line_ids):
+            boxes = np.asarray(detection_result['boxes'], dtype=np.float64).reshape(-1, 4)
+            points = np.stack([(boxes[:, 1] + boxes[:, 3]) / 2, boxes[:, 2]], axis=1)
+            track_ids = detection_result['track_ids']
+
+            # Side of each line every point is on, 0 exactly on it: (detections, lines)
+            sides = _orientation(self.starts, self.ends, points[:, None, :])
+
+            seen = [i for i, track_id in enumerate(track_ids) if track_id in self._points]
+            if seen:
+                current = points[seen][:, None, :]
+                anchors = np.array([self._points[track_ids[i]][0] for i in seen])
+                anchor_sides = np.array([self._points[track_ids[i]][1] for i in seen])
+
+                # Tracks now on the opposite side of a line from where they were last
+                # seen off it, having passed between its ends: (tracks, lines)
+                crossed = ((anchor_sides * sides[seen] < 0) &
+                           (_orientation(anchors, current, self.starts) *
+                            _orientation(anchors, current, self.ends) <= 0))
+
+                # Lines tied to an ROI only count vehicles standing in it
+                if roi_ids is not None:
+                    track_rois = np.array([str(roi_ids[i] or '') for i in seen], dtype=object)
+                    crossed &= (self.line_rois == '') | (self.line_rois == track_rois[:, None])
+                else:
+                    crossed &= self.line_rois == ''
+
+                if crossed.any():
+                    forward = sides[seen] > 0
+                    bucket_start = self._bucket_start(timestamp)
+                    for t, l in zip(*np.nonzero(crossed)):
+                        key = (self.line_ids[l], bucket_start,
+                               int(detection_result['objects'][seen[t]]),
+                               'FORWARD' if forward[t, l] else 'BACKWARD')
+                        self._pending[key] += 1
+                        self.totals[key[0], key[2], key[3]] += 1
+
+            for i, track_id in enumerate(track_ids):
+                entry = self._points.get(track_id)
+                if entry is None:
+                    anchors = np.repeat(points[i][None, :], len(self.line_ids), axis=0)
+                    self._points[track_id] = (anchors, sides[i].copy(), self._frame)
+                    continue
+                # Points on a line keep the last off-line point and side for it
+                anchors, anchor_sides, _ = entry
+                off_line = sides[i] != 0
+                anchors[off_line] = points[i]
+                anchor_sides[off_line] = sides[i][off_line]
+                self._points[track_id] = (anchors, anchor_sides, self._frame)
+
+        # Forget tracks that have long since left the frame
+        if self._frame % self.forget_after == 0:
+            cutoff = self._frame - self.forget_after
+            self._points = {track_id: entry for track_id, entry in self._points.items() if entry[2] > cutoff}
+
+    def drain(self):
+        """Counts accumulated since the last drain, cleared"""
+        pending, self._pending = self._pending, collections.Counter()
+        return pending
+
+    def get_statistics(self):
+        return {
+            'lines': len(self.line_ids),
+            'tracked_points': len(self._points),
+            'pending_buckets': len(self._pending),
+            'crossings': [{
+                'counting_line': str(line_id),
+                'object_class': object_class,
+                'direction': direction,
+                'count': count,
+            } for (line_id, object_class, direction), count in self.totals.items()],
+        }
+
+
+def flush_flow_counts(counts):
+    """Add drained (line_id, bucket_start, class, direction) counts to VehicleFlowCount"""
+    from object_detection.models import VehicleFlowCount
+
+    for (line_id, bucket_start, object_class, direction), count in counts.items():
+        lookup = dict(counting_line_id=line_id, bucket_start=bucket_start,
+                      object_class=object_class, direction=direction)
+        with transaction.atomic():
+            if VehicleFlowCount.objects.filter(**lookup).update(count=F('count') + count):
+                continue
+            try:
+                # Savepoint, so a concurrent insert of the same bucket can fall back to update
+                with transaction.atomic():
+                    VehicleFlowCount.objects.create(count=count, **lookup)
+            except IntegrityError:
+                VehicleFlowCount.objects.filter(**lookup).update(count=F('count') + count)
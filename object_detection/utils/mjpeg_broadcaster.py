@@ -0,0 +1,308 @@
+import threading
+import time
+
+import cv2
+from django.conf import settings
+
+from .capture_hub import capture_hubs
+from .object_detector import active_detectors
+
+# Multipart boundary shared with the stream view's content type
+MJPEG_BOUNDARY = b'frame'
+
+
+class StreamProfile:
+    """JPEG quality, width and frame rate a stream is encoded at
+
+    An ``annotated`` stream has the running detection session's latest
+    boxes drawn over each frame.
+    """
+
+    MIN_QUALITY = 10
+    MAX_QUALITY = 95
+    MIN_WIDTH = 160
+
+    def __init__(self, quality=75, max_width=None, max_fps=None, annotated=False):
+        self.quality = int(min(max(quality, self.MIN_QUALITY), self.MAX_QUALITY))
+        self.max_width = max(int(max_width), self.MIN_WIDTH) if max_width else None
+        self.max_fps = float(max_fps) if max_fps else None
+        self.annotated = bool(annotated)
+
+    @property
+    def key(self):
+        return (self.quality, self.max_width, self.max_fps, self.annotated)
+
+    @classmethod
+    def from_query(cls, params, profiles, default='medium', fps_limit=None):
+        """Profile named by ``?profile=``, with ``quality``, ``width``, ``fps`` and ``annotated`` overrides
+
+        ``fps_limit`` caps the frame rate whatever the query asks for.
+        Unknown names and malformed numbers fall back to the defaults.
+        """
+        options = dict(profiles.get(params.get('profile'), profiles.get(default, {})))
+        for param, option in (('quality', 'quality'), ('width', 'max_width'), ('fps', 'max_fps')):
+            try:
+                value = float(params[param])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if value > 0:
+                options[option] = value
+        if 'annotated' in params:
+            options['annotated'] = params.get('annotated', '').lower() in ('1', 'true', 'yes', 'on')
+        if fps_limit:
+            options['max_fps'] = min(options.get('max_fps') or fps_limit, fps_limit)
+        return cls(**options)
+
+    def __repr__(self):
+        return (f"StreamProfile(quality={self.quality}, max_width={self.max_width}, "
+                f"max_fps={self.max_fps}, annotated={self.annotated})")
+
+
+class FrameRateLimiter:
+    """Passes frames at no more than ``max_fps`` on average"""
+
+    def __init__(self, max_fps=None):
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self._next_due = None
+
+    def allow(self, timestamp):
+        if not self.interval:
+            return True
+        if self._next_due is not None and timestamp < self._next_due:
+            return False
+        # Step the schedule rather than restarting it from this frame, so
+        # frames arriving just after their slot don't lower the average rate
+        if self._next_due is None or timestamp - self._next_due >= self.interval:
+            self._next_due = timestamp + self.interval
+        else:
+            self._next_due += self.interval
+        return True
+
+
+def encode_part(frame, profile, overlay=None):
+    """One multipart MJPEG part holding ``frame`` encoded at ``profile``
+
+    ``overlay(image)``, if given, draws on the scaled frame in place, so
+    shared frames are never written to and drawing costs scale with the
+    output size.
+    """
+    frame_height, frame_width = frame.shape[:2]
+    if profile.max_width and frame_width > profile.max_width:
+        height = max(1, int(frame_height * profile.max_width / frame_width))
+        frame = cv2.resize(frame, (profile.max_width, height), interpolation=cv2.INTER_AREA)
+    elif overlay is not None:
+        frame = frame.copy()
+    if overlay is not None:
+        overlay(frame)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, profile.quality])
+    if not ok:
+        return None
+    return (b'--' + MJPEG_BOUNDARY + b'\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+
+
+class MjpegBroadcaster:
+    """Encodes one live source at one profile, once, for every viewer
+
+    The broadcaster subscribes to the source's CaptureHub and its encoder
+    thread encodes the newest frame whenever the profile's frame rate
+    allows, publishing the finished multipart part. Each client waits for
+    a part newer than the one it last sent; a client still busy sending
+    simply skips the parts published meanwhile, so a slow connection only
+    loses its own frames and never holds up the encoder or other clients.
+    The encoder starts with the first client and stops after the last.
+    """
+
+    def __init__(self, video_source, profile, registry=None, overlay_max_age=1.0):
+        self.video_source = video_source
+        self.profile = profile
+        self.registry = registry
+        self.overlay_max_age = overlay_max_age  # Older detections are not drawn
+        self._cond = threading.Condition()
+        self._part = None
+        self._sequence = 0
+        self._clients = 0
+        self._running = False
+        self._ended = False
+        self._subscriber = None
+        self._thread = None
+        self.closed = False
+
+        self.frames_encoded = 0
+        self.frames_skipped = 0  # Over the profile's frame rate
+        self.client_frames_dropped = 0
+        self.bytes_encoded = 0
+        self.encode_time = 0.0
+        self.frames_annotated = 0
+        self.overlay_time = 0.0
+        self.clients_served = 0
+        self.started_at = None
+
+    def _start(self):
+        self._subscriber, _ = capture_hubs.subscribe(self.video_source)
+        self._running = True
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=f'mjpeg-{self.video_source.id}', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        limiter = FrameRateLimiter(self.profile.max_fps)
+        try:
+            while self._running:
+                latest = self._subscriber.read(timeout=1.0)
+                if latest is None:
+                    if self._subscriber.ended:
+                        break
+                    continue
+                _, frame, captured_at = latest
+                if not limiter.allow(captured_at):
+                    self.frames_skipped += 1
+                    continue
+
+                start_time = time.time()
+                part = encode_part(frame, self.profile, self._draw_overlay if self.profile.annotated else None)
+                if part is None:
+                    continue
+                with self._cond:
+                    self._part = part
+                    self._sequence += 1
+                    self.frames_encoded += 1
+                    self.bytes_encoded += len(part)
+                    self.encode_time += time.time() - start_time
+                    self._cond.notify_all()
+        except Exception as e:
+            print(f"Error broadcasting video stream: {str(e)}")
+        finally:
+            with self._cond:
+                self._close()
+                self._ended = True
+                self._cond.notify_all()
+            self._subscriber.stop()
+
+    def _draw_overlay(self, image):
+        """Draw the running session's latest detections; the model is never run here"""
+        detector = active_detectors.get(self.video_source.id)
+        if detector is None:
+            return
+        detection_result = detector.current_detection(self.overlay_max_age)
+        if not detection_result:
+            return
+        start_time = time.perf_counter()
+        detector.draw_detections(image, detection_result, copy=False)
+        self.overlay_time += time.perf_counter() - start_time
+        self.frames_annotated += 1
+
+    def _attach(self):
+        """Count a new client in, starting the encoder; False if already shut down"""
+        with self._cond:
+            if self.closed:
+                return False
+            if self._thread is None:
+                try:
+                    self._start()
+                except Exception:
+                    self._close()
+                    raise
+            self._clients += 1
+            self.clients_served += 1
+            return True
+
+    def _detach(self):
+        with self._cond:
+            self._clients -= 1
+            if self._clients > 0:
+                return
+            self._close()
+        # Wake the encoder from its read so it releases the capture now
+        if self._subscriber is not None:
+            self._subscriber.stop()
+
+    def _close(self):
+        """Stop encoding and leave the registry; called with the lock held"""
+        self.closed = True
+        self._running = False
+        if self.registry is not None:
+            self.registry.discard(self)
+
+    def parts(self, timeout=5.0):
+        """Multipart parts for one attached client, until the source ends"""
+        sequence = 0
+        try:
+            while True:
+                with self._cond:
+                    while self._sequence == sequence and not self._ended:
+                        self._cond.wait(timeout)
+                    if self._sequence == sequence:
+                        return
+                    if sequence:
+                        self.client_frames_dropped += self._sequence - sequence - 1
+                    sequence = self._sequence
+                    part = self._part
+                yield part
+        finally:
+            self._detach()
+
+    def get_statistics(self):
+        with self._cond:
+            encoded = self.frames_encoded
+            elapsed = time.time() - self.started_at if self.started_at else 0.0
+            return {
+                'source_id': str(self.video_source.id),
+                'quality': self.profile.quality,
+                'max_width': self.profile.max_width,
+                'max_fps': self.profile.max_fps,
+                'clients': self._clients,
+                'clients_served': self.clients_served,
+                'frames_encoded': encoded,
+                'frames_skipped': self.frames_skipped,
+                'client_frames_dropped': self.client_frames_dropped,
+                'encode_fps': encoded / elapsed if elapsed else 0.0,
+                'average_encode_time': self.encode_time / encoded if encoded else 0.0,
+                'average_frame_bytes': self.bytes_encoded / encoded if encoded else 0.0,
+                'annotated': self.profile.annotated,
+                'frames_annotated': self.frames_annotated,
+                'average_overlay_time': self.overlay_time / self.frames_annotated if self.frames_annotated else 0.0,
+            }
+
+
+class MjpegBroadcasterRegistry:
+    """The running MjpegBroadcaster of each live source and profile"""
+
+    def __init__(self, overlay_max_age=1.0):
+        self.overlay_max_age = overlay_max_age
+        self._broadcasters = {}
+        self._lock = threading.Lock()
+
+    def stream(self, video_source, profile):
+        """Multipart parts of a live source at ``profile``, shared with its other viewers
+
+        The client is attached when iteration starts, so a response that is
+        never iterated holds no capture open.
+        """
+        key = (str(video_source.id), profile.key)
+        while True:
+            with self._lock:
+                broadcaster = self._broadcasters.get(key)
+                if broadcaster is None or broadcaster.closed:
+                    broadcaster = MjpegBroadcaster(video_source, profile, registry=self,
+                                                   overlay_max_age=self.overlay_max_age)
+                    self._broadcasters[key] = broadcaster
+            if broadcaster._attach():
+                break
+            # The broadcaster shut down between lookup and attach; start a new one
+        yield from broadcaster.parts()
+
+    def discard(self, broadcaster):
+        key = (str(broadcaster.video_source.id), broadcaster.profile.key)
+        with self._lock:
+            if self._broadcasters.get(key) is broadcaster:
+                del self._broadcasters[key]
+
+    def get_statistics(self):
+        with self._lock:
+            broadcasters = list(self._broadcasters.values())
+        return [broadcaster.get_statistics() for broadcaster in broadcasters]
+
+
+mjpeg_broadcasters = MjpegBroadcasterRegistry(
+    overlay_max_age=getattr(settings, 'OBJECT_DETECTION_OVERLAY_MAX_AGE', 1.0))
@@ -0,0 +1,216 @@
+import os
+import resource
+import sys
+import threading
+import time
+
+from .backends import TENSORFLOW, FP32, get_backend_class
+from .batching import BatchInferenceQueue
+from .scheduler import InferenceScheduler
+
+
+def _current_rss_bytes():
+    """Best-effort resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Fall back to peak RSS (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def load_category_index(labels_path):
+    """Category index for a label map, or generic class names without one"""
+    if os.path.exists(labels_path):
+        from utils import label_map_util
+        label_map = label_map_util.load_labelmap(labels_path)
+        categories = label_map_util.convert_label_map_to_categories(
+            label_map, max_num_classes=90, use_display_name=True)
+        return label_map_util.create_category_index(categories)
+
+    # Create a basic category index if labels file doesn't exist
+    return {i: {'name': f'Class_{i}'} for i in range(90)}
+
+
+class SharedModel:
+    """A detection model loaded once per process behind an inference backend
+
+    Backends are safe to call from several threads (the TensorFlow backend
+    shares one long-lived ``tf.Session``), so every detector holding this
+    handle runs inference through the same loaded model.
+    """
+
+    def __init__(self, model_name, backend, category_index, load_time, rss_delta_bytes):
+        self.model_name = model_name
+        self.backend = backend
+        self.model_file = backend.model_file
+        self.graph = getattr(backend, 'graph', None)
+        self.category_index = category_index
+        self.load_time = load_time
+        self.graph_bytes = backend.model_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+        self.loaded_at = time.time()
+
+        self._lock = threading.Lock()
+        self._users = 0
+        self._inference_calls = 0
+        self._batch_queues = {}
+        self._scheduler = None
+
+    def acquire(self):
+        """Register a running detection session as a user of this model"""
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        """Unregister a session; the model stays loaded for later requests"""
+        with self._lock:
+            self._users = max(0, self._users - 1)
+
+    def run(self, images):
+        """Run the detection graph on a uint8 batch of shape (N, H, W, 3)"""
+        with self._lock:
+            self._inference_calls += 1
+        return self.backend.run(images)
+
+    def get_batch_queue(self, batch_size, max_wait):
+        """Shared batching queue so frames from several sources share a tensor"""
+        key = (int(batch_size), float(max_wait))
+        with self._lock:
+            batch_queue = self._batch_queues.get(key)
+            if batch_queue is None:
+                batch_queue = BatchInferenceQueue(self.run, batch_size, max_wait)
+                self._batch_queues[key] = batch_queue
+        return batch_queue
+
+    def get_scheduler(self, num_workers):
+        """The scheduler whose worker pool runs inference for every source"""
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = InferenceScheduler(self.run, num_workers)
+        return self._scheduler
+
+    def close(self):
+        """Stop batching queues and close the backend"""
+        with self._lock:
+            batch_queues = list(self._batch_queues.values())
+            self._batch_queues = {}
+        for batch_queue in batch_queues:
+            batch_queue.close()
+        self.backend.close()
+
+    def get_statistics(self):
+        """Load time and memory footprint of this model"""
+        with self._lock:
+            users = self._users
+            inference_calls = self._inference_calls
+            batch_queues = list(self._batch_queues.values())
+            scheduler = self._scheduler
+        return {
+            'model_name': self.model_name,
+            'backend': self.backend.name,
+            'quantization': self.backend.quantization,
+            'model_file': self.model_file,
+            'load_time': self.load_time,
+            'graph_bytes': self.graph_bytes,
+            'rss_delta_bytes': self.rss_delta_bytes,
+            'loaded_at': self.loaded_at,
+            'active_users': users,
+            'inference_calls': inference_calls,
+            'batching': [batch_queue.get_statistics() for batch_queue in batch_queues],
+            'scheduler': scheduler.get_statistics() if scheduler else None,
+        }
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded detection models keyed by backend and model file"""
+
+    def __init__(self):
+        self._models = {}
+        self._load_locks = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name, model_path, labels_path, backend=TENSORFLOW, quantization=FP32):
+        """Return the shared model for ``model_path``, loading it on first use
+
+        Returns None if the model could not be loaded.
+        """
+        try:
+            backend_class = get_backend_class(backend)
+            key = (backend_class.name, backend_class.resolve_model_file(model_path, quantization))
+        except Exception as e:
+            print(f"Error loading model: {str(e)}")
+            return None
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model; others wait and reuse it
+        with load_lock:
+            with self._lock:
+                model = self._models.get(key)
+            if model is None:
+                model = self._load_model(model_name, backend_class(model_path, quantization), labels_path)
+                if model is None:
+                    return None
+                with self._lock:
+                    self._models[key] = model
+
+        return model
+
+    def _load_model(self, model_name, backend, labels_path):
+        """Load a model through its backend, along with its labels"""
+        try:
+            # Check if model exists
+            if not os.path.exists(backend.model_file):
+                print(f"Model file not found: {backend.model_file}")
+                print("Please download the model first")
+                return None
+
+            start_time = time.time()
+            rss_before = _current_rss_bytes()
+
+            # Load the model
+            backend.load()
+
+            # Load labels
+            category_index = load_category_index(labels_path)
+
+            model = SharedModel(
+                model_name=model_name,
+                backend=backend,
+                category_index=category_index,
+                load_time=time.time() - start_time,
+                rss_delta_bytes=max(0, _current_rss_bytes() - rss_before),
+            )
+
+            print(f"Model {model_name} ({backend.name}) loaded in {model.load_time:.2f}s")
+            return model
+
+        except Exception as e:
+            print(f"Error loading model: {str(e)}")
+            return None
+
+    def unload(self, model_path, backend=TENSORFLOW, quantization=FP32):
+        """Drop a model from the registry and close its backend"""
+        backend_class = get_backend_class(backend)
+        key = (backend_class.name, backend_class.resolve_model_file(model_path, quantization))
+        with self._lock:
+            model = self._models.pop(key, None)
+        if model is not None:
+            model.close()
+
+    def get_statistics(self):
+        """Statistics for every loaded model"""
+        with self._lock:
+            models = list(self._models.values())
+        return [model.get_statistics() for model in models]
+
+
+# Shared by every ObjectDetector in this process
+model_registry = ModelRegistry()
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap frame differencing that decides whether a frame needs inference
+
+    Frames are compared, downscaled and in grayscale, against the last frame
+    that went through the model. Only pixels inside the source's ROI
+    rectangles are considered when ROIs are given.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, area_threshold=0.005,
+                 max_skipped_frames=30, rois=None):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.max_skipped_frames = max_skipped_frames
+        self.rois = rois or []
+
+        self._reference = None
+        self._mask = None
+        self._skipped_in_row = 0
+        self.frames_checked = 0
+        self.frames_skipped = 0
+
+    def _downscale(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(round(h * self.width / w)))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _build_mask(self, frame_shape, small_shape):
+        """Rasterize ROI rectangles (full-frame pixels) at the gate's scale"""
+        if not self.rois:
+            return None
+
+        scale_y = small_shape[0] / frame_shape[0]
+        scale_x = small_shape[1] / frame_shape[1]
+        mask = np.zeros(small_shape, dtype=bool)
+        for x, y, width, height in self.rois:
+            x1, y1 = int(x * scale_x), int(y * scale_y)
+            x2 = int(np.ceil((x + width) * scale_x))
+            y2 = int(np.ceil((y + height) * scale_y))
+            mask[y1:y2, x1:x2] = True
+        return mask if mask.any() else None
+
+    def has_motion(self, frame):
+        """True if the frame changed enough since the last inferred frame"""
+        self.frames_checked += 1
+        small = self._downscale(frame)
+
+        if self._reference is None or self._reference.shape != small.shape:
+            self._mask = self._build_mask(frame.shape[:2], small.shape)
+            self._reference = small
+            self._skipped_in_row = 0
+            return True
+
+        changed = cv2.absdiff(small, self._reference) > self.pixel_threshold
+        if self._mask is not None:
+            changed_fraction = changed[self._mask].mean()
+        else:
+            changed_fraction = changed.mean()
+
+        # Refresh detections now and then even on a static scene
+        if changed_fraction > self.area_threshold or self._skipped_in_row >= self.max_skipped_frames:
+            self._reference = small
+            self._skipped_in_row = 0
+            return True
+
+        self._skipped_in_row += 1
+        self.frames_skipped += 1
+        return False
+
+    @property
+    def skip_ratio(self):
+        return self.frames_skipped / self.frames_checked if self.frames_checked else 0.0
+
+    def get_statistics(self):
+        return {
+            'frames_checked': self.frames_checked,
+            'frames_skipped': self.frames_skipped,
+            'skip_ratio': self.skip_ratio,
+        }
@@ -1,6 +1,7 @@
 import cv2
+import datetime
+import functools
 import numpy as np
-import tensorflow as tf
 import os
 import time
 from django.conf import settings
@@ -8,62 +9,220 @@ from django.utils import timezone
 import threading
 import json
 
+from .model_registry import model_registry, load_category_index
+from .process_workers import get_process_supervisor
+from .batching import run_stacked
+from .capture_hub import LIVE_SOURCE_TYPES, capture_hubs
+from .clip_buffer import BufferFeeder, FrameRingBuffer, get_clip_exporter
+from .evidence_writer import SnapshotJob, get_evidence_writer
+from .pipeline import DetectionPipeline, FramePacket
+from .plate_recognition import PlateRecognizer, get_plate_engine
+from .frame_sampler import FrameSampler
+from .line_counter import LineCrossingCounter, flush_flow_counts
+from .motion_gate import MotionGate
+from .postprocessing import PostProcessor, VEHICLE_CLASS_IDS
+from .preprocessing import InputBufferPool, prepare_input
+from .result_writer import DetectionResultWriter
+from .roi_cropping import clip_regions, map_boxes_to_frame, region_pixel_fraction
+from .roi_masks import roi_mask_cache
+from .tracking import MultiObjectTracker
+
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.5
+LABEL_THICKNESS = 2
+
+@functools.lru_cache(maxsize=4096)
+def _label_size(label):
+    """(width, height) of a detection label; labels repeat from frame to frame"""
+    return cv2.getTextSize(label, LABEL_FONT, LABEL_SCALE, LABEL_THICKNESS)[0]
+
+def draw_detections(frame, detection_result, category_index, copy=True):
+    """Draw detection boxes and class labels on a frame
+
+    With ``copy=False`` the boxes are drawn on ``frame`` itself, which
+    must then be writable.
+    """
+    if not detection_result:
+        return frame
+    
+    frame_with_boxes = frame.copy() if copy else frame
+    
+    # Convert normalized coordinates to pixel coordinates, all boxes at once
+    h, w = frame.shape[:2]
+    boxes = np.asarray(detection_result['boxes'], dtype=np.float32).reshape(-1, 4)
+    pixel_boxes = (boxes * np.array([h, w, h, w], dtype=np.float32)).astype(np.int32).tolist()
+    
+    for (y1, x1, y2, x2), score, class_id in zip(
+        pixel_boxes,
+        detection_result['scores'],
+        detection_result['objects']
+    ):
+        # Draw bounding box
+        cv2.rectangle(frame_with_boxes, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        
+        # Draw label
+        class_name = category_index.get(int(class_id), {}).get('name', f'Class_{class_id}')
+        label = f"{class_name}: {score:.2f}"
+        
+        # Calculate text position
+        text_width, text_height = _label_size(label)
+        cv2.rectangle(frame_with_boxes, (x1, y1 - text_height - 10), 
+                     (x1 + text_width, y1), (0, 255, 0), -1)
+        cv2.putText(frame_with_boxes, label, (x1, y1 - 5), 
+                   LABEL_FONT, LABEL_SCALE, (0, 0, 0), LABEL_THICKNESS)
+    
+    return frame_with_boxes
+
 class ObjectDetector:
     """Object detection class for processing video streams"""
     
-    def __init__(self):
-        self.model_name = 'ssd_mobilenet_v1_coco_11_06_2017'
-        self.model_path = os.path.join(settings.BASE_DIR, 'models', self.model_name)
-        self.labels_path = os.path.join(settings.BASE_DIR, 'data', 'mscoco_label_map.pbtxt')
+    def __init__(self, model_name=None, model_path=None, labels_path=None):
+        # Model files and inference backend come from the active ModelConfiguration, if any
+        configuration = self._load_configuration(model_name)
+        if configuration is not None and model_name in (None, configuration.model_name):
+            model_name = configuration.model_name
+            model_path = model_path or os.path.join(settings.BASE_DIR, configuration.model_path)
+            labels_path = labels_path or os.path.join(settings.BASE_DIR, configuration.labels_path)
+            self.backend = configuration.backend
+            self.quantization = configuration.quantization
+        else:
+            self.backend = getattr(settings, 'OBJECT_DETECTION_BACKEND', 'TENSORFLOW')
+            self.quantization = getattr(settings, 'OBJECT_DETECTION_QUANTIZATION', 'FP32')
+        
+        self.model_name = model_name or getattr(
+            settings, 'OBJECT_DETECTION_MODEL', 'ssd_mobilenet_v1_coco_11_06_2017')
+        self.model_path = model_path or os.path.join(settings.BASE_DIR, 'models', self.model_name)
+        self.labels_path = labels_path or os.path.join(settings.BASE_DIR, 'data', 'mscoco_label_map.pbtxt')
+        self.model = None
         self.detection_graph = None
         self.category_index = None
         self.is_processing = False
         
+        # Batched inference (a batch size of 1 runs each frame on its own)
+        self.batch_size = max(1, int(getattr(settings, 'OBJECT_DETECTION_BATCH_SIZE', 1)))
+        self.batch_max_wait = getattr(settings, 'OBJECT_DETECTION_BATCH_MAX_WAIT', 0.05)
+        
+        # Staged capture -> preprocess -> inference -> writer pipeline
+        self.pipeline_queue_size = getattr(settings, 'OBJECT_DETECTION_PIPELINE_QUEUE_SIZE', 8)
+        self.pipeline = None
+        
+        # Frames are resized to the model input and converted to RGB once, into
+        # reused buffers (None feeds full-resolution frames)
+        self.input_size = getattr(settings, 'OBJECT_DETECTION_INPUT_SIZE', 300)
+        self.input_pool = None
+        self.roi_input_pool = None
+        
+        self.session = None
+        self.video_source = None
+        self.frames_processed = 0
+        self.total_detections = 0
+        
+        # DetectionResult rows and session statistics are written in batches
+        self.result_batch_size = getattr(settings, 'OBJECT_DETECTION_RESULT_BATCH_SIZE', 100)
+        self.result_flush_interval = getattr(settings, 'OBJECT_DETECTION_RESULT_FLUSH_INTERVAL', 0.5)
+        self.result_writer = None
+        
+        # Newest (detection_result, captured_at), drawn over live stream views
+        self.latest_detection = None
+        
+        # Analyse at most this many frames per second (None analyses every frame)
+        self.target_fps = getattr(settings, 'OBJECT_DETECTION_TARGET_FPS', None)
+        self.sampler = None
+        
+        # Live sources are read on a grabber thread that keeps only the newest frame
+        self.latest_frame_only = getattr(settings, 'OBJECT_DETECTION_LATEST_FRAME_ONLY', True)
+        self.grabber = None
+        self.capture_hub = None
+        
+        # Skip inference on frames without motion, reusing the last detections
+        self.motion_gating = getattr(settings, 'OBJECT_DETECTION_MOTION_GATE', False)
+        self.motion_gate_roi_only = getattr(settings, 'OBJECT_DETECTION_MOTION_GATE_ROI_ONLY', True)
+        self.motion_gate = None
+        self.last_detection_result = None
+        
+        # Send only crops of the source's active ROIs to the model
+        self.roi_cropping = getattr(settings, 'OBJECT_DETECTION_ROI_CROP', False)
+        self.roi_input_size = getattr(settings, 'OBJECT_DETECTION_ROI_INPUT_SIZE', 300)
+        self.rois = []
+        self.roi_pixel_fraction = None
+        self.frames_inferred = 0
+        self.total_inference_time = 0.0
+        
+        # Fair-share inference across sources on a fixed worker pool
+        self.use_scheduler = getattr(settings, 'OBJECT_DETECTION_SCHEDULER', False)
+        self.scheduler = None
+        
+        # Run each session in its own worker process, at most this many at once
+        # (0 runs sessions on threads in this process)
+        self.process_workers = getattr(settings, 'OBJECT_DETECTION_PROCESS_WORKERS', 0)
+        
+        # Run the detector every K analysed frames and track vehicles in between
+        self.tracking = getattr(settings, 'OBJECT_DETECTION_TRACKING', False)
+        self.detect_interval = max(1, int(getattr(settings, 'OBJECT_DETECTION_DETECT_INTERVAL', 5)))
+        self.tracker = None
+        self.frames_preprocessed = 0
+        self.frames_tracked_only = 0
+        
+        # Read each tracked vehicle's number plate once and match it to a Vehicle
+        self.plate_recognition = getattr(settings, 'OBJECT_DETECTION_PLATE_RECOGNITION', False)
+        self.plate_recognizer = None
+        self.plate_frames = 0
+        
+        # Keep a pre-roll of recent frames to cut evidence clips from
+        self.evidence_clips = getattr(settings, 'OBJECT_DETECTION_EVIDENCE_CLIPS', False)
+        self.clip_pre_seconds = getattr(settings, 'OBJECT_DETECTION_CLIP_PRE_SECONDS', 5)
+        self.clip_post_seconds = getattr(settings, 'OBJECT_DETECTION_CLIP_POST_SECONDS', 5)
+        self.clip_buffer = None
+        self.clip_feeder = None
+        
+        # Write an annotated snapshot of each violation off the detection threads
+        self.evidence_snapshots = getattr(settings, 'OBJECT_DETECTION_EVIDENCE_SNAPSHOTS', False)
+        
+        # Count tracked vehicles crossing the source's counting lines
+        self.flow_bucket_seconds = getattr(settings, 'OBJECT_DETECTION_FLOW_BUCKET_SECONDS', 60)
+        self.flow_flush_interval = getattr(settings, 'OBJECT_DETECTION_FLOW_FLUSH_INTERVAL', 30)
+        self.line_counter = None
+        self.counting_lines_loaded = False
+        self.last_flow_flush = 0.0
+        
+        # Thresholds, NMS and max detections come from the active ModelConfiguration
+        self.class_ids = getattr(settings, 'OBJECT_DETECTION_CLASS_IDS', VEHICLE_CLASS_IDS)
+        self.postprocessor = None
+        
         # Initialize the model
         self._load_model()
     
-    def _load_model(self):
-        """Load the TensorFlow model and labels"""
-        try:
-            # Check if model exists
-            model_file = os.path.join(self.model_path, 'frozen_inference_graph.pb')
-            if not os.path.exists(model_file):
-                print(f"Model file not found: {model_file}")
-                print("Please download the model first")
-                return False
-            
-            # Load the model
-            self.detection_graph = tf.Graph()
-            with self.detection_graph.as_default():
-                od_graph_def = tf.GraphDef()
-                with tf.gfile.GFile(model_file, 'rb') as fid:
-                    serialized_graph = fid.read()
-                    od_graph_def.ParseFromString(serialized_graph)
-                    tf.import_graph_def(od_graph_def, name='')
-            
-            # Load labels
-            if os.path.exists(self.labels_path):
-                from utils import label_map_util
-                label_map = label_map_util.load_labelmap(self.labels_path)
-                categories = label_map_util.convert_label_map_to_categories(
-                    label_map, max_num_classes=90, use_display_name=True)
-                self.category_index = label_map_util.create_category_index(categories)
-            else:
-                # Create a basic category index if labels file doesn't exist
-                self.category_index = {i: {'name': f'Class_{i}'} for i in range(90)}
-            
-            print("Model loaded successfully")
+    def _load_model(self, in_process=False):
+        """Fetch the shared model from the process-wide registry"""
+        if self.process_workers and not in_process:
+            # Worker processes load their own copies; this process only needs labels
+            self.category_index = load_category_index(self.labels_path)
             return True
-            
-        except Exception as e:
-            print(f"Error loading model: {str(e)}")
+        
+        self.model = model_registry.get_model(
+            self.model_name, self.model_path, self.labels_path,
+            backend=self.backend, quantization=self.quantization)
+        if self.model is None:
             return False
+        
+        self.detection_graph = self.model.graph
+        self.category_index = self.model.category_index
+        return True
     
     def start_detection(self, session, video_source):
         """Start object detection on a video source"""
-        if not self.detection_graph:
+        if self.process_workers:
+            # The whole session runs in a worker process, with its own model
+            get_process_supervisor(self.process_workers).start(session, video_source, self.category_index)
+            return True
+        
+        if self.model is None:
             raise Exception("Model not loaded")
         
+        # Count the session as a user of the shared model until it ends
+        if self.model is not None:
+            self.model.acquire()
+        
         # Start detection in a separate thread
         detection_thread = threading.Thread(
             target=self._process_video,
@@ -74,149 +233,679 @@ class ObjectDetector:
         
         return True
     
-    def _process_video(self, session, video_source):
-        """Process video for object detection"""
+    def _process_video(self, session, video_source, grabber=None, source_fps=None):
+        """Process video for object detection
+        
+        A worker process passes the ``grabber`` its live frames arrive on.
+        """
+        from object_detection.models import DetectionSession
+        
+        cap = None
         try:
             self.is_processing = True
             
             # Open video source
-            if video_source.source_type == 'CAMERA':
-                cap = cv2.VideoCapture(video_source.source_url)
-            elif video_source.source_type == 'FILE':
-                cap = cv2.VideoCapture(video_source.file_path)
+            self.grabber = None
+            self.capture_hub = None
+            if grabber is not None:
+                self.grabber = grabber
+            elif self.latest_frame_only and video_source.source_type in LIVE_SOURCE_TYPES:
+                # Live sources are decoded once, shared with every stream viewer
+                self.grabber, self.capture_hub = capture_hubs.subscribe(video_source)
+                source_fps = self.capture_hub.fps
             else:
-                raise Exception(f"Unsupported source type: {video_source.source_type}")
-            
-            if not cap.isOpened():
-                raise Exception("Could not open video source")
+                if video_source.source_type in LIVE_SOURCE_TYPES:
+                    cap = cv2.VideoCapture(video_source.source_url)
+                elif video_source.source_type == 'FILE':
+                    cap = cv2.VideoCapture(video_source.file_path)
+                else:
+                    raise Exception(f"Unsupported source type: {video_source.source_type}")
+                
+                if not cap.isOpened():
+                    raise Exception("Could not open video source")
+                source_fps = cap.get(cv2.CAP_PROP_FPS)
             
-            frame_count = 0
-            total_detections = 0
+            self.session = session
+            self.video_source = video_source
+            self.frames_processed = 0
+            self.total_detections = 0
+            self.latest_detection = None
+            self.result_writer = DetectionResultWriter(session, self.result_batch_size, self.result_flush_interval)
+            active_detectors.register(video_source.id, self)
+            self.sampler = FrameSampler(source_fps, self.target_fps)
+            self.clip_buffer = self._create_clip_buffer(source_fps) if self.evidence_clips else None
+            self.clip_feeder = None
+            self.postprocessor = self._create_postprocessor()
+            self.rois = self._load_rois(video_source)
+            self.roi_pixel_fraction = None
+            self._create_input_pools()
+            self.motion_gate = self._create_motion_gate() if self.motion_gating else None
+            if self.use_scheduler and self.model is not None:
+                self._register_with_scheduler(video_source)
+            self.last_detection_result = None
+            self.tracker = self._create_tracker() if self.tracking else None
+            # Plates are read once per track, so recognition needs the tracker
+            self.plate_recognizer = (self._create_plate_recognizer()
+                                     if self.plate_recognition and self.tracker is not None else None)
+            self.plate_frames = 0
+            self.line_counter = None
+            self.counting_lines_loaded = False
+            self.last_flow_flush = time.time()
+            self.frames_preprocessed = 0
+            self.frames_tracked_only = 0
+            self.frames_inferred = 0
+            self.total_inference_time = 0.0
             
-            with self.detection_graph.as_default():
-                with tf.Session(graph=self.detection_graph) as sess:
-                    # Get tensors
-                    image_tensor = self.detection_graph.get_tensor_by_name('image_tensor:0')
-                    detection_boxes = self.detection_graph.get_tensor_by_name('detection_boxes:0')
-                    detection_scores = self.detection_graph.get_tensor_by_name('detection_scores:0')
-                    detection_classes = self.detection_graph.get_tensor_by_name('detection_classes:0')
-                    num_detections = self.detection_graph.get_tensor_by_name('num_detections:0')
-                    
-                    while self.is_processing and session.status == 'ACTIVE':
-                        ret, frame = cap.read()
-                        if not ret:
-                            break
-                        
-                        frame_count += 1
-                        start_time = time.time()
-                        
-                        # Process frame
-                        detection_result = self._detect_objects(
-                            frame, sess, image_tensor, detection_boxes,
-                            detection_scores, detection_classes, num_detections
-                        )
-                        
-                        processing_time = time.time() - start_time
-                        
-                        if detection_result:
-                            # Save detection result to database
-                            from object_detection.models import DetectionResult
-                            
-                            DetectionResult.objects.create(
-                                session=session,
-                                video_source=video_source,
-                                frame_number=frame_count,
-                                timestamp=timezone.now(),
-                                detected_objects=detection_result['objects'],
-                                confidence_scores=detection_result['scores'],
-                                bounding_boxes=detection_result['boxes'],
-                                processing_time=processing_time
-                            )
-                            
-                            total_detections += len(detection_result['objects'])
-                        
-                        # Update session statistics
-                        session.total_frames_processed = frame_count
-                        session.total_detections = total_detections
-                        session.save()
-                        
-                        # Process every 5th frame to avoid overwhelming the database
-                        if frame_count % 5 != 0:
-                            continue
-                        
-                        # Check if session should be stopped
-                        session.refresh_from_db()
-                        if session.status != 'ACTIVE':
-                            break
+            # Decode, inference and database writes each run on their own
+            # thread so neither decoding nor I/O stalls the model
+            self.pipeline = DetectionPipeline(queue_size=self.pipeline_queue_size)
+            if self.grabber is not None:
+                # Every frame is buffered for clips, not just the ones analysed,
+                # off the hub's reader thread so other subscribers never wait on it
+                if self.clip_buffer is not None:
+                    self.clip_feeder = BufferFeeder(
+                        self.clip_buffer, getattr(settings, 'OBJECT_DETECTION_CLIP_QUEUE_SIZE', 32),
+                        name=f'clip-buffer-{video_source.id}')
+                    self.grabber.on_frame = self.clip_feeder.offer
+                # Queue no more frames ahead of the model than one batch, so
+                # frames can't go stale waiting for inference
+                live_queue_size = self.batch_size
+                self.pipeline.add_source('capture', self._capture_latest_frames, queue_size=1)
+            else:
+                live_queue_size = None
+                media_clock = video_source.source_type == 'FILE'
+                self.pipeline.add_source('capture', lambda: self._capture_frames(cap, source_fps, media_clock))
+            self.pipeline.add_stage('preprocess', self._preprocess_frame, queue_size=live_queue_size)
+            self.pipeline.add_stage('inference', self._infer_packets,
+                                    batch_size=self.batch_size, max_wait=self.batch_max_wait)
+            if self.plate_recognizer is not None:
+                self.pipeline.add_stage('plates', self._read_plates)
+            self.pipeline.add_stage('writer', self._write_result, last=True, on_idle=self._flush_idle_results)
+            self.pipeline.run()
+            self.result_writer.close()
             
-            # Clean up
-            cap.release()
-            session.status = 'COMPLETED'
-            session.ended_at = timezone.now()
-            session.save()
+            # Only an active session completes; a user's stop keeps its own end time
+            ended_at = timezone.now()
+            if DetectionSession.objects.filter(pk=session.pk, status='ACTIVE').update(
+                    status='COMPLETED', ended_at=ended_at):
+                session.status = 'COMPLETED'
+                session.ended_at = ended_at
             
         except Exception as e:
             print(f"Error in video processing: {str(e)}")
+            # Keep what was detected before the error
+            if self.result_writer is not None:
+                self.result_writer.close()
             session.status = 'ERROR'
             session.processing_notes = str(e)
-            session.save()
+            session.save(update_fields=['status', 'processing_notes'])
         
         finally:
+            # Clean up
+            active_detectors.unregister(video_source.id, self)
+            self.latest_detection = None
+            self._flush_flow_counts()
+            if self.grabber is not None:
+                self.grabber.stop()
+            if cap is not None:
+                cap.release()
+            if self.clip_feeder is not None:
+                self.clip_feeder.close()
+            if self.clip_buffer is not None:
+                # Clips still waiting for frames the source never delivered
+                self.clip_buffer.close()
+            if self.scheduler is not None:
+                self.scheduler.unregister(video_source.id)
+                self.scheduler = None
             self.is_processing = False
+            if self.model is not None:
+                self.model.release()
     
-    def _detect_objects(self, frame, sess, image_tensor, detection_boxes,
-                        detection_scores, detection_classes, num_detections):
-        """Detect objects in a single frame"""
-        try:
-            # Preprocess frame
-            frame_expanded = np.expand_dims(frame, axis=0)
+    def _load_rois(self, video_source):
+        """Active ROI rectangles of a source as (x, y, width, height) tuples"""
+        from object_detection.models import ROI
+        
+        return list(ROI.objects.filter(video_source=video_source, is_active=True).values_list(
+            'x_coordinate', 'y_coordinate', 'width', 'height'))
+    
+    def _create_input_pools(self):
+        """Input buffers for every frame that can be in flight between preprocessing and inference"""
+        inputs_per_frame = len(self.rois) if self.roi_cropping and self.rois else 1
+        count = (self.pipeline_queue_size + self.batch_size + 2) * inputs_per_frame
+        self.input_pool = InputBufferPool(self.input_size, count) if self.input_size else None
+        self.roi_input_pool = (InputBufferPool(self.roi_input_size, count)
+                               if self.roi_cropping and self.rois else None)
+    
+    def _create_tracker(self):
+        """Tracker whose tolerances are counted in detector runs"""
+        return MultiObjectTracker(
+            iou_threshold=getattr(settings, 'OBJECT_DETECTION_TRACK_IOU_THRESHOLD', 0.3),
+            max_age=getattr(settings, 'OBJECT_DETECTION_TRACK_MAX_AGE', 3),
+            min_hits=getattr(settings, 'OBJECT_DETECTION_TRACK_MIN_HITS', 2),
+        )
+    
+    def _create_motion_gate(self):
+        """Motion gate limited to the source's active ROIs, if it has any"""
+        return MotionGate(
+            pixel_threshold=getattr(settings, 'OBJECT_DETECTION_MOTION_PIXEL_THRESHOLD', 25),
+            area_threshold=getattr(settings, 'OBJECT_DETECTION_MOTION_AREA_THRESHOLD', 0.005),
+            rois=self.rois if self.motion_gate_roi_only else []
+        )
+    
+    def _register_with_scheduler(self, video_source):
+        """Join the shared worker pool with the source's priority and rate limit"""
+        type_weights = getattr(settings, 'OBJECT_DETECTION_SOURCE_TYPE_WEIGHTS', {})
+        weight = video_source.priority * type_weights.get(video_source.source_type, 1)
+        
+        self.scheduler = self.model.get_scheduler(
+            getattr(settings, 'OBJECT_DETECTION_INFERENCE_WORKERS', 4))
+        self.scheduler.register(video_source.id, weight=weight, max_fps=video_source.max_fps)
+    
+    def _capture_frames(self, cap, source_fps=None, media_clock=False):
+        """Capture stage: yield sampled frames until the source ends
+        
+        With ``media_clock`` frames are stamped with their position in the
+        file rather than the time they were decoded, so clip windows are
+        measured in video time however fast the file is read.
+        """
+        frame_count = 0
+        while self.is_processing:
+            frame_count += 1
             
-            # Run detection
-            (boxes, scores, classes, num) = sess.run(
-                [detection_boxes, detection_scores, detection_classes, num_detections],
-                feed_dict={image_tensor: frame_expanded}
-            )
+            sampled = self.sampler.should_sample(frame_count)
+            if sampled or self.clip_buffer is not None:
+                # Clips need every frame, so skipped frames are only left undecoded without them
+                ret, frame = cap.read()
+            else:
+                ret, frame = cap.grab(), None
             
-            # Filter detections by confidence
-            confidence_threshold = 0.5
-            valid_detections = scores[0] > confidence_threshold
+            if not ret:
+                break
             
-            if not np.any(valid_detections):
-                return None
+            captured_at = time.time()
+            media_time = self._media_time(cap, frame_count, source_fps) if media_clock else captured_at
+            if self.clip_buffer is not None:
+                self.clip_buffer.push(frame, media_time)
+            if sampled:
+                yield FramePacket(frame_count, frame, captured_at, media_time)
+    
+    @staticmethod
+    def _media_time(cap, frame_count, source_fps):
+        """Seconds into the file of the frame just read"""
+        position = cap.get(cv2.CAP_PROP_POS_MSEC)
+        if position > 0 or frame_count == 1:
+            return position / 1000.0
+        # Containers without timestamps report 0 throughout
+        return (frame_count - 1) / (source_fps or 25)
+    
+    def _capture_latest_frames(self):
+        """Capture stage for live sources: always the newest frame from the grabber"""
+        while self.is_processing:
+            latest = self.grabber.read(timeout=1.0)
+            if latest is None:
+                if self.grabber.ended:
+                    break
+                continue
             
-            # Extract valid detections
-            valid_boxes = boxes[0][valid_detections]
-            valid_scores = scores[0][valid_detections]
-            valid_classes = classes[0][valid_detections]
+            frame_number, frame, captured_at = latest
+            if self.sampler.should_sample(frame_number):
+                yield FramePacket(frame_number, frame, captured_at)
+    
+    def _preprocess_frame(self, packet):
+        """Preprocessing stage: prepare the model input for a frame"""
+        if self.motion_gate is not None and not self.motion_gate.has_motion(packet.frame):
+            packet.skip_inference = True
+            return packet
+        
+        # Between detector runs the tracker propagates the last detections
+        self.frames_preprocessed += 1
+        if self.tracker is not None and (self.frames_preprocessed - 1) % self.detect_interval:
+            packet.track_only = True
+            return packet
+        
+        if self.roi_input_pool is not None:
+            regions = clip_regions(self.rois, packet.frame.shape)
+            if regions:
+                if self.roi_pixel_fraction is None:
+                    self.roi_pixel_fraction = region_pixel_fraction(regions, packet.frame.shape)
+                packet.regions = regions
+                packet.images = self.roi_input_pool.prepare(packet.frame, regions)
+                packet.input_pool = self.roi_input_pool
+                return packet
+        
+        if self.input_pool is not None:
+            packet.images = self.input_pool.prepare(packet.frame)
+            packet.input_pool = self.input_pool
+        else:
+            packet.images = [prepare_input(packet.frame, None)]
+        return packet
+    
+    def _infer_packets(self, packets):
+        """Inference stage: run a batch of frames through the model"""
+        if self.batch_size == 1:
+            packets = [packets]
+        
+        infer_packets = [packet for packet in packets if not packet.skip_inference and not packet.track_only]
+        if infer_packets:
+            start_time = time.time()
+            detection_results = self._detect_packets(infer_packets)
+            elapsed = time.time() - start_time
+            processing_time = elapsed / len(infer_packets)
+            self.sampler.record_processing_time(processing_time)
+            self.frames_inferred += len(infer_packets)
+            self.total_inference_time += elapsed
             
-            # Convert to list format for JSON serialization
-            detection_result = {
-                'objects': valid_classes.tolist(),
-                'scores': valid_scores.tolist(),
-                'boxes': valid_boxes.tolist()
-            }
+            for packet, detection_result in zip(infer_packets, detection_results):
+                packet.detection_result = detection_result
+                packet.processing_time = processing_time
+        
+        for packet in packets:
+            # Static frames keep the detections of the last frame that moved
+            if packet.skip_inference:
+                packet.detection_result = self.last_detection_result
+            elif self.tracker is not None:
+                if packet.track_only:
+                    packet.detection_result = self.tracker.predict()
+                    self.frames_tracked_only += 1
+                else:
+                    packet.detection_result = self.tracker.update(packet.detection_result)
+                self.last_detection_result = packet.detection_result
+            else:
+                self.last_detection_result = packet.detection_result
             
-            return detection_result
+            # The model is done with the inputs, so their buffers can be reused
+            if packet.input_pool is not None and packet.images:
+                packet.input_pool.release(packet.images)
+            
+            # The writer only needs the results, not the pixels (plate reading
+            # still needs the frame)
+            if self.plate_recognizer is None:
+                packet.frame = None
+            packet.images = None
+        
+        return packets if self.batch_size > 1 else packets[0]
+    
+    def _read_plates(self, packet):
+        """Plate stage: read the plates of newly tracked vehicles"""
+        if packet.frame is not None:
+            packet.plate_reads, packet.new_plate_reads = self.plate_recognizer.process(
+                packet.frame, packet.detection_result)
+        
+        # Drop plates of tracks that have ended every 100 frames through this
+        # stage; frame numbers skip when frames are sampled or dropped
+        self.plate_frames += 1
+        if self.plate_frames % 100 == 0:
+            self.plate_recognizer.forget(self.tracker.track_ids.tolist())
+        
+        # Violations are reported by the writer, which snapshots the frame
+        if not self.evidence_snapshots:
+            packet.frame = None
+        return packet
+    
+    def _write_result(self, packet):
+        """Writer stage: persist results and session statistics"""
+        from object_detection.models import DetectionResult
+        
+        session = self.session
+        detection_result = packet.detection_result
+        self.latest_detection = (detection_result, packet.captured_at)
+        
+        roi_ids = None
+        result = None
+        if detection_result:
+            # Buffer the detection result for the next batch write
+            roi_ids = self._assign_rois(packet, detection_result)
+            result = DetectionResult(
+                session=session,
+                video_source=self.video_source,
+                frame_number=packet.frame_number,
+                timestamp=timezone.now(),
+                detected_objects=detection_result['objects'],
+                confidence_scores=detection_result['scores'],
+                bounding_boxes=detection_result['boxes'],
+                track_ids=detection_result.get('track_ids'),
+                roi_ids=roi_ids,
+                plate_numbers=self._plate_numbers(packet, detection_result),
+                processing_time=packet.processing_time
+            )
+            
+            self.total_detections += len(detection_result['objects'])
+        
+        if packet.new_plate_reads:
+            self._save_plate_reads(packet)
+            if roi_ids is not None:
+                self._report_violations(packet, roi_ids)
+        packet.frame = None
+        
+        # Line crossings need track ids, so they are only counted while tracking
+        if self.tracker is not None:
+            if not self.counting_lines_loaded:
+                self.line_counter = self._create_line_counter(packet.frame_shape)
+                self.counting_lines_loaded = True
+            if self.line_counter is not None:
+                self.line_counter.update(detection_result, packet.captured_at, roi_ids)
+                if time.time() - self.last_flow_flush >= self.flow_flush_interval:
+                    self._flush_flow_counts()
+        
+        if packet.skip_inference and self.frames_inferred:
+            session.frames_skipped_static += 1
+            session.inference_time_saved += self.total_inference_time / self.frames_inferred
+        
+        if self.grabber is not None:
+            session.frames_dropped = self.grabber.frames_dropped
+        if self.tracker is not None:
+            session.vehicles_tracked = self.tracker.tracks_confirmed
+        
+        # Update session statistics; they are saved with the next batch
+        self.frames_processed += 1
+        session.total_frames_processed = self.frames_processed
+        session.total_detections = self.total_detections
+        
+        # Only check for a stop request after writing a batch
+        if self.result_writer.add(result):
+            self._check_stop_requested()
+        
+        return None
+    
+    def _flush_idle_results(self):
+        """Writer stage, while no frames arrive: write results older than the flush interval"""
+        if self.result_writer.flush_if_due():
+            self._check_stop_requested()
+    
+    def _check_stop_requested(self):
+        """Stop detecting if the session was stopped elsewhere"""
+        from object_detection.models import DetectionSession
+        
+        status = DetectionSession.objects.filter(pk=self.session.pk).values_list('status', flat=True).first()
+        if status != 'ACTIVE':
+            self.session.status = status
+            self.stop_detection()
+    
+    def _create_plate_recognizer(self):
+        """Plate recognizer around the configured recognition engine"""
+        engine = get_plate_engine(
+            getattr(settings, 'OBJECT_DETECTION_PLATE_ENGINE', 'STUB'),
+            **getattr(settings, 'OBJECT_DETECTION_PLATE_ENGINE_OPTIONS', {})
+        )
+        return PlateRecognizer(
+            engine,
+            min_confidence=getattr(settings, 'OBJECT_DETECTION_PLATE_MIN_CONFIDENCE', 0.6),
+            max_attempts=getattr(settings, 'OBJECT_DETECTION_PLATE_MAX_ATTEMPTS', 3),
+        )
+    
+    def _plate_numbers(self, packet, detection_result):
+        """Plate of each detection's track, None where none was read"""
+        if not packet.plate_reads or not detection_result.get('track_ids'):
+            return None
+        return [packet.plate_reads.get(track_id, (None,))[0] for track_id in detection_result['track_ids']]
+    
+    def _save_plate_reads(self, packet):
+        """One PlateRead row per track, on the frame its plate was read"""
+        from object_detection.models import PlateRead
+        
+        PlateRead.objects.bulk_create([
+            PlateRead(
+                session=self.session,
+                video_source=self.video_source,
+                track_id=track_id,
+                plate_number=packet.plate_reads[track_id][0],
+                confidence=packet.plate_reads[track_id][1],
+                vehicle_id=packet.plate_reads[track_id][2],
+                frame_number=packet.frame_number,
+            )
+            for track_id in packet.new_plate_reads
+        ])
+    
+    def _report_violations(self, packet, roi_ids):
+        """ViolationEvent for each newly read vehicle standing in a violation ROI"""
+        from challan_app.models import ViolationEvent
+        
+        mask = roi_mask_cache.get(self.video_source.id, packet.frame_shape)
+        if mask is None or not mask.violation_types:
+            return
+        
+        occurred_at = datetime.datetime.fromtimestamp(packet.captured_at, tz=datetime.timezone.utc)
+        track_rois = dict(zip(packet.detection_result['track_ids'], roi_ids))
+        events = []
+        for track_id in packet.new_plate_reads:
+            violation_type_id = mask.violation_types.get(track_rois.get(track_id))
+            if violation_type_id is None:
+                continue
+            plate_number, _, vehicle_id = packet.plate_reads[track_id]
+            events.append(ViolationEvent(
+                session=self.session,
+                video_source=self.video_source,
+                violation_type_id=violation_type_id,
+                vehicle_id=vehicle_id,
+                plate_number=plate_number,
+                occurred_at=occurred_at,
+                location=self.video_source.name,
+            ))
+        if events:
+            ViolationEvent.objects.bulk_create(events)
+            if self.clip_buffer is not None:
+                for event in events:
+                    self._request_clip(event, packet.media_time)
+            if self.evidence_snapshots and packet.frame is not None:
+                self._snapshot_events(packet, events)
+    
+    def _snapshot_events(self, packet, events):
+        """Queue an annotated snapshot of the frame for each violation on it"""
+        snapshot_dir = getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_DIR',
+                               os.path.join(settings.MEDIA_ROOT, 'evidence', 'snapshots'))
+        writer = self._get_evidence_writer()
+        for event in events:
+            writer.submit(SnapshotJob(
+                packet.frame,
+                packet.detection_result,
+                os.path.join(snapshot_dir, str(self.video_source.id), str(event.id)),
+                violation_event_id=event.id,
+                annotate=self.draw_detections,
+            ))
+    
+    def _get_evidence_writer(self):
+        return get_evidence_writer(
+            max_workers=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_WORKERS', 2),
+            queue_size=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_QUEUE_SIZE', 64),
+            image_format=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_FORMAT', 'JPEG'),
+            quality=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_QUALITY', 85),
+            thumbnail_width=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_THUMBNAIL_WIDTH', 320),
+            batch_size=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_BATCH_SIZE', 50),
+            flush_interval=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_FLUSH_INTERVAL', 1.0),
+            drop_policy=getattr(settings, 'OBJECT_DETECTION_SNAPSHOT_DROP_POLICY', 'DROP_OLDEST'),
+        )
+    
+    def _create_clip_buffer(self, source_fps):
+        """Pre-roll ring buffer long enough to hold a whole clip
+        
+        Capture runs ahead of the writer stage, which requests the clips, by
+        the frames queued between the stages, so the buffer holds that
+        much more video or an event's pre-roll could be gone by its request.
+        """
+        in_flight = (self.pipeline_queue_size + 1) * 5 + self.batch_size
+        return FrameRingBuffer(
+            seconds=(self.clip_pre_seconds + self.clip_post_seconds + 1
+                     + in_flight * self.sampler.stride / (source_fps or 25)),
+            fps=source_fps or 25,
+            memory_budget=getattr(settings, 'OBJECT_DETECTION_CLIP_BUFFER_MB', 64) * 1024 * 1024,
+            max_width=getattr(settings, 'OBJECT_DETECTION_CLIP_MAX_WIDTH', 960),
+        )
+    
+    def _request_clip(self, event, event_time):
+        """Export the clip around a violation in the background and attach it to the event"""
+        clip_dir = getattr(settings, 'OBJECT_DETECTION_CLIP_DIR',
+                           os.path.join(settings.MEDIA_ROOT, 'evidence', 'clips'))
+        path = os.path.join(clip_dir, str(self.video_source.id), f"{event.id}.mp4")
+        exporter = get_clip_exporter(getattr(settings, 'OBJECT_DETECTION_CLIP_WORKERS', 2))
+        exporter.request(self.clip_buffer, event_time, self.clip_pre_seconds, self.clip_post_seconds,
+                         path, callback=functools.partial(self._attach_clip, event.id))
+    
+    @staticmethod
+    def _attach_clip(event_id, path, file_size, mime_type):
+        """Record an exported clip as evidence of its event, and of its challan once issued"""
+        from challan_app.models import ViolationEvent, ViolationEvidence
+        from challan_app.utils.challan_ingestion import link_evidence
+        
+        ViolationEvent.objects.filter(id=event_id).update(
+            evidence_path=path, evidence_size=file_size, evidence_mime_type=mime_type)
+        if not ViolationEvidence.objects.filter(violation_event_id=event_id, file_path=path).exists():
+            ViolationEvidence.objects.create(violation_event_id=event_id, evidence_type='VIDEO', file_path=path,
+                                             file_size=file_size, mime_type=mime_type)
+        # The event may have been challaned while the clip was exported
+        link_evidence([event_id])
+    
+    def _create_line_counter(self, frame_shape):
+        """Counter for the source's active counting lines, or None if it has none"""
+        from object_detection.models import CountingLine
+        
+        lines = [(line.id, line.roi_id, (line.start_x, line.start_y, line.end_x, line.end_y))
+                 for line in CountingLine.objects.filter(video_source=self.video_source, is_active=True)]
+        if not lines:
+            return None
+        return LineCrossingCounter(lines, frame_shape, bucket_seconds=self.flow_bucket_seconds)
+    
+    def _flush_flow_counts(self):
+        """Add the crossings counted since the last flush to the flow table"""
+        self.last_flow_flush = time.time()
+        if self.line_counter is None:
+            return
+        try:
+            flush_flow_counts(self.line_counter.drain())
+        except Exception as e:
+            print(f"Error saving vehicle flow counts: {str(e)}")
+    
+    def _assign_rois(self, packet, detection_result):
+        """ROI of each detection, looked up in the source's cached ROI mask"""
+        mask = roi_mask_cache.get(self.video_source.id, packet.frame_shape)
+        if mask is None:
+            return None
+        return mask.assign(detection_result['boxes'])
+    
+    def _detect_objects(self, frame):
+        """Detect objects in a single frame"""
+        return self._detect_objects_batch([frame])[0]
+    
+    def _detect_objects_batch(self, frames):
+        """Detect objects in a list of frames, returning one result per frame"""
+        try:
+            outputs = self._run_model([prepare_input(frame, self.input_size) for frame in frames])
+            return [self._filter_detections(boxes, scores, classes)
+                    for (boxes, scores, classes, num) in outputs]
             
         except Exception as e:
             print(f"Error in object detection: {str(e)}")
+            return [None] * len(frames)
+    
+    def _detect_packets(self, packets):
+        """Detect objects in frame packets, merging ROI crops back per frame"""
+        try:
+            if self.scheduler is not None:
+                # Each frame waits for its fair turn on the shared worker pool
+                futures = [self.scheduler.submit(self.video_source.id, packet.images, packet.captured_at)
+                           for packet in packets]
+                outputs = [output for future in futures for output in future.result()]
+            else:
+                # Every frame's inputs (whole frame or ROI crops) share one batch
+                outputs = self._run_model([image for packet in packets for image in packet.images])
+        except Exception as e:
+            print(f"Error in object detection: {str(e)}")
+            return [None] * len(packets)
+        
+        detection_results = []
+        index = 0
+        for packet in packets:
+            frame_outputs = outputs[index:index + len(packet.images)]
+            index += len(packet.images)
+            
+            if packet.regions is None:
+                boxes, scores, classes, num = frame_outputs[0]
+            else:
+                # Map crop-normalized boxes into full-frame normalized boxes
+                boxes = np.concatenate([
+                    map_boxes_to_frame(output[0][0], region, packet.frame.shape)
+                    for output, region in zip(frame_outputs, packet.regions)
+                ])[np.newaxis]
+                scores = np.concatenate([output[1][0] for output in frame_outputs])[np.newaxis]
+                classes = np.concatenate([output[2][0] for output in frame_outputs])[np.newaxis]
+            
+            detection_results.append(self._filter_detections(boxes, scores, classes))
+        
+        return detection_results
+    
+    def _run_model(self, images):
+        """Run images through the shared model, returning raw outputs per image"""
+        if self.batch_size > 1:
+            # Stack images with those of other sessions on the same model
+            batch_queue = self.model.get_batch_queue(self.batch_size, self.batch_max_wait)
+            futures = [batch_queue.submit(image) for image in images]
+            return [future.result() for future in futures]
+        
+        # Stack equally sized images (e.g. ROI crops) into one call
+        return run_stacked(self.model.run, images)
+    
+    def _filter_detections(self, boxes, scores, classes):
+        """Threshold, class-filter and NMS a single frame's raw model output"""
+        if self.postprocessor is None:
+            self.postprocessor = self._create_postprocessor()
+        
+        return self.postprocessor(boxes[0], scores[0], classes[0])
+    
+    def _load_configuration(self, model_name=None):
+        """Active ModelConfiguration for a model (or the newest active one), if one is stored"""
+        from object_detection.models import ModelConfiguration
+        
+        try:
+            configurations = ModelConfiguration.objects.filter(is_active=True).order_by('-updated_at')
+            if model_name:
+                return configurations.filter(model_name=model_name).first() or configurations.first()
+            return configurations.first()
+        except Exception as e:
+            print(f"Error loading model configuration: {str(e)}")
             return None
     
+    def _create_postprocessor(self):
+        """Post-processor using the active ModelConfiguration's thresholds"""
+        return PostProcessor.from_configuration(self._load_configuration(self.model_name), class_ids=self.class_ids)
+    
     def stop_detection(self):
         """Stop the detection process"""
         self.is_processing = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
     
     def get_detection_statistics(self):
         """Get current detection statistics"""
         return {
             'is_processing': self.is_processing,
-            'model_loaded': self.detection_graph is not None,
-            'model_name': self.model_name
+            'model_loaded': self.model is not None,
+            'frames_processed': self.frames_processed,
+            'total_detections': self.total_detections,
+            'model_name': self.model_name,
+            'backend': self.backend,
+            'quantization': self.quantization,
+            'model': self.model.get_statistics() if self.model else None,
+            'pipeline': self.pipeline.get_statistics() if self.pipeline else [],
+            'sampling': self.sampler.get_statistics() if self.sampler else None,
+            'capture': self.grabber.get_statistics() if self.grabber else None,
+            'capture_hub': self.capture_hub.get_statistics() if self.capture_hub else None,
+            'result_writer': self.result_writer.get_statistics() if self.result_writer else None,
+            'flow': self.line_counter.get_statistics() if self.line_counter else None,
+            'plates': self.plate_recognizer.get_statistics() if self.plate_recognizer else None,
+            'clip_buffer': self.clip_buffer.get_statistics() if self.clip_buffer else None,
+            'clip_frames_dropped': self.clip_feeder.frames_dropped if self.clip_feeder else 0,
+            'clip_export': get_clip_exporter().get_statistics() if self.evidence_clips else None,
+            'evidence_snapshots': self._get_evidence_writer().get_statistics() if self.evidence_snapshots else None,
+            'tracking': dict(self.tracker.get_statistics(), detect_interval=self.detect_interval,
+                             frames_tracked_only=self.frames_tracked_only) if self.tracker else None,
+            'motion_gate': self.motion_gate.get_statistics() if self.motion_gate else None,
+            'roi_pixel_fraction': self.roi_pixel_fraction,
+            'input_buffers': self.input_pool.get_statistics() if self.input_pool else None,
+            'scheduler': self.scheduler.get_statistics() if self.scheduler else None,
         }
     
     def process_single_image(self, image_path):
         """Process a single image for object detection"""
-        if not self.detection_graph:
+        if self.model is None and not self._load_model(in_process=True):
             raise Exception("Model not loaded")
         
         # Load image
@@ -225,54 +914,48 @@ class ObjectDetector:
             raise Exception(f"Could not load image: {image_path}")
         
         # Process image
-        with self.detection_graph.as_default():
-            with tf.Session(graph=self.detection_graph) as sess:
-                image_tensor = self.detection_graph.get_tensor_by_name('image_tensor:0')
-                detection_boxes = self.detection_graph.get_tensor_by_name('detection_boxes:0')
-                detection_scores = self.detection_graph.get_tensor_by_name('detection_scores:0')
-                detection_classes = self.detection_graph.get_tensor_by_name('detection_classes:0')
-                num_detections = self.detection_graph.get_tensor_by_name('num_detections:0')
-                
-                detection_result = self._detect_objects(
-                    image, sess, image_tensor, detection_boxes,
-                    detection_scores, detection_classes, num_detections
-                )
+        detection_result = self._detect_objects(image)
         
         return detection_result
     
-    def draw_detections(self, frame, detection_result):
-        """Draw detection boxes on a frame"""
-        if not detection_result:
-            return frame
-        
-        frame_with_boxes = frame.copy()
-        
-        for i, (box, score, class_id) in enumerate(zip(
-            detection_result['boxes'],
-            detection_result['scores'],
-            detection_result['objects']
-        )):
-            # Convert normalized coordinates to pixel coordinates
-            h, w, _ = frame.shape
-            ymin, xmin, ymax, xmax = box
-            
-            x1 = int(xmin * w)
-            y1 = int(ymin * h)
-            x2 = int(xmax * w)
-            y2 = int(ymax * h)
-            
-            # Draw bounding box
-            cv2.rectangle(frame_with_boxes, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            
-            # Draw label
-            class_name = self.category_index.get(int(class_id), {}).get('name', f'Class_{class_id}')
-            label = f"{class_name}: {score:.2f}"
-            
-            # Calculate text position
-            text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-            cv2.rectangle(frame_with_boxes, (x1, y1 - text_size[1] - 10), 
-                         (x1 + text_size[0], y1), (0, 255, 0), -1)
-            cv2.putText(frame_with_boxes, label, (x1, y1 - 5), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
-        
-        return frame_with_boxes
+    def draw_detections(self, frame, detection_result, copy=True):
+        """Draw detection boxes on a frame
+
+        With ``copy=False`` the boxes are drawn on ``frame`` itself, which
+        must then be writable.
+        """
+        return draw_detections(frame, detection_result, self.category_index, copy=copy)
+    
+    def current_detection(self, max_age=None):
+        """Newest detection result, or None if there is none younger than ``max_age`` seconds"""
+        latest = self.latest_detection
+        if latest is None:
+            return None
+        detection_result, captured_at = latest
+        if max_age is not None and time.time() - captured_at > max_age:
+            return None
+        return detection_result
+
+
+class ActiveDetectorRegistry:
+    """The ObjectDetector currently processing each video source"""
+    
+    def __init__(self):
+        self._detectors = {}
+        self._lock = threading.Lock()
+    
+    def register(self, source_id, detector):
+        with self._lock:
+            self._detectors[str(source_id)] = detector
+    
+    def unregister(self, source_id, detector):
+        with self._lock:
+            if self._detectors.get(str(source_id)) is detector:
+                del self._detectors[str(source_id)]
+    
+    def get(self, source_id):
+        with self._lock:
+            return self._detectors.get(str(source_id))
+
+
+active_detectors = ActiveDetectorRegistry()
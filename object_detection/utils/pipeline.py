@@ -0,0 +1,211 @@
+import queue
+import threading
+import time
+
+# Sentinel passed down the pipeline when a stage has no more items
+_STOP = object()
+
+
+class FramePacket:
+    """A captured frame and everything the stages attach to it"""
+
+    def __init__(self, frame_number, frame, captured_at=None, media_time=None):
+        self.frame_number = frame_number
+        self.frame = frame
+        self.frame_shape = frame.shape
+        self.captured_at = captured_at if captured_at is not None else time.time()
+        # Position in the source: the file's timestamp, or capture time for live sources
+        self.media_time = media_time if media_time is not None else self.captured_at
+        self.images = None  # Model inputs: the whole frame or one crop per region
+        self.regions = None  # (x, y, width, height) of each crop, None for the whole frame
+        self.input_pool = None  # Pool the images' buffers are returned to after inference
+        self.skip_inference = False
+        self.track_only = False  # Tracker propagates detections; the model is not run
+        self.detection_result = None
+        self.plate_reads = None  # {track id: (plate, confidence, vehicle id)} of the frame's read tracks
+        self.new_plate_reads = None  # Track ids whose plate was first read on this frame
+        self.processing_time = 0.0
+
+
+class PipelineStage:
+    """A worker thread joined to its neighbours by bounded queues
+
+    ``func`` receives one item, or a list of up to ``batch_size`` items when
+    batching, and returns the item(s) to pass on; None drops the item.
+    ``on_idle()``, if given, is called on the stage's thread every tenth of
+    a second no item arrives.
+    """
+
+    def __init__(self, pipeline, name, func, input_queue, output_queue,
+                 batch_size=1, max_wait=0.0, on_idle=None):
+        self.pipeline = pipeline
+        self.name = name
+        self.func = func
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max_wait
+        self.on_idle = on_idle
+
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_time = 0.0
+        self.started_at = None
+        self.thread = threading.Thread(target=self._run, name=f'pipeline-{name}', daemon=True)
+
+    def start(self):
+        self.started_at = time.time()
+        self.thread.start()
+
+    def _next_items(self):
+        """Block for the next item, then top the batch up until max_wait"""
+        while True:
+            try:
+                item = self.input_queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                # A failed stage may never send _STOP, so don't wait forever
+                if self.pipeline.error is not None:
+                    return None, True
+                if self.on_idle is not None:
+                    self.on_idle()
+        if item is _STOP:
+            return None, True
+
+        items = [item]
+        deadline = time.time() + self.max_wait
+        while len(items) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                item = self.input_queue.get(timeout=remaining) if remaining > 0 else self.input_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _emit(self, outputs):
+        if self.output_queue is None:
+            return
+        for output in outputs:
+            if output is not None and self.pipeline.put(self.output_queue, output):
+                self.items_out += 1
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                items, stopping = self._next_items()
+                if not items:
+                    break
+
+                self.items_in += len(items)
+                start_time = time.time()
+                if self.batch_size > 1:
+                    outputs = self.func(items) or []
+                else:
+                    outputs = [self.func(items[0])]
+                self.busy_time += time.time() - start_time
+
+                self._emit(outputs)
+        except Exception as e:
+            self.pipeline.fail(self.name, e)
+        finally:
+            if self.output_queue is not None:
+                self.pipeline.put(self.output_queue, _STOP)
+
+    def get_statistics(self):
+        elapsed = max(time.time() - self.started_at, 1e-9) if self.started_at else 0.0
+        return {
+            'name': self.name,
+            'queue_depth': self.input_queue.qsize() if self.input_queue is not None else 0,
+            'queue_size': self.input_queue.maxsize if self.input_queue is not None else 0,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'throughput': self.items_in / elapsed if elapsed else 0.0,
+            'utilization': self.busy_time / elapsed if elapsed else 0.0,
+        }
+
+
+class SourceStage(PipelineStage):
+    """First stage: drains a generator of items into the pipeline"""
+
+    def __init__(self, pipeline, name, generate, output_queue):
+        super().__init__(pipeline, name, None, None, output_queue)
+        self.generate = generate
+
+    def _run(self):
+        try:
+            for item in self.generate():
+                if self.pipeline.stopped:
+                    break
+                self.items_in += 1
+                self._emit([item])
+        except Exception as e:
+            self.pipeline.fail(self.name, e)
+        finally:
+            self.pipeline.put(self.output_queue, _STOP)
+
+
+class DetectionPipeline:
+    """Capture, preprocessing, inference and writer stages on their own threads
+
+    Stages are joined by bounded queues, so a slow stage applies backpressure
+    to the ones before it instead of letting frames pile up in memory.
+    """
+
+    def __init__(self, queue_size=8):
+        self.queue_size = max(1, int(queue_size))
+        self.stages = []
+        self.error = None
+        self._stop_event = threading.Event()
+        self._output_queue = None
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def add_source(self, name, generate, queue_size=None):
+        """Add the capture stage; ``generate`` yields FramePackets"""
+        self._output_queue = queue.Queue(maxsize=queue_size or self.queue_size)
+        self.stages.append(SourceStage(self, name, generate, self._output_queue))
+
+    def add_stage(self, name, func, batch_size=1, max_wait=0.0, last=False, queue_size=None, on_idle=None):
+        """Append a processing stage reading from the previous stage's queue"""
+        input_queue = self._output_queue
+        self._output_queue = None if last else queue.Queue(maxsize=queue_size or self.queue_size)
+        self.stages.append(PipelineStage(
+            self, name, func, input_queue, self._output_queue, batch_size, max_wait, on_idle
+        ))
+
+    def put(self, target_queue, item):
+        """Blocking put that gives up if the pipeline has failed"""
+        while True:
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self.error is not None:
+                    return False
+
+    def fail(self, stage_name, error):
+        if self.error is None:
+            self.error = Exception(f"{stage_name} stage failed: {error}")
+        self.stop()
+
+    def stop(self):
+        """Stop capturing; frames already in flight are drained"""
+        self._stop_event.set()
+
+    def run(self):
+        """Run every stage to completion, re-raising the first stage error"""
+        for stage in self.stages:
+            stage.start()
+        for stage in self.stages:
+            stage.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def get_statistics(self):
+        return [stage.get_statistics() for stage in self.stages]
@@ -0,0 +1,152 @@
+import itertools
+import threading
+
+import numpy as np
+from django.utils.module_loading import import_string
+
+from challan_app.utils.vehicle_lookup import normalize_registration, vehicle_lookup_cache
+
+
+class PlateReading:
+    """Text read off a number plate, with the engine's confidence in it"""
+
+    def __init__(self, text, confidence, box=None):
+        self.text = normalize_registration(text)
+        self.confidence = confidence
+        self.box = box  # Plate (x, y, width, height) within the vehicle crop, if known
+
+
+class PlateRecognitionEngine:
+    """Finds and reads the number plate in a crop of one vehicle
+
+    ``read`` takes the BGR crop and returns a PlateReading, or None if no
+    plate could be read.
+    """
+
+    name = None
+
+    def read(self, vehicle_image):
+        raise NotImplementedError
+
+
+class StubPlateEngine(PlateRecognitionEngine):
+    """Returns the given plates in turn, for tests and pipeline dry runs"""
+
+    name = 'STUB'
+
+    def __init__(self, plates=None, confidence=0.99):
+        self._plates = itertools.cycle(plates) if plates else None
+        self.confidence = confidence
+        self._lock = threading.Lock()
+
+    def read(self, vehicle_image):
+        if self._plates is None:
+            return None
+        with self._lock:
+            text = next(self._plates)
+        return PlateReading(text, self.confidence)
+
+
+PLATE_ENGINES = {
+    StubPlateEngine.name: StubPlateEngine,
+}
+
+
+def get_plate_engine(name, **kwargs):
+    """Engine registered under ``name``, or imported from a dotted path"""
+    engine_class = PLATE_ENGINES.get(name)
+    if engine_class is None:
+        try:
+            engine_class = import_string(name)
+        except ImportError:
+            raise Exception(f"Unknown plate recognition engine: {name}")
+    return engine_class(**kwargs)
+
+
+class PlateRecognizer:
+    """Reads each tracked vehicle's plate once and resolves it to a Vehicle
+
+    A track is tried on up to ``max_attempts`` frames until a reading clears
+    ``min_confidence``; after that every later frame of the track reuses the
+    result, so the engine runs once per vehicle rather than once per frame.
+    """
+
+    def __init__(self, engine, min_confidence=0.6, max_attempts=3, lookup=vehicle_lookup_cache):
+        self.engine = engine
+        self.min_confidence = min_confidence
+        self.max_attempts = max_attempts
+        self.lookup = lookup
+
+        self._plates = {}  # track id -> (plate text, confidence, vehicle id)
+        self._attempts = {}
+        self.engine_calls = 0
+        self.plates_read = 0
+        self.vehicles_matched = 0
+
+    def _crop(self, frame, box):
+        frame_height, frame_width = frame.shape[:2]
+        ymin, xmin, ymax, xmax = np.clip(box, 0.0, 1.0)
+        top, bottom = int(ymin * frame_height), int(np.ceil(ymax * frame_height))
+        left, right = int(xmin * frame_width), int(np.ceil(xmax * frame_width))
+        if bottom <= top or right <= left:
+            return None
+        return frame[top:bottom, left:right]
+
+    def process(self, frame, detection_result):
+        """Plate reads for one frame's tracks
+
+        Returns ``(reads, new_track_ids)``: {track id: (plate text,
+        confidence, vehicle id)} for every track in the frame whose plate has
+        been read, and the ids of the tracks first read on this frame.
+        """
+        if not detection_result or not detection_result.get('track_ids'):
+            return {}, []
+
+        reads = {}
+        new_track_ids = []
+        for track_id, box in zip(detection_result['track_ids'], detection_result['boxes']):
+            if track_id in self._plates:
+                reads[track_id] = self._plates[track_id]
+                continue
+            if self._attempts.get(track_id, 0) >= self.max_attempts:
+                continue
+
+            crop = self._crop(frame, box)
+            if crop is None:
+                continue
+            self._attempts[track_id] = self._attempts.get(track_id, 0) + 1
+            self.engine_calls += 1
+            try:
+                reading = self.engine.read(crop)
+            except Exception as e:
+                print(f"Error in plate recognition: {str(e)}")
+                continue
+
+            if reading is None or not reading.text or reading.confidence < self.min_confidence:
+                continue
+
+            vehicle_id = self.lookup.get_vehicle_id(reading.text)
+            self._plates[track_id] = (reading.text, reading.confidence, vehicle_id)
+            self._attempts.pop(track_id, None)
+            self.plates_read += 1
+            if vehicle_id is not None:
+                self.vehicles_matched += 1
+            reads[track_id] = self._plates[track_id]
+            new_track_ids.append(track_id)
+
+        return reads, new_track_ids
+
+    def forget(self, active_track_ids):
+        """Drop state of tracks the tracker no longer holds"""
+        active = set(active_track_ids)
+        self._plates = {k: v for k, v in self._plates.items() if k in active}
+        self._attempts = {k: v for k, v in self._attempts.items() if k in active}
+
+    def get_statistics(self):
+        return {
+            'engine': self.engine.name or type(self.engine).__name__,
+            'engine_calls': self.engine_calls,
+            'plates_read': self.plates_read,
+            'vehicles_matched': self.vehicles_matched,
+            'vehicle_lookup': self.lookup.get_statistics(),
+        }
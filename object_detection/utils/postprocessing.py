@@ -0,0 +1,118 @@
+import numpy as np
+
+# COCO label map ids of the classes we enforce on
+VEHICLE_CLASS_IDS = (
+    2,  # bicycle
+    3,  # car
+    4,  # motorcycle
+    6,  # bus
+    8,  # truck
+)
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU of every (M, 4) box against every (N, 4) box, as (ymin, xmin, ymax, xmax)"""
+    ymin_a, xmin_a, ymax_a, xmax_a = boxes_a.T
+    ymin_b, xmin_b, ymax_b, xmax_b = boxes_b.T
+    areas_a = np.clip(ymax_a - ymin_a, 0, None) * np.clip(xmax_a - xmin_a, 0, None)
+    areas_b = np.clip(ymax_b - ymin_b, 0, None) * np.clip(xmax_b - xmin_b, 0, None)
+
+    inter_h = np.clip(np.minimum(ymax_a[:, None], ymax_b[None, :]) - np.maximum(ymin_a[:, None], ymin_b[None, :]), 0, None)
+    inter_w = np.clip(np.minimum(xmax_a[:, None], xmax_b[None, :]) - np.maximum(xmin_a[:, None], xmin_b[None, :]), 0, None)
+    intersection = inter_h * inter_w
+
+    union = areas_a[:, None] + areas_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def class_aware_nms(boxes, scores, classes, iou_threshold, max_output=None):
+    """Greedy per-class NMS
+
+    Returns indices of kept boxes in descending score order, at most
+    ``max_output`` of them. Boxes are grouped by class, so overlaps are only
+    computed within a class, one small matrix per class instead of N x N.
+    The greedy pass then costs one vectorized row update per kept box.
+    """
+    if len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    order = np.argsort(-scores, kind='stable')
+    # Score order within each class; stable, so equal scores keep their order
+    by_class = np.argsort(classes[order], kind='stable')
+    ranked = order[by_class]
+    ymin, xmin, ymax, xmax = boxes[ranked].astype(np.float64).T
+    areas = np.maximum(ymax - ymin, 0) * np.maximum(xmax - xmin, 0)
+    ranked_classes = classes[ranked]
+    bounds = (np.flatnonzero(ranked_classes[1:] != ranked_classes[:-1]) + 1).tolist()
+
+    keep = []
+    for start, end in zip([0] + bounds, bounds + [len(ranked)]):
+        group = slice(start, end)
+        inter_h = np.maximum(np.minimum(ymax[group, None], ymax[group]) - np.maximum(ymin[group, None], ymin[group]), 0)
+        inter_w = np.maximum(np.minimum(xmax[group, None], xmax[group]) - np.maximum(xmin[group, None], xmin[group]), 0)
+        intersection = inter_h * inter_w
+        # IoU > threshold without dividing, so empty boxes never match
+        overlaps = intersection > iou_threshold * (areas[group, None] + areas[group] - intersection)
+
+        suppressed = np.zeros(end - start, dtype=bool)
+        for i in range(end - start):
+            if suppressed[i]:
+                continue
+            keep.append(by_class[start + i])
+            suppressed |= overlaps[i]
+
+    # Positions in ``order`` are score ranks, so sorting them restores score order
+    keep.sort()
+    return order[keep[:max_output]]
+
+
+class PostProcessor:
+    """Thresholding, class filtering, NMS and top-k for one frame's raw output"""
+
+    def __init__(self, confidence_threshold=0.5, nms_threshold=0.4, max_detections=100,
+                 class_ids=VEHICLE_CLASS_IDS, pre_nms_top_k=1000):
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.max_detections = max_detections
+        self.class_ids = np.asarray(class_ids, dtype=np.float32) if class_ids else None
+        self.pre_nms_top_k = pre_nms_top_k
+
+    @classmethod
+    def from_configuration(cls, configuration, **kwargs):
+        """Build a post-processor from a ModelConfiguration (or defaults)"""
+        if configuration is None:
+            return cls(**kwargs)
+        return cls(
+            confidence_threshold=configuration.confidence_threshold,
+            nms_threshold=configuration.nms_threshold,
+            max_detections=configuration.max_detections,
+            **kwargs
+        )
+
+    def __call__(self, boxes, scores, classes):
+        """Filter (N, 4) boxes, (N,) scores and (N,) classes into a detection result"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        classes = np.asarray(classes, dtype=np.float32).reshape(-1)
+
+        valid = scores > self.confidence_threshold
+        if self.class_ids is not None:
+            valid &= np.isin(classes, self.class_ids)
+        if not valid.any():
+            return None
+
+        boxes, scores, classes = boxes[valid], scores[valid], classes[valid]
+
+        # Bound the N x N overlap matrix on frames with huge candidate counts
+        if len(scores) > self.pre_nms_top_k:
+            top = np.argpartition(-scores, self.pre_nms_top_k)[:self.pre_nms_top_k]
+            boxes, scores, classes = boxes[top], scores[top], classes[top]
+
+        keep = class_aware_nms(boxes, scores, classes, self.nms_threshold, self.max_detections)
+
+        # Convert to list format for JSON serialization
+        return {
+            'objects': classes[keep].tolist(),
+            'scores': scores[keep].tolist(),
+            'boxes': boxes[keep].tolist()
+        }
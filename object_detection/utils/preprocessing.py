@@ -0,0 +1,84 @@
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+
+def prepare_input(frame, input_size, out=None, region=None):
+    """Resize a BGR frame (or one region of it) to the model input and convert it to RGB
+
+    Resizing happens first so the colour conversion only touches
+    ``input_size`` x ``input_size`` pixels, and both steps write into ``out``
+    when a buffer is given. Bilinear matches the resize the detection graph
+    would otherwise do itself, at a fraction of ``INTER_AREA``'s cost. The
+    model outputs normalized boxes, so stretching to a square input doesn't
+    change where its boxes map back to.
+    """
+    if region is not None:
+        x, y, width, height = region
+        frame = frame[y:y + height, x:x + width]
+
+    if input_size:
+        resized = cv2.resize(frame, (input_size, input_size), dst=out, interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=resized)
+
+    # No fixed input size: feed the full frame, converted in a single copy
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=out)
+
+
+class InputBufferPool:
+    """Preallocated model input buffers reused from frame to frame
+
+    The preprocessing stage takes a buffer per model input and the inference
+    stage hands it back once the model has consumed it. If every buffer is
+    still in flight a new one is allocated rather than blocking the pipeline.
+    """
+
+    def __init__(self, input_size, count=16):
+        self.input_size = input_size
+        self.shape = (input_size, input_size, 3)
+        self._free = queue.Queue()
+        for _ in range(count):
+            self._free.put(np.empty(self.shape, dtype=np.uint8))
+
+        self._lock = threading.Lock()
+        self.allocated = count
+        self.acquired = 0
+        self.frame_bytes = 0
+        self.input_bytes = 0
+
+    def acquire(self):
+        with self._lock:
+            self.acquired += 1
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.allocated += 1
+            return np.empty(self.shape, dtype=np.uint8)
+
+    def release(self, buffers):
+        for buffer in buffers:
+            self._free.put(buffer)
+
+    def prepare(self, frame, regions=None):
+        """Model inputs for a frame (one per region, if given) written into pooled buffers"""
+        inputs = [prepare_input(frame, self.input_size, out=self.acquire(), region=region)
+                  for region in (regions or [None])]
+
+        with self._lock:
+            self.frame_bytes += frame.nbytes
+            self.input_bytes += sum(image.nbytes for image in inputs)
+        return inputs
+
+    def get_statistics(self):
+        with self._lock:
+            return {
+                'input_size': self.input_size,
+                'buffers_allocated': self.allocated,
+                'buffers_free': self._free.qsize(),
+                'inputs_prepared': self.acquired,
+                # Bytes handed to the model per byte captured
+                'input_to_frame_ratio': self.input_bytes / self.frame_bytes if self.frame_bytes else None,
+            }
@@ -0,0 +1,470 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Exit code of a worker whose session ran to its end, stopped or not
+_EXIT_OK = 0
+
+
+class SharedFrameRing:
+    """Slots of shared memory a parent copies one live source's frames into
+
+    Every slot starts with the sequence number of the frame in it. The
+    writer sets it to -1 while copying a frame in and to the frame's
+    number once done; a reader checks it before and after copying a frame
+    out, so a slot overwritten meanwhile is noticed and never read torn.
+    """
+
+    HEADER_BYTES = 64
+
+    def __init__(self, slots, frame_bytes, name=None):
+        self.slots = slots
+        self.frame_bytes = frame_bytes
+        # Keep each slot's header 8-byte aligned
+        self.slot_bytes = self.HEADER_BYTES + -(-frame_bytes // 64) * 64
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * self.slot_bytes)
+        self._sequences = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf, strides=(self.slot_bytes,))
+        if self.owner:
+            self._sequences[:] = -1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _view(self, sequence, shape, dtype):
+        offset = (sequence % self.slots) * self.slot_bytes + self.HEADER_BYTES
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+
+    def write(self, sequence, frame):
+        """Copy frame number ``sequence`` into its slot"""
+        slot = sequence % self.slots
+        self._sequences[slot] = -1
+        self._view(sequence, frame.shape, frame.dtype)[...] = frame
+        self._sequences[slot] = sequence
+
+    def read(self, sequence, shape, dtype):
+        """A copy of frame number ``sequence``, or None if its slot has been reused"""
+        slot = sequence % self.slots
+        if self._sequences[slot] != sequence:
+            return None
+        frame = self._view(sequence, shape, dtype).copy()
+        if self._sequences[slot] != sequence:
+            return None
+        return frame
+
+    def close(self):
+        # Views onto the buffer must go before the mapping can be closed
+        self._sequences = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _receive_frames(frame_queue, grabber):
+    """Worker thread: hand frames the parent put in shared memory to the session's grabber"""
+    ring = None
+    try:
+        while True:
+            message = frame_queue.get()
+            if message[0] == 'end':
+                break
+            if message[0] == 'ring':
+                if ring is not None:
+                    ring.close()
+                _, name, slots, frame_bytes = message
+                try:
+                    ring = SharedFrameRing(slots, frame_bytes, name=name)
+                except FileNotFoundError:
+                    # Already replaced by a ring announced after this one
+                    ring = None
+                continue
+
+            _, sequence, shape, dtype, captured_at = message
+            frame = ring.read(sequence, shape, dtype) if ring is not None else None
+            if frame is None:
+                grabber.frames_dropped += 1
+                continue
+            frame.flags.writeable = False
+            grabber.put(frame, captured_at)
+    finally:
+        grabber.end()
+        if ring is not None:
+            ring.close()
+
+
+def _report(detector, event_queue, done, interval, statistics_every=5):
+    """Worker thread: send the parent the newest detections, and statistics less often"""
+    sent = None
+    for tick in itertools.count(1):
+        if done.wait(interval):
+            return
+        latest = detector.latest_detection
+        if latest is not None and latest is not sent:
+            event_queue.put(('detection', latest))
+            sent = latest
+        if tick % statistics_every == 0:
+            event_queue.put(('statistics', detector.get_detection_statistics()))
+
+
+def _session_main(session_id, source_id, frame_queue, event_queue, stop_event, source_fps, report_interval):
+    """Entry point of a worker process running one detection session end to end"""
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from object_detection.models import DetectionSession, VideoSource
+    from .evidence_writer import close_evidence_writer
+    from .frame_grabber import LatestFrameGrabber
+    from .object_detector import ObjectDetector
+
+    # This process is the worker; its detector runs the session itself
+    settings.OBJECT_DETECTION_PROCESS_WORKERS = 0
+    session = DetectionSession.objects.get(pk=session_id)
+    video_source = VideoSource.objects.get(pk=source_id)
+    detector = ObjectDetector()
+    if detector.model is None:
+        DetectionSession.objects.filter(pk=session_id, status='ACTIVE').update(
+            status='ERROR', processing_notes="Model not loaded")
+        return
+
+    detector.model.acquire()
+    grabber = None
+    if frame_queue is not None:
+        grabber = LatestFrameGrabber()
+        threading.Thread(target=_receive_frames, args=(frame_queue, grabber), daemon=True).start()
+
+    def stop_when_asked():
+        stop_event.wait()
+        detector.stop_detection()
+
+    done = threading.Event()
+    threading.Thread(target=stop_when_asked, daemon=True).start()
+    threading.Thread(target=_report, args=(detector, event_queue, done, report_interval), daemon=True).start()
+    try:
+        detector._process_video(session, video_source, grabber=grabber, source_fps=source_fps)
+    finally:
+        # Snapshots still queued would die with the process's daemon threads
+        close_evidence_writer()
+        done.set()
+        event_queue.put(('statistics', detector.get_detection_statistics()))
+        event_queue.close()
+        event_queue.join_thread()
+
+
+class _FrameForwarder:
+    """Copies a live source's frames from its capture hub into a worker's shared frame ring
+
+    Runs on its own thread, reading the newest frame like any other hub
+    subscriber, so a stalled worker never holds up the hub. Frames the
+    worker hasn't taken while ``slots - 2`` are waiting are dropped.
+    """
+
+    def __init__(self, video_source, slots=8):
+        from .capture_hub import capture_hubs
+
+        self.subscriber, self.hub = capture_hubs.subscribe(video_source)
+        self.fps = self.hub.fps
+        self.slots = slots
+        self._frame_queue = None
+        self._announced = False
+        self._ring = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._running = True
+        self.frames_forwarded = 0
+        self.frames_dropped = 0
+        self._thread = threading.Thread(target=self._run, name=f'frame-forwarder-{video_source.id}', daemon=True)
+
+    def attach(self, frame_queue):
+        """Forward to a newly started worker from now on"""
+        with self._lock:
+            self._frame_queue = frame_queue
+            self._announced = False
+        if self._thread.ident is None:
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while self._running:
+                latest = self.subscriber.read(timeout=1.0)
+                if latest is None:
+                    if self.subscriber.ended:
+                        break
+                    continue
+                self._forward(*latest)
+        finally:
+            with self._lock:
+                if self._frame_queue is not None:
+                    try:
+                        self._frame_queue.put(('end',), timeout=1.0)
+                    except queue.Full:
+                        pass
+
+    def _forward(self, _, frame, captured_at):
+        with self._lock:
+            if self._ring is None or frame.nbytes > self._ring.frame_bytes:
+                # First frame, or the source's resolution grew
+                if self._ring is not None:
+                    self._ring.close()
+                self._ring = SharedFrameRing(self.slots, frame.nbytes)
+                self._announced = False
+            if not self._announced:
+                try:
+                    # Bounded, so a worker that has died can't block the forwarder
+                    self._frame_queue.put(('ring', self._ring.name, self.slots, self._ring.frame_bytes), timeout=1.0)
+                except queue.Full:
+                    self.frames_dropped += 1
+                    return
+                self._announced = True
+
+            self._sequence += 1
+            self._ring.write(self._sequence, frame)
+            try:
+                self._frame_queue.put_nowait(('frame', self._sequence, frame.shape, frame.dtype.str, captured_at))
+                self.frames_forwarded += 1
+            except queue.Full:
+                self.frames_dropped += 1
+
+    def stop(self):
+        self._running = False
+        self.subscriber.stop()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+        with self._lock:
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+
+
+class SessionProcessProxy:
+    """Parent-side stand-in for a detector running its session in a worker process
+
+    Registered as the source's active detector, so stream overlays draw the
+    worker's newest detections and statistics views see its counters.
+    """
+
+    def __init__(self, supervisor, session, video_source, category_index):
+        self.supervisor = supervisor
+        self.session = session
+        self.video_source = video_source
+        self.category_index = category_index
+        self.latest_detection = None
+        self.statistics = {}
+        self.process = None
+        self.restarts = 0
+        self.forwarder = None
+        self.events = None
+        self.stop_event = None
+        self.finished = False
+
+    @property
+    def is_processing(self):
+        return not self.finished
+
+    def current_detection(self, max_age=None):
+        """Newest detection result, or None if there is none younger than ``max_age`` seconds"""
+        latest = self.latest_detection
+        if latest is None:
+            return None
+        detection_result, captured_at = latest
+        if max_age is not None and time.time() - captured_at > max_age:
+            return None
+        return detection_result
+
+    def draw_detections(self, frame, detection_result, copy=True):
+        from .object_detector import draw_detections
+
+        return draw_detections(frame, detection_result, self.category_index, copy=copy)
+
+    def stop_detection(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def get_detection_statistics(self):
+        return dict(self.statistics, worker={
+            'pid': self.process.pid if self.process else None,
+            'alive': self.process.is_alive() if self.process else False,
+            'restarts': self.restarts,
+            'frames_forwarded': self.forwarder.frames_forwarded if self.forwarder else None,
+            'frames_dropped': self.forwarder.frames_dropped if self.forwarder else None,
+        })
+
+
+class DetectionProcessSupervisor:
+    """Runs each detection session end to end in its own worker process
+
+    Capture, pre- and post-processing, inference, tracking, evidence and
+    database writes all run in the worker, with its own model, so sessions
+    no longer share the web process's GIL and scale with the cores free for
+    them. Files are opened by the worker itself; live sources stay decoded
+    once by the web process's capture hub, which its stream viewers share,
+    and a forwarder copies their frames into shared memory for the worker,
+    so only a few bytes of frame metadata are pickled. A worker that dies
+    fails its session, or for a live source is restarted up to
+    ``max_restarts`` times; a file would be processed again from the start.
+    """
+
+    def __init__(self, max_processes, max_restarts=3, frame_slots=8, report_interval=0.2):
+        self.max_processes = max(1, int(max_processes))
+        self.max_restarts = max_restarts
+        self.frame_slots = frame_slots
+        self.report_interval = report_interval
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.sessions_started = 0
+        self.workers_restarted = 0
+        self.workers_failed = 0
+
+    def start(self, session, video_source, category_index):
+        """Start a session's worker; returns the SessionProcessProxy standing in for it"""
+        from .capture_hub import LIVE_SOURCE_TYPES
+        from .object_detector import active_detectors
+
+        with self._lock:
+            self._sessions = {key: proxy for key, proxy in self._sessions.items() if not proxy.finished}
+            if len(self._sessions) >= self.max_processes:
+                raise Exception(f"All {self.max_processes} detection worker processes are busy")
+            proxy = SessionProcessProxy(self, session, video_source, category_index)
+            self._sessions[str(session.id)] = proxy
+            self.sessions_started += 1
+
+        try:
+            if video_source.source_type in LIVE_SOURCE_TYPES:
+                proxy.forwarder = _FrameForwarder(video_source, self.frame_slots)
+            self._launch(proxy)
+        except Exception:
+            self._finish(proxy)
+            raise
+        active_detectors.register(video_source.id, proxy)
+        threading.Thread(target=self._supervise, args=(proxy,), name=f'session-supervisor-{session.id}',
+                         daemon=True).start()
+        return proxy
+
+    def _launch(self, proxy):
+        frame_queue = None
+        if proxy.forwarder is not None:
+            frame_queue = self._context.Queue(maxsize=max(1, self.frame_slots - 2))
+        proxy.events = self._context.Queue()
+        proxy.stop_event = self._context.Event()
+        proxy.process = self._context.Process(
+            target=_session_main,
+            args=(str(proxy.session.id), str(proxy.video_source.id), frame_queue, proxy.events,
+                  proxy.stop_event, proxy.forwarder.fps if proxy.forwarder else None, self.report_interval),
+            name=f'detection-session-{proxy.session.id}',
+            daemon=True,
+        )
+        proxy.process.start()
+        if proxy.forwarder is not None:
+            proxy.forwarder.attach(frame_queue)
+
+    def _supervise(self, proxy):
+        """Relay a worker's reports, and restart or fail its session when it dies"""
+        from django.db import connection
+        from object_detection.models import DetectionSession
+
+        try:
+            while True:
+                self._drain_events(proxy, timeout=0.5)
+                if proxy.process.is_alive():
+                    continue
+                self._drain_events(proxy, timeout=0)
+                exitcode = proxy.process.exitcode
+                if exitcode == _EXIT_OK:
+                    break
+
+                active = DetectionSession.objects.filter(pk=proxy.session.pk, status='ACTIVE').exists()
+                if active and proxy.forwarder is not None and proxy.restarts < self.max_restarts:
+                    print(f"Detection worker for session {proxy.session.id} exited (code {exitcode}), restarting")
+                    proxy.restarts += 1
+                    with self._lock:
+                        self.workers_restarted += 1
+                    self._launch(proxy)
+                    continue
+
+                with self._lock:
+                    self.workers_failed += 1
+                DetectionSession.objects.filter(pk=proxy.session.pk, status='ACTIVE').update(
+                    status='ERROR', processing_notes=f"Detection worker process exited with code {exitcode}")
+                break
+        except Exception as e:
+            print(f"Error supervising detection worker: {str(e)}")
+        finally:
+            self._finish(proxy)
+            connection.close()
+
+    @staticmethod
+    def _drain_events(proxy, timeout):
+        while True:
+            try:
+                kind, payload = proxy.events.get(timeout=timeout) if timeout else proxy.events.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                return
+            if kind == 'detection':
+                proxy.latest_detection = payload
+            elif kind == 'statistics':
+                proxy.statistics = payload
+            timeout = 0
+
+    def _finish(self, proxy):
+        from .object_detector import active_detectors
+
+        proxy.finished = True
+        proxy.latest_detection = None
+        active_detectors.unregister(proxy.video_source.id, proxy)
+        if proxy.forwarder is not None:
+            proxy.forwarder.stop()
+
+    def stop_all(self):
+        """Ask every worker to stop and wait for them"""
+        with self._lock:
+            proxies = list(self._sessions.values())
+        for proxy in proxies:
+            proxy.stop_detection()
+        for proxy in proxies:
+            if proxy.process is not None:
+                proxy.process.join(timeout=10)
+
+    def get_statistics(self):
+        with self._lock:
+            proxies = list(self._sessions.values())
+            statistics = {
+                'max_processes': self.max_processes,
+                'sessions_started': self.sessions_started,
+                'workers_restarted': self.workers_restarted,
+                'workers_failed': self.workers_failed,
+            }
+        statistics['sessions'] = [{
+            'session_id': str(proxy.session.id),
+            'source_id': str(proxy.video_source.id),
+            'pid': proxy.process.pid if proxy.process else None,
+            'running': not proxy.finished,
+            'restarts': proxy.restarts,
+            'frames_processed': proxy.statistics.get('frames_processed'),
+        } for proxy in proxies]
+        return statistics
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_process_supervisor(max_processes):
+    """Process-wide supervisor of detection worker processes, created on first use"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = DetectionProcessSupervisor(max_processes)
+        return _supervisor
+
+
+def get_process_supervisor_statistics():
+    with _supervisor_lock:
+        supervisor = _supervisor
+    return supervisor.get_statistics() if supervisor else None
@@ -0,0 +1,112 @@
+import time
+
+from django.db import transaction
+
+# Session counters kept up to date by the detector and saved with each batch
+SESSION_STATISTICS_FIELDS = [
+    'total_frames_processed',
+    'total_detections',
+    'frames_skipped_static',
+    'inference_time_saved',
+    'frames_dropped',
+    'vehicles_tracked',
+]
+
+
+class DetectionResultWriter:
+    """Buffers a session's DetectionResult rows and writes them in batches
+
+    Rows are inserted with one ``bulk_create``, together with the session's
+    statistics, in a single transaction once ``batch_size`` rows are waiting
+    or ``flush_interval`` seconds have passed since the last flush, instead
+    of a transaction per frame. The interval is checked as frames are
+    added, and by ``flush_if_due``, which the writer calls while no frames
+    arrive, so rows never wait much longer than ``flush_interval``;
+    ``close`` writes whatever is left when the session stops or fails.
+
+    Only the statistics fields are saved, so a status set elsewhere (a user
+    stopping the session) is never overwritten.
+    """
+
+    def __init__(self, session, batch_size=100, flush_interval=0.5):
+        self.session = session
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._dirty = False  # Frames added since the last flush
+        self._last_flush = time.time()
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flushes = 0
+        self.flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.started_at = time.time()
+
+    def add(self, result=None):
+        """Buffer a DetectionResult (None only counts a processed frame)
+
+        Returns True if this call flushed.
+        """
+        if result is not None:
+            self._rows.append(result)
+        self._dirty = True
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+            return True
+        return self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flush frames added more than ``flush_interval`` seconds after the last flush
+
+        Returns True if this call flushed.
+        """
+        if self._dirty and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Insert the buffered rows and save the session statistics in one transaction"""
+        from object_detection.models import DetectionResult
+
+        rows, self._rows = self._rows, []
+        self._dirty = False
+        start_time = time.time()
+        try:
+            with transaction.atomic():
+                if rows:
+                    DetectionResult.objects.bulk_create(rows)
+                self.session.save(update_fields=SESSION_STATISTICS_FIELDS)
+        except Exception:
+            self.rows_failed += len(rows)
+            raise
+        finally:
+            self._last_flush = time.time()
+
+        elapsed = self._last_flush - start_time
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.flush_time += elapsed
+        self.max_flush_time = max(self.max_flush_time, elapsed)
+
+    def close(self):
+        """Write whatever is still buffered; errors are reported, not raised"""
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error saving detection results: {str(e)}")
+
+    def get_statistics(self):
+        elapsed = time.time() - self.started_at
+        return {
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'rows_pending': len(self._rows),
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'flushes': self.flushes,
+            'rows_per_second': self.rows_written / elapsed if elapsed else 0.0,
+            'average_flush_latency': self.flush_time / self.flushes if self.flushes else 0.0,
+            'max_flush_latency': self.max_flush_time,
+        }
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def clip_regions(rois, frame_shape):
+    """Clip (x, y, width, height) pixel rectangles to the frame, dropping empty ones"""
+    frame_height, frame_width = frame_shape[:2]
+    regions = []
+    for x, y, width, height in rois:
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2 = min(frame_width, int(x + width))
+        y2 = min(frame_height, int(y + height))
+        if x2 > x1 and y2 > y1:
+            regions.append((x1, y1, x2 - x1, y2 - y1))
+    return regions
+
+
+def map_boxes_to_frame(boxes, region, frame_shape):
+    """Map normalized (ymin, xmin, ymax, xmax) boxes from a crop to the full frame"""
+    frame_height, frame_width = frame_shape[:2]
+    x, y, width, height = region
+    scale = np.array([height / frame_height, width / frame_width,
+                      height / frame_height, width / frame_width], dtype=np.float32)
+    offset = np.array([y / frame_height, x / frame_width,
+                       y / frame_height, x / frame_width], dtype=np.float32)
+    return boxes * scale + offset
+
+
+def region_pixel_fraction(regions, frame_shape):
+    """Share of the frame's pixels covered by the regions (overlaps counted twice)"""
+    frame_height, frame_width = frame_shape[:2]
+    area = sum(width * height for _, _, width, height in regions)
+    return area / float(frame_height * frame_width)
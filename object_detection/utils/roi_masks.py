@@ -0,0 +1,75 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class ROIMask:
+    """Label image of a source's ROIs: pixel value i + 1 means ROI i covers it
+
+    ROIs are drawn in order, so where two overlap the later one wins. Each
+    box is assigned by the label under its bottom-centre point, where the
+    vehicle meets the road, so a whole frame is one fancy-indexing lookup.
+    """
+
+    def __init__(self, rois, frame_shape, violation_types=None):
+        frame_height, frame_width = frame_shape[:2]
+        self.roi_ids = [str(roi_id) for roi_id, _ in rois]
+        # ROI id -> id of the violation reported for vehicles read inside it
+        self.violation_types = violation_types or {}
+        dtype = np.uint8 if len(rois) < 256 else np.int32
+        self.labels = np.zeros((frame_height, frame_width), dtype=dtype)
+        for label, (_, points) in enumerate(rois, start=1):
+            polygon = np.asarray(points, dtype=np.int32).reshape(-1, 1, 2)
+            cv2.fillPoly(self.labels, [polygon], label)
+
+        # Index 0 (outside every ROI) maps to None
+        self._lookup = np.array([None] + self.roi_ids, dtype=object)
+
+    def assign(self, boxes):
+        """ROI id (or None) of each normalized (ymin, xmin, ymax, xmax) box"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        frame_height, frame_width = self.labels.shape
+        rows = np.clip((boxes[:, 2] * frame_height).astype(np.int64), 0, frame_height - 1)
+        cols = np.clip(((boxes[:, 1] + boxes[:, 3]) / 2 * frame_width).astype(np.int64), 0, frame_width - 1)
+        return self._lookup[self.labels[rows, cols]].tolist()
+
+
+class ROIMaskCache:
+    """Per-source ROI masks, rebuilt only after the source's ROIs change"""
+
+    def __init__(self):
+        self._masks = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, video_source_id, frame_shape):
+        """Mask of the source's active ROIs, or None if it has none"""
+        source_id = str(video_source_id)
+        key = (source_id, tuple(frame_shape[:2]))
+        with self._lock:
+            if key in self._masks:
+                return self._masks[key]
+            generation = self._generations.get(source_id, 0)
+
+        from object_detection.models import ROI
+
+        rois = list(ROI.objects.filter(video_source_id=video_source_id, is_active=True).order_by('created_at'))
+        violation_types = {str(roi.id): roi.violation_type_id for roi in rois if roi.violation_type_id}
+        mask = ROIMask([(roi.id, roi.get_points()) for roi in rois], frame_shape, violation_types) if rois else None
+        with self._lock:
+            # Don't cache a mask built from ROIs that changed while it was drawn
+            if self._generations.get(source_id, 0) == generation:
+                self._masks[key] = mask
+        return mask
+
+    def invalidate(self, video_source_id):
+        """Drop every cached mask of a source"""
+        source_id = str(video_source_id)
+        with self._lock:
+            self._generations[source_id] = self._generations.get(source_id, 0) + 1
+            for key in [key for key in self._masks if key[0] == source_id]:
+                del self._masks[key]
+
+
+roi_mask_cache = ROIMaskCache()
@@ -0,0 +1,158 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+from .batching import run_stacked
+
+
+class _SourceState:
+    """Pending requests and fair-share bookkeeping for one video source"""
+
+    def __init__(self, source_id, weight, max_fps, virtual_time):
+        self.source_id = source_id
+        self.weight = max(1e-6, float(weight))
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.virtual_time = virtual_time
+        self.next_allowed = 0.0
+        self.pending = collections.deque()
+        self.sessions = 0
+
+        self.served = 0
+        self.total_lag = 0.0
+        self.last_lag = 0.0
+        self.recent = collections.deque(maxlen=60)
+
+
+class InferenceScheduler:
+    """Fixed pool of inference workers shared fairly by every active source
+
+    Workers always serve the eligible source with the lowest virtual time,
+    which advances by ``1 / weight`` per frame served, so sources get model
+    time in proportion to their weight. A source with ``max_fps`` set is not
+    served again until its minimum frame interval has passed.
+    """
+
+    def __init__(self, run_batch, num_workers=4):
+        self.run_batch = run_batch
+        self.num_workers = max(1, int(num_workers))
+        self._sources = {}
+        self._cond = threading.Condition()
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f'inference-worker-{i}', daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def register(self, source_id, weight=1, max_fps=None):
+        """Add a source, or count another session on an already registered one"""
+        with self._cond:
+            state = self._sources.get(source_id)
+            if state is None:
+                # Start level with the others so a newcomer can't monopolize workers
+                virtual_time = min((s.virtual_time for s in self._sources.values()), default=0.0)
+                state = _SourceState(source_id, weight, max_fps, virtual_time)
+                self._sources[source_id] = state
+            else:
+                state.weight = max(1e-6, float(weight))
+                state.min_interval = 1.0 / max_fps if max_fps else 0.0
+            state.sessions += 1
+
+    def unregister(self, source_id):
+        with self._cond:
+            state = self._sources.get(source_id)
+            if state is None:
+                return
+            state.sessions -= 1
+            if state.sessions <= 0:
+                for _, _, future in state.pending:
+                    future.cancel()
+                del self._sources[source_id]
+
+    def submit(self, source_id, images, captured_at=None):
+        """Queue one frame's model inputs; resolves to one raw output per image"""
+        future = Future()
+        with self._cond:
+            state = self._sources.get(source_id)
+            if state is None:
+                raise Exception(f"Source {source_id} is not registered with the scheduler")
+            if not state.pending:
+                # An idle source doesn't bank credit it could burst with later
+                backlogged = [s.virtual_time for s in self._sources.values() if s.pending]
+                if backlogged:
+                    state.virtual_time = max(state.virtual_time, min(backlogged))
+            state.pending.append((images, captured_at or time.time(), future))
+            self._cond.notify()
+        return future
+
+    def _next_request(self):
+        """Block until some source has an eligible request and pop it"""
+        with self._cond:
+            while True:
+                now = time.time()
+                chosen = None
+                next_wakeup = None
+                for state in self._sources.values():
+                    if not state.pending:
+                        continue
+                    if state.next_allowed > now:
+                        # Rate limited; remember when it becomes eligible
+                        if next_wakeup is None or state.next_allowed < next_wakeup:
+                            next_wakeup = state.next_allowed
+                        continue
+                    if chosen is None or state.virtual_time < chosen.virtual_time:
+                        chosen = state
+
+                if chosen is not None:
+                    chosen.virtual_time += 1.0 / chosen.weight
+                    chosen.next_allowed = now + chosen.min_interval
+                    images, captured_at, future = chosen.pending.popleft()
+                    return chosen, images, captured_at, future
+
+                self._cond.wait(timeout=None if next_wakeup is None else next_wakeup - now)
+
+    def _work(self):
+        while True:
+            state, images, captured_at, future = self._next_request()
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                outputs = run_stacked(self.run_batch, images)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+
+            finished_at = time.time()
+            with self._cond:
+                state.served += 1
+                state.last_lag = finished_at - captured_at
+                state.total_lag += state.last_lag
+                state.recent.append(finished_at)
+            future.set_result(outputs)
+
+    def get_statistics(self):
+        """Achieved FPS, lag and backlog per source"""
+        now = time.time()
+        with self._cond:
+            sources = []
+            for state in self._sources.values():
+                recent = [t for t in state.recent if now - t <= 10.0]
+                if len(recent) > 1:
+                    achieved_fps = (len(recent) - 1) / max(recent[-1] - recent[0], 1e-9)
+                else:
+                    achieved_fps = 0.0
+                sources.append({
+                    'source_id': str(state.source_id),
+                    'weight': state.weight,
+                    'max_fps': 1.0 / state.min_interval if state.min_interval else None,
+                    'sessions': state.sessions,
+                    'queued': len(state.pending),
+                    'served': state.served,
+                    'achieved_fps': achieved_fps,
+                    'last_lag': state.last_lag,
+                    'average_lag': state.total_lag / state.served if state.served else 0.0,
+                })
+        return {'workers': self.num_workers, 'sources': sources}
@@ -0,0 +1,195 @@
+import numpy as np
+
+from .postprocessing import box_iou
+
+# Constant-velocity model over (cx, cy, w, h, vx, vy, vw, vh), one step per analysed frame
+_TRANSITION = np.eye(8, dtype=np.float64)
+_TRANSITION[:4, 4:] = np.eye(4)
+
+# Noise scales relative to box height, so they hold at any distance from the camera
+_STD_POSITION = 1.0 / 20
+_STD_VELOCITY = 1.0 / 160
+
+
+def boxes_to_measurements(boxes):
+    """(ymin, xmin, ymax, xmax) boxes to (cx, cy, w, h) measurements"""
+    ymin, xmin, ymax, xmax = boxes.T
+    return np.stack([(xmin + xmax) / 2, (ymin + ymax) / 2, xmax - xmin, ymax - ymin], axis=1)
+
+
+def states_to_boxes(means):
+    """(cx, cy, w, h, ...) track states to clipped (ymin, xmin, ymax, xmax) boxes"""
+    cx, cy, w, h = means[:, 0], means[:, 1], np.abs(means[:, 2]), np.abs(means[:, 3])
+    boxes = np.stack([cy - h / 2, cx - w / 2, cy + h / 2, cx + w / 2], axis=1)
+    return np.clip(boxes, 0.0, 1.0)
+
+
+def greedy_match(iou, iou_threshold):
+    """One-to-one (row, column) pairs, highest IoU first, at or above the threshold"""
+    rows, cols = np.nonzero(iou >= iou_threshold)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+
+    matches = []
+    used_rows, used_cols = set(), set()
+    for row, col in zip(rows[order], cols[order]):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matches.append((row, col))
+    return matches
+
+
+class MultiObjectTracker:
+    """SORT-style tracker: Kalman-predicted boxes matched to detections by IoU
+
+    Every track's Kalman state lives in one array, so prediction, IoU
+    association and the measurement update each run as a single vectorized
+    step over all tracks. ``predict`` alone propagates tracks across frames
+    the detector skipped; ``update`` also corrects them with a detector
+    result and starts tracks for unmatched detections.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=3, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age  # Detector runs a track may miss before it is dropped
+        self.min_hits = min_hits  # Detections before a track counts as a vehicle
+
+        self.means = np.zeros((0, 8))
+        self.covariances = np.zeros((0, 8, 8))
+        self.track_ids = np.zeros(0, dtype=np.int64)
+        self.classes = np.zeros(0, dtype=np.float32)
+        self.scores = np.zeros(0, dtype=np.float32)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+
+        self._next_id = 1
+        self.tracks_confirmed = 0
+
+    def _process_noise(self):
+        height = np.abs(self.means[:, 3])
+        std = np.concatenate([
+            np.repeat((_STD_POSITION * height)[:, None], 4, axis=1),
+            np.repeat((_STD_VELOCITY * height)[:, None], 4, axis=1),
+        ], axis=1)
+        return np.einsum('ni,ij->nij', std ** 2, np.eye(8))
+
+    def _step(self):
+        """Advance every track one frame"""
+        if not len(self.means):
+            return
+        self.means = self.means @ _TRANSITION.T
+        self.covariances = _TRANSITION @ self.covariances @ _TRANSITION.T + self._process_noise()
+
+    def _correct(self, index, measurements):
+        """Kalman measurement update for the tracks at ``index``"""
+        means = self.means[index]
+        covariances = self.covariances[index]
+        std = _STD_POSITION * np.abs(measurements[:, 3])
+        noise = np.einsum('n,ij->nij', std ** 2, np.eye(4))
+
+        innovation_cov = covariances[:, :4, :4] + noise
+        gain = covariances[:, :, :4] @ np.linalg.inv(innovation_cov)
+        innovation = measurements - means[:, :4]
+
+        self.means[index] = means + np.einsum('nij,nj->ni', gain, innovation)
+        self.covariances[index] = covariances - gain @ covariances[:, :4, :]
+
+    def _add_tracks(self, measurements, classes, scores):
+        count = len(measurements)
+        means = np.zeros((count, 8))
+        means[:, :4] = measurements
+        height = np.abs(measurements[:, 3])
+        std = np.concatenate([
+            np.repeat((2 * _STD_POSITION * height)[:, None], 4, axis=1),
+            np.repeat((10 * _STD_VELOCITY * height)[:, None], 4, axis=1),
+        ], axis=1)
+
+        self.means = np.concatenate([self.means, means])
+        self.covariances = np.concatenate([self.covariances, np.einsum('ni,ij->nij', std ** 2, np.eye(8))])
+        self.track_ids = np.concatenate([self.track_ids, np.arange(self._next_id, self._next_id + count)])
+        self.classes = np.concatenate([self.classes, classes])
+        self.scores = np.concatenate([self.scores, scores])
+        self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int64)])
+        self.misses = np.concatenate([self.misses, np.zeros(count, dtype=np.int64)])
+        self._next_id += count
+        if self.min_hits <= 1:
+            self.tracks_confirmed += count
+
+    def _keep(self, mask):
+        for name in ('means', 'covariances', 'track_ids', 'classes', 'scores', 'hits', 'misses'):
+            setattr(self, name, getattr(self, name)[mask])
+
+    def _result(self, mask):
+        if not mask.any():
+            return None
+        return {
+            'objects': self.classes[mask].tolist(),
+            'scores': self.scores[mask].tolist(),
+            'boxes': states_to_boxes(self.means[mask]).tolist(),
+            'track_ids': self.track_ids[mask].tolist(),
+        }
+
+    def predict(self):
+        """Propagate tracks through a frame the detector skipped"""
+        self._step()
+        # Report the tracks the last detector run confirmed
+        return self._result(self.misses == 0)
+
+    def update(self, detection_result):
+        """Advance tracks a frame and correct them with that frame's detections
+
+        Returns the frame's detections, each with the id of its track.
+        """
+        self._step()
+
+        if detection_result:
+            boxes = np.asarray(detection_result['boxes'], dtype=np.float64).reshape(-1, 4)
+            classes = np.asarray(detection_result['objects'], dtype=np.float32)
+            scores = np.asarray(detection_result['scores'], dtype=np.float32)
+        else:
+            boxes, classes, scores = np.zeros((0, 4)), np.zeros(0, np.float32), np.zeros(0, np.float32)
+
+        # Tracks only match detections of their own class
+        iou = box_iou(states_to_boxes(self.means), boxes)
+        iou[self.classes[:, None] != classes[None, :]] = 0.0
+        matches = greedy_match(iou, self.iou_threshold)
+
+        track_index = np.array([t for t, _ in matches], dtype=np.int64)
+        detection_index = np.array([d for _, d in matches], dtype=np.int64)
+        detection_track_ids = np.zeros(len(boxes), dtype=np.int64)
+
+        matched = np.zeros(len(self.means), dtype=bool)
+        matched[track_index] = True
+        if len(matches):
+            measurements = boxes_to_measurements(boxes[detection_index])
+            self._correct(track_index, measurements)
+            self.scores[track_index] = scores[detection_index]
+            self.hits[track_index] += 1
+            self.tracks_confirmed += int((self.hits[track_index] == self.min_hits).sum())
+            detection_track_ids[detection_index] = self.track_ids[track_index]
+
+        self.misses[matched] = 0
+        self.misses[~matched] += 1
+        self._keep(self.misses <= self.max_age)
+
+        # Unmatched detections start new tracks
+        unmatched = np.ones(len(boxes), dtype=bool)
+        unmatched[detection_index] = False
+        if unmatched.any():
+            first_id = self._next_id
+            self._add_tracks(boxes_to_measurements(boxes[unmatched]), classes[unmatched], scores[unmatched])
+            detection_track_ids[unmatched] = np.arange(first_id, self._next_id)
+
+        if not len(boxes):
+            return None
+        result = dict(detection_result)
+        result['track_ids'] = detection_track_ids.tolist()
+        return result
+
+    def get_statistics(self):
+        return {
+            'active_tracks': int(len(self.track_ids)),
+            'tracks_started': self._next_id - 1,
+            'tracks_confirmed': self.tracks_confirmed,
+        }
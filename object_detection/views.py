@@ -10,12 +10,18 @@ import cv2
 import numpy as np
 import json
 import uuid
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from django.db import models
 
-from .models import DetectionSession, VideoSource, DetectionResult, ROI, ModelConfiguration
+from .models import DetectionSession, VideoSource, DetectionResult, ROI, ModelConfiguration, CountingLine, VehicleFlowCount
 from .forms import VideoSourceForm, ROIForm
 from .utils.object_detector import ObjectDetector
+from .utils.capture_hub import LIVE_SOURCE_TYPES, capture_hubs
+from .utils.mjpeg_broadcaster import FrameRateLimiter, StreamProfile, encode_part, mjpeg_broadcasters
+from .utils.model_registry import model_registry
+from .utils.process_workers import get_process_supervisor_statistics
+from .utils.roi_masks import roi_mask_cache
 
 @login_required
 def detection_dashboard(request):
@@ -142,6 +148,7 @@ def manage_rois(request, source_id):
             roi = form.save(commit=False)
             roi.video_source = source
             roi.save()
+            roi_mask_cache.invalidate(source.id)
             messages.success(request, f'ROI "{roi.name}" created successfully.')
             return redirect('object_detection:manage_rois', source_id=source_id)
     else:
@@ -164,6 +171,7 @@ def roi_edit(request, roi_id):
         form = ROIForm(request.POST, instance=roi)
         if form.is_valid():
             form.save()
+            roi_mask_cache.invalidate(roi.video_source_id)
             messages.success(request, f'ROI "{roi.name}" updated successfully.')
             return redirect('object_detection:manage_rois', source_id=roi.video_source.id)
     else:
@@ -185,6 +193,7 @@ def roi_delete(request, roi_id):
     
     if request.method == 'POST':
         roi.delete()
+        roi_mask_cache.invalidate(source_id)
         messages.success(request, f'ROI "{roi.name}" deleted successfully.')
         return redirect('object_detection:manage_rois', source_id=source_id)
     
@@ -303,30 +312,103 @@ def api_stop_detection(request, session_id):
     
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
+@login_required
+def api_model_registry(request):
+    """API endpoint for load time and memory footprint of loaded models"""
+    return JsonResponse({
+        'models': model_registry.get_statistics(),
+        'process_workers': get_process_supervisor_statistics(),
+    })
+
+@login_required
+def api_capture_hubs(request):
+    """API endpoint for the shared live captures and their subscribers"""
+    return JsonResponse({
+        'hubs': capture_hubs.get_statistics(),
+        'broadcasters': mjpeg_broadcasters.get_statistics(),
+    })
+
+@login_required
+def api_vehicle_flow(request, source_id):
+    """API endpoint for vehicle counts per counting line over the last minutes"""
+    source = get_object_or_404(VideoSource, id=source_id)
+    try:
+        minutes = max(1, int(request.GET.get('minutes', 60)))
+    except ValueError:
+        minutes = 60
+    since = timezone.now() - timedelta(minutes=minutes)
+    
+    lines = {str(line.id): {'name': line.name, 'roi_id': str(line.roi_id) if line.roi_id else None, 'buckets': []}
+             for line in CountingLine.objects.filter(video_source=source)}
+    
+    # Pre-aggregated buckets: cost depends on the window, not on detection history
+    counts = VehicleFlowCount.objects.filter(
+        counting_line__video_source=source, bucket_start__gte=since
+    ).order_by('bucket_start').values('counting_line_id', 'bucket_start', 'object_class', 'direction', 'count')
+    for row in counts:
+        lines[str(row['counting_line_id'])]['buckets'].append({
+            'bucket_start': row['bucket_start'].isoformat(),
+            'object_class': row['object_class'],
+            'direction': row['direction'],
+            'count': row['count'],
+        })
+    
+    for line in lines.values():
+        line['total'] = sum(bucket['count'] for bucket in line['buckets'])
+        line['vehicles_per_minute'] = line['total'] / minutes
+    
+    return JsonResponse({'minutes': minutes, 'lines': lines})
+
 def video_stream(request, source_id):
     """Stream video for live viewing"""
     source = get_object_or_404(VideoSource, id=source_id)
+    profile = StreamProfile.from_query(
+        request.GET,
+        getattr(settings, 'OBJECT_DETECTION_STREAM_PROFILES', {}),
+        default=getattr(settings, 'OBJECT_DETECTION_STREAM_DEFAULT_PROFILE', 'medium'),
+        fps_limit=getattr(settings, 'OBJECT_DETECTION_STREAM_MAX_FPS', 25),
+    )
+    
+    def generate_live_frames():
+        # Frames are encoded once per profile and shared by every viewer
+        try:
+            yield from mjpeg_broadcasters.stream(source, profile)
+        except Exception as e:
+            print(f"Error opening video stream: {str(e)}")
     
     def generate_frames():
-        if source.source_type == 'CAMERA':
-            cap = cv2.VideoCapture(source.source_url)
-        elif source.source_type == 'FILE':
-            cap = cv2.VideoCapture(source.file_path)
-        else:
+        if source.source_type in LIVE_SOURCE_TYPES:
+            yield from generate_live_frames()
+            return
+        if source.source_type != 'FILE':
             return
         
+        # Files are read from the start by each viewer, at their own frame rate
+        cap = cv2.VideoCapture(source.file_path)
         try:
+            source_fps = cap.get(cv2.CAP_PROP_FPS) or 25
+            limiter = FrameRateLimiter(profile.max_fps)
+            started_at = time.time()
+            frame_number = 0
             while True:
+                position = frame_number / source_fps
+                frame_number += 1
+                if not limiter.allow(position):
+                    # Skip without decoding
+                    if not cap.grab():
+                        break
+                    continue
+                
                 ret, frame = cap.read()
                 if not ret:
                     break
                 
-                # Encode frame
-                _, buffer = cv2.imencode('.jpg', frame)
-                frame_bytes = buffer.tobytes()
-                
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                delay = started_at + position - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                part = encode_part(frame, profile)
+                if part is not None:
+                    yield part
                 
         finally:
             cap.release()
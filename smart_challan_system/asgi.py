@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smart_challan_system.settings")
 
 application = get_asgi_application()
+
+# Index every registration now rather than on the first plate search
+from challan_app.utils.registration_index import registration_index  # noqa: E402
+
+registration_index.warm()
@@ -84,6 +84,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # On disk rather than in memory, so concurrency tests can use it from other threads and processes
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     },
 }
 
@@ -159,6 +163,142 @@ OBJECT_DETECTION_MODEL = 'ssd_mobilenet_v1_coco_11_06_2017'
 OBJECT_DETECTION_MODEL_PATH = os.path.join(BASE_DIR, 'models', OBJECT_DETECTION_MODEL)
 OBJECT_DETECTION_LABELS_PATH = os.path.join(BASE_DIR, 'data', 'mscoco_label_map.pbtxt')
 
+# Frames stacked into one inference call, and the longest a frame waits
+# (in seconds) for a batch to fill up
+OBJECT_DETECTION_BATCH_SIZE = 1
+OBJECT_DETECTION_BATCH_MAX_WAIT = 0.05
+
+# Bounded queue length between detection pipeline stages
+OBJECT_DETECTION_PIPELINE_QUEUE_SIZE = 8
+
+# Side of the square RGB input frames are resized to before inference
+# (None feeds full-resolution frames)
+OBJECT_DETECTION_INPUT_SIZE = 300
+
+# Analysis rate in frames per second; skipped frames are grabbed without
+# being decoded. None analyses every frame.
+OBJECT_DETECTION_TARGET_FPS = None
+
+# Detection results are written with one bulk insert per batch of
+# RESULT_BATCH_SIZE rows, or after RESULT_FLUSH_INTERVAL seconds, along with
+# the session statistics
+OBJECT_DETECTION_RESULT_BATCH_SIZE = 100
+OBJECT_DETECTION_RESULT_FLUSH_INTERVAL = 0.5
+
+# Read CAMERA/STREAM sources on a grabber thread that keeps only the newest
+# frame, so a slow model never falls behind real time
+OBJECT_DETECTION_LATEST_FRAME_ONLY = True
+
+# Live view profiles, picked with ?profile= and tuned with ?quality=,
+# ?width= and ?fps=. Each live source is encoded once per profile in use
+# and shared by all its viewers; no viewer gets more than STREAM_MAX_FPS.
+OBJECT_DETECTION_STREAM_PROFILES = {
+    'low': {'quality': 60, 'max_width': 480, 'max_fps': 5},
+    'medium': {'quality': 75, 'max_width': 960, 'max_fps': 12},
+    'high': {'quality': 90, 'max_width': None, 'max_fps': 25},
+}
+OBJECT_DETECTION_STREAM_DEFAULT_PROFILE = 'medium'
+OBJECT_DETECTION_STREAM_MAX_FPS = 25
+
+# ?annotated=1 draws the running session's latest detections over a live
+# view; detections older than OVERLAY_MAX_AGE seconds are left off
+OBJECT_DETECTION_OVERLAY_MAX_AGE = 1.0
+
+# Run the detector every DETECT_INTERVAL analysed frames and let a SORT-style
+# tracker propagate detections in between, giving each vehicle a track id.
+# MAX_AGE (detector runs a track may miss) and MIN_HITS count detector runs.
+OBJECT_DETECTION_TRACKING = False
+OBJECT_DETECTION_DETECT_INTERVAL = 5
+OBJECT_DETECTION_TRACK_IOU_THRESHOLD = 0.3
+OBJECT_DETECTION_TRACK_MAX_AGE = 3
+OBJECT_DETECTION_TRACK_MIN_HITS = 2
+
+# Counting-line crossings (counted while tracking) are kept in memory and
+# added to the flow table in buckets of FLOW_BUCKET_SECONDS every
+# FLOW_FLUSH_INTERVAL seconds
+OBJECT_DETECTION_FLOW_BUCKET_SECONDS = 60
+OBJECT_DETECTION_FLOW_FLUSH_INTERVAL = 30
+
+# Number plate recognition, run once per tracked vehicle (needs tracking).
+# PLATE_ENGINE is a registered engine name ('STUB') or a dotted path to a
+# PlateRecognitionEngine subclass, built with PLATE_ENGINE_OPTIONS.
+OBJECT_DETECTION_PLATE_RECOGNITION = False
+OBJECT_DETECTION_PLATE_ENGINE = 'STUB'
+OBJECT_DETECTION_PLATE_ENGINE_OPTIONS = {}
+OBJECT_DETECTION_PLATE_MIN_CONFIDENCE = 0.6
+OBJECT_DETECTION_PLATE_MAX_ATTEMPTS = 3
+
+# Evidence clips: each source keeps a pre-roll of recent frames, scaled to at
+# most CLIP_MAX_WIDTH and JPEG-compressed if needed to stay within
+# CLIP_BUFFER_MB, and violations export the seconds around them as MP4 on a
+# background pool.
+OBJECT_DETECTION_EVIDENCE_CLIPS = False
+OBJECT_DETECTION_CLIP_PRE_SECONDS = 5
+OBJECT_DETECTION_CLIP_POST_SECONDS = 5
+OBJECT_DETECTION_CLIP_BUFFER_MB = 64  # Per source
+OBJECT_DETECTION_CLIP_MAX_WIDTH = 960
+OBJECT_DETECTION_CLIP_WORKERS = 2
+OBJECT_DETECTION_CLIP_DIR = os.path.join(MEDIA_ROOT, 'evidence', 'clips')
+
+# Evidence snapshots: annotated frames of violations (JPEG or WEBP) plus
+# thumbnails, written by a shared thread pool. When the bounded queue is full
+# the DROP_POLICY (DROP_OLDEST, DROP_NEWEST or BLOCK) decides what is lost.
+OBJECT_DETECTION_EVIDENCE_SNAPSHOTS = False
+OBJECT_DETECTION_SNAPSHOT_FORMAT = 'JPEG'
+OBJECT_DETECTION_SNAPSHOT_QUALITY = 85
+OBJECT_DETECTION_SNAPSHOT_THUMBNAIL_WIDTH = 320
+OBJECT_DETECTION_SNAPSHOT_WORKERS = 2
+OBJECT_DETECTION_SNAPSHOT_QUEUE_SIZE = 64
+OBJECT_DETECTION_SNAPSHOT_DROP_POLICY = 'DROP_OLDEST'
+OBJECT_DETECTION_SNAPSHOT_BATCH_SIZE = 50
+OBJECT_DETECTION_SNAPSHOT_FLUSH_INTERVAL = 1.0
+OBJECT_DETECTION_SNAPSHOT_DIR = os.path.join(MEDIA_ROOT, 'evidence', 'snapshots')
+
+# Skip inference on frames that barely changed since the last inferred one
+# (changed pixels as a fraction of the frame, or of its ROIs)
+OBJECT_DETECTION_MOTION_GATE = False
+OBJECT_DETECTION_MOTION_GATE_ROI_ONLY = True
+OBJECT_DETECTION_MOTION_PIXEL_THRESHOLD = 25
+OBJECT_DETECTION_MOTION_AREA_THRESHOLD = 0.005
+
+# Run the model only on the source's active ROI crops, each resized to a
+# square input of this many pixels so they stack into one batch
+OBJECT_DETECTION_ROI_CROP = False
+OBJECT_DETECTION_ROI_INPUT_SIZE = 300
+
+# Share one pool of inference workers between all sources. A source's share
+# is its priority times the weight of its type, favoring live cameras over
+# uploaded files.
+OBJECT_DETECTION_SCHEDULER = False
+OBJECT_DETECTION_INFERENCE_WORKERS = 4
+OBJECT_DETECTION_SOURCE_TYPE_WEIGHTS = {
+    'CAMERA': 4,
+    'STREAM': 4,
+    'FILE': 1,
+}
+
+# Run each detection session end to end (capture to database writes) in its
+# own supervised worker process with its own model, at most this many at
+# once, so sessions don't share the web process's GIL. Live frames reach
+# the workers through shared memory. 0 runs sessions on threads in the web
+# process.
+OBJECT_DETECTION_PROCESS_WORKERS = 0
+
+# COCO classes kept after detection (bicycle, car, motorcycle, bus, truck);
+# None keeps every class
+OBJECT_DETECTION_CLASS_IDS = [2, 3, 4, 6, 8]
+
+# Inference backend used when no active ModelConfiguration is stored:
+# TENSORFLOW, OPENCV_DNN, ONNXRUNTIME or TFLITE; INT8 needs ONNXRUNTIME or TFLITE
+OBJECT_DETECTION_BACKEND = 'TENSORFLOW'
+OBJECT_DETECTION_QUANTIZATION = 'FP32'
+
+# Automatic challan issuing from detected violation events (issue_challans).
+# Repeats of a vehicle's violation within the dedupe window get no new challan.
+CHALLAN_INGEST_BATCH_SIZE = 500
+CHALLAN_DEDUPE_WINDOW_MINUTES = 30
+CHALLAN_AUTO_ISSUER = 'admin'  # Username the challans are issued by
+
 # Create necessary directories
 os.makedirs(os.path.join(BASE_DIR, 'models'), exist_ok=True)
 os.makedirs(os.path.join(BASE_DIR, 'data'), exist_ok=True)